@@ -9,9 +9,15 @@ from PyQt5 import QtGui
 from PyQt5 import QtWidgets
 import qasync
 
+from labbie import bases
+from labbie import cache
 from labbie import config
 from labbie import constants
+from labbie import enchants
+from labbie import mods
+from labbie import net
 from labbie import resources
+from labbie import scheduler
 from labbie import state
 from labbie import utils
 from labbie.di import module
@@ -69,8 +75,10 @@ def main():
     asyncio.set_event_loop(loop)
 
     with loop:
-        loop.run_until_complete(start(log_filter))
-        sys.exit(loop.run_forever())
+        injector = loop.run_until_complete(start(log_filter))
+        exit_code = loop.run_forever()
+        loop.run_until_complete(shutdown(injector))
+    sys.exit(exit_code)
 
 
 async def focus_if_other_instances(app_presenter):
@@ -94,24 +102,55 @@ async def start(log_filter):
 
     # ensure directories exist
     constants.screenshots_dir.mkdir(parents=True, exist_ok=True)
-    (constants.helm_enchants_dir / 'league').mkdir(parents=True, exist_ok=True)
-    (constants.helm_enchants_dir / 'daily').mkdir(parents=True, exist_ok=True)
+
+    # sweep leftovers of interrupted downloads and enforce the cache budget before anything uses the cache
+    blob_cache = injector.get(cache.BlobCache)
+    await asyncio.get_running_loop().run_in_executor(None, blob_cache.collect_garbage)
+    # access times of cache hits are only saved along with other changes to the cache
+    ui_utils.register_exit_handler(blob_cache.flush)
 
     config = injector.get(_Config)
 
     resource_manager = injector.get(resources.ResourceManager)
     resource_manager.initialize()
     await resource_manager._init_task
+    # structures derived from resources are loaded (or built) off the event loop before anything uses them
+    await asyncio.gather(injector.get(mods.Mods).load(), injector.get(bases.Bases).load())
 
     app_state = injector.get(state.AppState)
+    client = injector.get(net.HttpClient)
+    refresh_scheduler = injector.get(scheduler.RefreshScheduler)
+    refresh_scheduler.add(scheduler.resources_job(resource_manager, constants.resources_base_url),
+                          current=not app_state.resources_stale)
+
+    async def load_and_refresh(scrape: enchants.Enchants):
+        try:
+            await scrape.download_or_load(constants, client, blob_cache)
+        except Exception:
+            # e.g., offline on a cold start, the refresh scheduler retries the download with backoff
+            logger.exception(f'failed to load {scrape.type} enchants')
+            if scrape.store is None:
+                scrape.set_state(enchants.State.MISSING)
+            current = False
+        else:
+            current = scrape.date == enchants.today_utc()
+        refresh_scheduler.add(scheduler.enchants_job(scrape, constants.enchants_base_url), current=current)
+
     if config.league:
-        asyncio.create_task(app_state.league_enchants.download_or_load(constants))
+        asyncio.create_task(load_and_refresh(app_state.league_enchants))
     if config.daily:
-        asyncio.create_task(app_state.daily_enchants.download_or_load(constants))
+        asyncio.create_task(load_and_refresh(app_state.daily_enchants))
 
     app_presenter = injector.get(app.AppPresenter)
     app_presenter.launch()
     asyncio.create_task(focus_if_other_instances(app_presenter))
+    return injector
+
+
+async def shutdown(injector: _Injector):
+    # NOTE: refreshes are stopped first, the client would otherwise open a new session for them
+    injector.get(scheduler.RefreshScheduler).stop()
+    await injector.get(net.HttpClient).close()
 
 
 if __name__ == '__main__':
@@ -1,11 +1,17 @@
+import asyncio
 import dataclasses
 import functools
+from typing import Dict, List, Tuple
 
 import injector
 
+from labbie import mixins
 from labbie import resources
 from labbie import utils
 
+# NOTE: derived from the items resource and persisted next to it, bump the version whenever the format changes
+_HELMS_SUFFIX = '.helms-1.json'
+
 
 @dataclasses.dataclass
 class _Helm:
@@ -16,20 +22,39 @@ Helm = utils.make_slotted_dataclass(_Helm)  # noqa: E305
 
 
 @injector.singleton
-class Bases:
+class Bases(mixins.ObservableMixin):
 
     @injector.inject
     def __init__(self, resource_manager: resources.ResourceManager):
-        self._items = resource_manager.items
-
-        self.helms = self._build_helms()
-
-    @functools.cached_property
-    def helm_display_texts(self):
-        return sorted(helm.display_text for helm in self.helms.values())
-
-    def _build_helms(self):
+        super().__init__()
+        self._resource_manager = resource_manager
+        self._load_task = None
+        resource_manager.attach(self, self._on_resources, to='resources')
+
+    async def load(self):
+        """Loads the helms from the items resource, called once resources are ready."""
+        # sorted by display text and deduplicated (unique, display text, base) rows
+        rows = await self._resource_manager.load_or_build_derived(
+            'items', _HELMS_SUFFIX, functools.partial(self._build_helm_rows, self._resource_manager.items),
+            resources.save_json, resources.load_json)
+        self.helms = self._build_helms(rows)
+        self.helm_display_texts = list(self.helms)
+
+    async def _reload(self):
+        await self.load()
+        self.notify(helm_display_texts=self.helm_display_texts, _log=False)
+
+    def _on_resources(self, names):
+        if 'items' in names:
+            self._load_task = asyncio.create_task(self._reload())
+
+    def _build_helm_rows(self, items: Dict[str, List[Tuple[bool, str, str]]]) -> List[Tuple[bool, str, str]]:
+        helms = self._build_helms(items['helmet'])
+        return [(helms[display_text].unique, display_text, helms[display_text].base)
+                for display_text in sorted(helms)]
+
+    def _build_helms(self, rows: List[Tuple[bool, str, str]]) -> Dict[str, Helm]:
         helms = {}
-        for unique, display_text, base in self._items['helmet']:
+        for unique, display_text, base in rows:
             helms[display_text] = Helm(display_text=display_text, base=base, unique=unique)
         return helms
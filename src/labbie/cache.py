@@ -0,0 +1,483 @@
+import asyncio
+import base64
+import binascii
+import copy
+import dataclasses
+import hashlib
+import os
+import pathlib
+import shutil
+import threading
+import time
+import uuid
+from typing import BinaryIO, Callable, Dict, List, Optional, Protocol, Set, Tuple
+
+import loguru
+import orjson
+
+from labbie import errors
+from labbie import net
+
+logger = loguru.logger
+
+_INDEX_VERSION = 1
+_INDEX_NAME = 'index.json'
+_BLOBS_DIR = 'blobs'
+_TMP_DIR = 'tmp'
+_PARTIAL_DIR = 'partial'
+_VALIDATORS_SUFFIX = '.validators'
+_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+_RESUME_ATTEMPTS = 3
+_PARTIAL_MAX_AGE = 7 * 24 * 60 * 60  # seconds, after which partial downloads are no longer worth resuming
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    hash: str  # hex MD5 of the content
+    suffix: str  # e.g., .json.gz, kept so that the blob can be loaded based on its file type
+    size: int
+    created: float
+    accessed: float
+    validators: Optional[Dict[str, Optional[str]]] = None
+
+
+def file_md5(path: pathlib.Path) -> str:
+    md5 = hashlib.md5()
+    with path.open('rb') as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _fsync_path(path: pathlib.Path):
+    # NOTE: opened for appending since Windows requires write access to flush a file
+    with path.open('ab') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: pathlib.Path):
+    # directories can't be opened on Windows, where a rename is durable once the file's data is
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Sink(Protocol):
+    """Consumes the content of a BlobWriter as it is written, e.g., to parse it while it is downloaded."""
+
+    def feed(self, chunk: bytes):
+        ...
+
+    def reset(self):
+        ...
+
+
+class BlobWriter:
+    """A temporary file which hashes its content as it is written, for adding to the cache with put.
+
+    The file is removed if the block it is used in raises, e.g., when verify fails. A resumable writer is kept
+    when a download is interrupted instead, along with the validators of its content, so that a later writer
+    for the same key can resume the download with a Range request rather than starting over.
+    """
+
+    def __init__(self, path: pathlib.Path, resumable: bool = False, sink: Optional[Sink] = None):
+        self.path = path
+        self.resumable = resumable
+        self.sink = sink
+        self.size = 0
+        self._md5 = hashlib.md5()
+        self._file: Optional[BinaryIO] = None
+
+    @property
+    def _validators_path(self) -> pathlib.Path:
+        return self.path.with_name(f'{self.path.name}{_VALIDATORS_SUFFIX}')
+
+    def __enter__(self) -> 'BlobWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        began = self._file is not None
+        if began:
+            self._file.close()
+        if exc_type is None:
+            if began:
+                self._validators_path.unlink(missing_ok=True)
+        elif not (self.resumable and issubclass(exc_type, net.INTERRUPTED)):
+            self.path.unlink(missing_ok=True)
+            self._validators_path.unlink(missing_ok=True)
+
+    def resumable_from(self) -> Tuple[int, Optional[net.Validators]]:
+        """The size and validators of content kept from an interrupted download, (0, None) if none was."""
+        if not self.resumable:
+            return 0, None
+        try:
+            validators = net.Validators(**orjson.loads(self._validators_path.read_bytes()))
+            return self.path.stat().st_size, validators
+        except (FileNotFoundError, orjson.JSONDecodeError, TypeError):
+            return 0, None
+
+    def begin(self, validators: Optional[net.Validators], offset: int = 0):
+        """Opens the file for content described by validators, keeping the first offset bytes already written.
+
+        Kept bytes which weren't written by this writer, i.e., those of an earlier download, are hashed and
+        passed to the sink first. Without validators, the content can't be resumed if the download is
+        interrupted.
+        """
+        if self._file is not None:
+            self._file.close()
+        if offset < self.size or offset == 0:
+            self.size = 0
+            self._md5 = hashlib.md5()
+            if self.sink is not None:
+                self.sink.reset()
+
+        if self.resumable and validators is not None:
+            self._validators_path.write_bytes(orjson.dumps(dataclasses.asdict(validators)))
+        else:
+            self._validators_path.unlink(missing_ok=True)
+        if offset == 0:
+            self._file = self.path.open('wb')
+            return
+
+        self._file = self.path.open('r+b')
+        self._file.seek(self.size)
+        while self.size < offset:
+            chunk = self._file.read(min(_HASH_CHUNK_SIZE, offset - self.size))
+            if not chunk:
+                raise ValueError(f'{self.path} is shorter than {offset} bytes')
+            self._consume(chunk)
+        self._file.truncate(offset)
+
+    def write(self, data: bytes):
+        if self._file is None:
+            self.begin(None)
+        self._file.write(data)
+        self._consume(data)
+
+    def _consume(self, data: bytes):
+        self._md5.update(data)
+        self.size += len(data)
+        if self.sink is not None:
+            self.sink.feed(data)
+
+    @property
+    def hash(self) -> str:
+        return self._md5.hexdigest()
+
+    def verify(self, content_md5: Optional[str], size: Optional[int] = None):
+        """Raises DownloadCorrupt unless the content matches the base64 MD5 from a Content-MD5 header and the
+        expected size, either of which may be None when the server didn't send it."""
+        if size is not None and size != self.size:
+            raise errors.DownloadCorrupt(f'expected {size} bytes but received {self.size}')
+        if content_md5 is None:
+            return
+        try:
+            expected = base64.b64decode(content_md5, validate=True)
+        except binascii.Error:
+            logger.warning(f'ignoring malformed Content-MD5 {content_md5!r}')
+            return
+        if expected != self._md5.digest():
+            actual = base64.b64encode(self._md5.digest()).decode('ascii')
+            raise errors.DownloadCorrupt(f'expected MD5 {content_md5} but received {actual}')
+
+
+async def download(
+    client: net.HttpClient,
+    url: str,
+    writer: BlobWriter,
+    headers: Optional[Dict[str, str]] = None,
+    report: Optional[Callable[[Optional[float]], None]] = None,
+) -> Tuple[int, Optional[net.Validators]]:
+    """Downloads url into writer, returning 200 and the validators once the whole body has been written.
+
+    The body is only written and verified for a 200, any other status, e.g., a 304 for a conditional request,
+    is returned as is. A download interrupted by a network error is resumed with a Range request if the
+    server supports it, by this call up to a few times and otherwise by a later call with a writer for the
+    same key.
+    """
+    loop = asyncio.get_running_loop()
+    offset, validators = await loop.run_in_executor(None, writer.resumable_from)
+    attempt = 0
+    while True:
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers.update(validators.range_headers(offset))
+        async with client.get(url, headers=request_headers) as resp:
+            if resp.status == 206 and offset and net.range_start(resp) == offset:
+                logger.info(f'resuming download of {net.loggable(url)} at {offset} bytes')
+                # NOTE: the MD5 is of the whole blob, from the response which started the download
+                md5, size, resumable = validators.md5, net.range_total(resp), True
+            elif resp.status == 200:
+                offset = 0
+                validators = net.Validators.from_response(resp)
+                md5, size = net.expected_body(resp)
+                resumable = net.accepts_ranges(resp) and bool(validators.range_headers(1))
+            elif resp.status == 416 and offset:
+                # the kept content doesn't fit the current blob, start over
+                offset = 0
+                continue
+            else:
+                return resp.status, None
+
+            await loop.run_in_executor(None, writer.begin, validators if resumable else None, offset)
+            try:
+                async for chunk in resp.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+                    await loop.run_in_executor(None, writer.write, chunk)
+                    if report is not None:
+                        report(writer.size / size if size else None)
+            except net.INTERRUPTED as e:
+                if attempt >= _RESUME_ATTEMPTS or not resumable:
+                    raise
+                logger.warning(f'download of {net.loggable(url)} interrupted ({e!r}) at {writer.size} bytes')
+                offset = writer.size
+            else:
+                writer.verify(md5, size)
+                # a resumed download is complete as well, so callers only need to handle a 200
+                return 200, validators
+
+        await asyncio.sleep(net.backoff_delay(attempt))
+        attempt += 1
+
+
+class BlobCache:
+    """A bounded, content-addressed cache of downloaded files.
+
+    Files are stored as blobs named by the MD5 of their content, `blobs/ab/ab12...{suffix}`, and a small
+    index maps keys (e.g., `helm/league/2021-11-07`) to blobs. Files derived from a blob, e.g., scrape
+    snapshots, are stored next to it as `ab12...{other suffix}` and are removed along with it.
+
+    Blobs are made durable before they are renamed into place and only ever added whole, so a cached blob
+    with the size recorded in the index can be trusted without parsing it again.
+
+    When over budget, the least recently used entries are evicted first. Entries used since the cache was
+    opened are never evicted. There must be a single instance (and its namespaces) per root, instances are
+    safe to use from several threads.
+    """
+
+    def __init__(self, root: pathlib.Path, max_bytes: Optional[int] = None, max_age: Optional[float] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age  # seconds since an entry was last used
+        self._prefix = ''
+        self._lock = threading.RLock()
+        self._in_use: Set[str] = set()
+        # NOTE: keys used since the index was last saved, a set rather than a flag so namespaces share it
+        self._touched: Set[str] = set()
+        self._entries: Dict[str, CacheEntry] = self._load_index()
+
+    def namespace(self, name: str) -> 'BlobCache':
+        """A view of this cache in which all keys are prefixed by name."""
+        view = copy.copy(self)
+        view._prefix = f'{self._prefix}{name}/'
+        return view
+
+    @property
+    def _index_path(self):
+        return self.root / _INDEX_NAME
+
+    def _load_index(self) -> Dict[str, CacheEntry]:
+        try:
+            index = orjson.loads(self._index_path.read_bytes())
+            if index['version'] != _INDEX_VERSION:
+                raise ValueError(f'unsupported index version {index["version"]}')
+            return {key: CacheEntry(**entry) for key, entry in index['entries'].items()}
+        except FileNotFoundError:
+            return {}
+        except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+            # the blobs are swept by collect_garbage since nothing references them anymore
+            logger.exception(f'invalid cache index {self._index_path}, starting empty')
+            return {}
+
+    def _save_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        content = orjson.dumps({
+            'version': _INDEX_VERSION,
+            'entries': {key: dataclasses.asdict(entry) for key, entry in self._entries.items()},
+        })
+        tmp_path = self._index_path.with_name(f'{_INDEX_NAME}.tmp')
+        with tmp_path.open('wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._index_path)
+        self._touched.clear()
+
+    def flush(self):
+        """Saves the access times of entries used since the index was last saved."""
+        with self._lock:
+            if self._touched:
+                self._save_index()
+
+    def blob_path(self, hash: str, suffix: str) -> pathlib.Path:
+        return self.root / _BLOBS_DIR / hash[:2] / f'{hash}{suffix}'
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [key[len(self._prefix):] for key in self._entries if key.startswith(self._prefix)]
+
+    def entry(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            return self._entries.get(self._prefix + key)
+
+    def path(self, key: str) -> Optional[pathlib.Path]:
+        """The path of the blob for key, if it is cached, marking the entry as used.
+
+        The access time is only updated in memory, it is saved with the next change to the index or flush.
+        """
+        key = self._prefix + key
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path = self.blob_path(entry.hash, entry.suffix)
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                size = None
+            if size != entry.size:
+                # only possible if something outside the cache touched the blob
+                logger.warning(f'cached blob for {key} is missing or was modified, {size=} {entry.size=}')
+                del self._entries[key]
+                self._remove_unreferenced(entry.hash)
+                self._save_index()
+                return None
+            entry.accessed = time.time()
+            self._in_use.add(key)
+            self._touched.add(key)
+            return path
+
+    def validators(self, key: str) -> Optional[net.Validators]:
+        entry = self.entry(key)
+        if entry is None or entry.validators is None:
+            return None
+        return net.Validators(**entry.validators)
+
+    def temp_path(self, suffix: str = '') -> pathlib.Path:
+        """A unique path for a file which is later added with put."""
+        tmp_dir = self.root / _TMP_DIR
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tmp_dir / f'{uuid.uuid4().hex}{suffix}'
+
+    def writer(self, suffix: str = '', key: Optional[str] = None, sink: Optional[Sink] = None) -> BlobWriter:
+        """A writer for a file which is later added with put, which is resumable if it's for the given key."""
+        if key is None:
+            return BlobWriter(self.temp_path(suffix), sink=sink)
+        partial_dir = self.root / _PARTIAL_DIR
+        partial_dir.mkdir(parents=True, exist_ok=True)
+        name = hashlib.md5((self._prefix + key).encode('utf8')).hexdigest()
+        return BlobWriter(partial_dir / f'{name}{suffix}', resumable=True, sink=sink)
+
+    def put(self, key: str, path: pathlib.Path, suffix: str, validators: Optional[net.Validators] = None,
+            hash: Optional[str] = None) -> pathlib.Path:
+        """Moves the file at path into the cache as the content of key, returning its blob path.
+
+        The file is flushed to disk before it is renamed into place, so a crash never leaves a partial blob.
+        """
+        if hash is None:
+            hash = file_md5(path)
+        blob_path = self.blob_path(hash, suffix)
+        size = path.stat().st_size
+        now = time.time()
+        key = self._prefix + key
+        with self._lock:
+            if blob_path.exists():
+                # the same content is already cached, e.g., a resource which didn't change across versions
+                path.unlink()
+            else:
+                _fsync_path(path)
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(path, blob_path)
+                _fsync_dir(blob_path.parent)
+
+            previous = self._entries.get(key)
+            self._entries[key] = CacheEntry(
+                hash=hash, suffix=suffix, size=size, created=now, accessed=now,
+                validators=dataclasses.asdict(validators) if validators is not None else None,
+            )
+            self._in_use.add(key)
+            if previous is not None and previous.hash != hash:
+                self._remove_unreferenced(previous.hash)
+            self._save_index()
+            self.evict()
+        return blob_path
+
+    def remove(self, key: str):
+        key = self._prefix + key
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            self._in_use.discard(key)
+            if entry is not None:
+                self._remove_unreferenced(entry.hash)
+                self._save_index()
+
+    def _blob_files(self, hash: str) -> List[pathlib.Path]:
+        return list((self.root / _BLOBS_DIR / hash[:2]).glob(f'{hash}.*'))
+
+    def _remove_unreferenced(self, hash: str):
+        if any(entry.hash == hash for entry in self._entries.values()):
+            return
+        for path in self._blob_files(hash):
+            try:
+                path.unlink()
+            except OSError:
+                # e.g., a mapped snapshot on Windows, it is swept by collect_garbage on a later start
+                logger.exception(f'failed to remove {path}')
+
+    def evict(self):
+        """Evicts entries which weren't used within max_age and then the least recently used entries until the
+        cache (including derived files) fits in max_bytes."""
+        with self._lock:
+            now = time.time()
+            evicted = []
+            if self.max_age is not None:
+                evicted = [key for key, entry in self._entries.items()
+                           if now - entry.accessed > self.max_age and key not in self._in_use]
+
+            if self.max_bytes is not None:
+                sizes = {}
+                for entry in self._entries.values():
+                    if entry.hash not in sizes:
+                        sizes[entry.hash] = sum(path.stat().st_size for path in self._blob_files(entry.hash))
+                total = sum(sizes.values())
+                remaining = {key: entry for key, entry in self._entries.items() if key not in evicted}
+                for key, entry in sorted(remaining.items(), key=lambda item: item[1].accessed):
+                    if total <= self.max_bytes:
+                        break
+                    if key in self._in_use:
+                        continue
+                    evicted.append(key)
+                    del remaining[key]
+                    if not any(other.hash == entry.hash for other in remaining.values()):
+                        total -= sizes[entry.hash]
+
+            if not evicted:
+                return
+            for key in evicted:
+                logger.info(f'evicting {key} from the cache')
+                entry = self._entries.pop(key)
+                self._remove_unreferenced(entry.hash)
+            self._save_index()
+
+    def collect_garbage(self):
+        """Removes temporary files, stale partial downloads and blobs (with their derived files) which no
+        entry references."""
+        with self._lock:
+            shutil.rmtree(self.root / _TMP_DIR, ignore_errors=True)
+            now = time.time()
+            for path in (self.root / _PARTIAL_DIR).glob('*'):
+                if now - path.stat().st_mtime > _PARTIAL_MAX_AGE:
+                    path.unlink(missing_ok=True)
+            referenced = {entry.hash for entry in self._entries.values()}
+            for path in (self.root / _BLOBS_DIR).glob('*/*'):
+                if path.name.split('.', 1)[0] not in referenced:
+                    try:
+                        path.unlink()
+                    except OSError:
+                        logger.exception(f'failed to remove {path}')
+            self.evict()
+            self.flush()
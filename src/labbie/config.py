@@ -44,6 +44,9 @@ class HotkeysConfig(mixins.ObservableMixin, mixins.SerializableMixin):
 class OcrConfig(mixins.SerializableMixin):
     clear_previous: bool = True
     bounds: _Bounds = _Bounds(left=335, top=210, right=916, bottom=455)
+    # how OCR results are matched to enchants, 'lines' to match groups of lines (tolerates OCR mistakes) or
+    # 'spotting' to find enchants anywhere in the text (tolerates OCR merging or splitting lines)
+    matching: str = 'lines'
 
 
 @dataclasses.dataclass
@@ -0,0 +1,169 @@
+"""Characters which OCR confuses with each other, e.g., c/t, l/I and 0/O.
+
+Helm enchants and OCR lines are matched after folding both with a confusion table, which maps every
+character in a class of confusable characters to the first character of its class. The table is data, it
+ships as assets/ocr_confusions.json and is regenerated from logged captures with
+
+    python -m labbie.confusables logs/enchants.jsonl
+"""
+import argparse
+import collections
+import dataclasses
+import functools
+import hashlib
+import pathlib
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import loguru
+import orjson
+
+from labbie import utils
+
+logger = loguru.logger
+_MIN_COUNT = 3  # times a substitution has to be seen in captures before its characters are folded together
+
+
+def default_path() -> pathlib.Path:
+    return utils.assets_dir() / 'ocr_confusions.json'
+
+
+@dataclasses.dataclass(frozen=True)
+class ConfusionTable:
+    # strings of characters which are confused with each other, each is folded to the first character
+    classes: Tuple[str, ...] = ()
+    # mistakes which span several characters, replaced before folding
+    substitutions: Tuple[Tuple[str, str], ...] = ()
+
+    @functools.cached_property
+    def _translation(self) -> Dict[int, str]:
+        return {ord(char): class_[0] for class_ in self.classes for char in class_[1:]}
+
+    @functools.cached_property
+    def digest(self) -> str:
+        """Changes with the table, for anything derived from folded strings."""
+        return hashlib.md5(orjson.dumps(self.to_dict())).hexdigest()[:8]
+
+    def fold(self, text: str) -> str:
+        for krangle, fix in self.substitutions:
+            text = text.replace(krangle, fix)
+        return text.translate(self._translation)
+
+    def to_dict(self):
+        return {'classes': list(self.classes), 'substitutions': [list(sub) for sub in self.substitutions]}
+
+    @classmethod
+    def from_dict(cls, d) -> 'ConfusionTable':
+        return cls(classes=tuple(d.get('classes', ())),
+                   substitutions=tuple(tuple(sub) for sub in d.get('substitutions', ())))
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> 'ConfusionTable':
+        return cls.from_dict(orjson.loads(path.read_bytes()))
+
+    def save(self, path: pathlib.Path):
+        path.write_bytes(orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2) + b'\n')
+
+
+@functools.lru_cache(maxsize=None)
+def default_table() -> ConfusionTable:
+    path = default_path()
+    if not path.exists():
+        logger.warning(f'OCR confusion table not found at {path}, OCR results are matched as is')
+        return ConfusionTable()
+    return ConfusionTable.load(path)
+
+
+def substitutions(observed: str, actual: str) -> List[Tuple[str, str]]:
+    """The (observed, actual) character substitutions of the best alignment of actual within observed.
+
+    Observed is an OCR result which may contain other text around actual, e.g., other lines of a capture, so
+    leading and trailing characters of observed are skipped for free.
+    """
+    # costs[i][j] is the edit distance between actual[:i] and the best suffix of observed[:j]
+    costs = [[0] * (len(observed) + 1)]
+    for i, char in enumerate(actual, start=1):
+        previous, row = costs[-1], [i]
+        for j, other in enumerate(observed, start=1):
+            row.append(min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (char != other)))
+        costs.append(row)
+
+    i, j = len(actual), min(range(len(observed) + 1), key=lambda j: costs[-1][j])
+    result = []
+    while i > 0:
+        if j > 0 and costs[i][j] == costs[i - 1][j - 1] + (actual[i - 1] != observed[j - 1]):
+            if actual[i - 1] != observed[j - 1]:
+                result.append((observed[j - 1], actual[i - 1]))
+            i, j = i - 1, j - 1
+        elif costs[i][j] == costs[i - 1][j] + 1:
+            i -= 1
+        else:
+            j -= 1
+    result.reverse()
+    return result
+
+
+def learn(captures: Iterable[Tuple[str, Sequence[str]]], base: ConfusionTable = ConfusionTable(),
+          min_count: int = _MIN_COUNT) -> ConfusionTable:
+    """Extends base with the character substitutions seen at least min_count times in captures.
+
+    Each capture is the raw OCR text along with the enchants it was matched to.
+    """
+    counts = collections.Counter()
+    for text, enchants in captures:
+        for enchant in enchants:
+            counts.update(frozenset(sub) for sub in substitutions(text, enchant))
+
+    # merge confused characters into classes, keeping the first character of existing classes canonical
+    parent: Dict[str, str] = {}
+
+    def find(char):
+        while parent.setdefault(char, char) != char:
+            char = parent[char]
+        return char
+
+    def union(a, b):
+        parent[find(b)] = find(a)
+
+    for class_ in base.classes:
+        for char in class_[1:]:
+            union(class_[0], char)
+    for pair, count in counts.items():
+        if count >= min_count:
+            logger.info(f'learned confusion {sorted(pair)} ({count=})')
+            union(*sorted(pair))
+
+    classes = collections.defaultdict(list)
+    for char in parent:
+        classes[find(char)].append(char)
+    return ConfusionTable(
+        classes=tuple(root + ''.join(sorted(c for c in chars if c != root))
+                      for root, chars in sorted(classes.items()) if len(chars) > 1),
+        substitutions=base.substitutions)
+
+
+def read_captures(path: pathlib.Path) -> List[Tuple[str, List[str]]]:
+    """Captures logged by the app (see AppPresenter.screen_capture) which include the raw OCR lines."""
+    captures = []
+    with path.open('rb') as f:
+        for line in f:
+            record = orjson.loads(line)
+            if 'ocr' in record:
+                captures.append(('\n'.join(record['ocr']), record['enchants']))
+    return captures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Learns the OCR confusion table from logged captures.')
+    parser.add_argument('log', type=pathlib.Path, help='enchants.jsonl in the logs directory')
+    parser.add_argument('--output', type=pathlib.Path, default=default_path())
+    parser.add_argument('--min-count', type=int, default=_MIN_COUNT)
+    args = parser.parse_args()
+
+    base = ConfusionTable.load(args.output) if args.output.exists() else ConfusionTable()
+    table = learn(read_captures(args.log), base, args.min_count)
+    table.save(args.output)
+    print(f'wrote {len(table.classes)} classes to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
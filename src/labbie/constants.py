@@ -90,7 +90,7 @@ class BaseConstants(mixins.SerializableMixin):
     @classmethod
     def from_dict(cls, d):
         config = dacite.Config(
-            cast=[pathlib.Path],
+            cast=[pathlib.Path, int],
             type_hooks={bool: lambda v: v if isinstance(v, bool) else v.lower() in ('t', 'true', '1')}
         )
         return super().from_dict(d, config=config)
@@ -105,6 +105,12 @@ class Constants(BaseConstants):
     config_dir: pathlib.Path = _DEFAULT_CONFIG_DIR
     user_agent: str = f'Labbie v{version.__version__}'
     dilate: bool = False
+    # budget of the download cache, least recently used scrapes and resources are evicted beyond it
+    cache_max_mb: int = 1024
+    cache_max_age_days: int = 30
+    # blob containers which scrapes and resources are downloaded from, e.g., a local server for benchmarks
+    enchants_base_url: str = 'https://labbie.blob.core.windows.net/enchants'
+    resources_base_url: str = 'https://labbie.blob.core.windows.net/resources'
 
     @functools.cached_property
     def logs_dir(self):
@@ -118,10 +124,15 @@ class Constants(BaseConstants):
     def screenshots_dir(self):
         return self.data_dir / 'screenshots'
 
+    # NOTE: where older versions cached resources, removed once the cache holds them (see cache_dir)
     @functools.cached_property
     def resources_dir(self):
         return self.data_dir / 'resources'
 
+    @functools.cached_property
+    def cache_dir(self):
+        return self.data_dir / 'cache'
+
     @classmethod
     def from_toml(cls, path: pathlib.Path, overrides=None):
         with path.open() as f:
@@ -1,6 +1,7 @@
 import injector
 import loguru
 
+from labbie import cache
 from labbie import config
 from labbie import constants
 
@@ -23,3 +24,9 @@ class Module(injector.Module):
         loaded = config.Config.load(base_path=constants.config_dir)
         logger.debug(f'Loaded config {loaded}')
         return loaded
+
+    @injector.singleton
+    @injector.provider
+    def provide_blob_cache(self, constants: constants.Constants) -> cache.BlobCache:
+        return cache.BlobCache(constants.cache_dir, max_bytes=constants.cache_max_mb * 1024 * 1024,
+                               max_age=constants.cache_max_age_days * 24 * 60 * 60)
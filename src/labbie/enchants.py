@@ -1,29 +1,50 @@
 import asyncio
-import collections
 import dataclasses
 import datetime
 import enum
-import gzip
-import io
+import functools
 import pathlib
 import re
-from typing import List, NamedTuple, Optional
+import zlib
+from typing import Callable, List, NamedTuple, Optional
 
 import aiohttp
 import loguru
 import orjson
 
+from labbie import cache
 from labbie import constants
 from labbie import errors
+from labbie import index
 from labbie import mixins
+from labbie import net
+from labbie import snapshot
+from labbie import store
+from labbie import summary
 
 logger = loguru.logger
-_FILENAME_FORMAT = '{date:%Y-%m-%d}.json.gz'
-_URL_FORMAT = f'https://labbie.blob.core.windows.net/enchants/{{type}}/{_FILENAME_FORMAT}'
-_VALUE_PATTERN = re.compile(r'-?\d+')
+_FILENAME_SUFFIX = '.json.gz'
+_KEY_FORMAT = '{date:%Y-%m-%d}'
+_FILENAME_FORMAT = f'{_KEY_FORMAT}{_FILENAME_SUFFIX}'
+_FILENAME_GLOB = f'*{_FILENAME_SUFFIX}'
+_URL_FORMAT = f'{{base_url}}/{{type}}/{_FILENAME_FORMAT}'
+# NOTE: the manifest is optional, it names the newest published scrape, e.g., {"date": "2021-11-07"}, and
+# saves probing the date window when it exists
+_MANIFEST_URL_FORMAT = '{base_url}/{type}/latest.json'
+_PROBE_CONCURRENCY = 4
 _HISTORICAL_DAYS = 15
-_REFRESH_DELAY = 5 * 60  # 5 minutes
+_READ_CHUNK_SIZE = 256 * 1024
+# NOTE: data is decompressed at most a read chunk at a time, rows which don't parse within a few chunks can
+# only be corrupt data, which would otherwise be buffered and parsed again and again
+_MAX_UNPARSED_SIZE = 4 * _READ_CHUNK_SIZE
+_PARTIAL_SUFFIX = '.part'
+_ROW_BOUNDARY = re.compile(rb'\]\s*,\s*\[')
 _Constants = constants.Constants
+_HttpClient = net.HttpClient
+_BlobCache = cache.BlobCache
+_EnchantStore = store.EnchantStore
+_EnchantRows = store.EnchantRows
+inexact_mod = index.inexact_mod
 
 
 class Helm(NamedTuple):
@@ -35,38 +56,8 @@ class Helm(NamedTuple):
     unique: bool
 
 
-@dataclasses.dataclass
-class Enchant:
-
-    account: str
-    character: str
-    item_name: str
-    item_base: str
-    display_name: str = dataclasses.field(init=False, default=None)
-    ilvl: int
-    influences: List[str]
-    unique: bool
-    mods: List[str]
-
-    def __post_init__(self):
-        self.display_name = self.item_name if self.unique else self.item_base
-
-    def matches_helm(self, target: Helm):
-        if target.unique:
-            if self.item_name != target.item_name:
-                return False
-        else:
-            if self.item_base != target.item_base or self.unique:
-                return False
-
-        if self.ilvl < target.ilvl:
-            return False
-
-        for influence in target.influences:
-            if influence not in self.influences:
-                return False
-
-        return True
+# NOTE: enchants are stored columnar in an EnchantStore, Enchant is the row view handed out to callers
+Enchant = store.EnchantView
 
 
 class State(enum.Enum):
@@ -74,111 +65,162 @@ class State(enum.Enum):
     DISABLED = 'Disabled via settings'
     DOWNLOADING = 'Downloading latest'
     LOADING = 'Loading'
+    PARSING = 'Parsing'
+    INDEXING = 'Indexing'
     LOADED = 'Loaded'
     MISSING = 'Missing enchant data'
 
 
+# report(state, progress) is called from worker threads while loading, progress is None or in [0, 1]
+Reporter = Callable[[State, Optional[float]], None]
+
+
+def _no_report(state: State, progress: Optional[float] = None):
+    pass
+
+
 @dataclasses.dataclass
 class Enchants(mixins.ObservableMixin):
 
     type: str
     state: State = State.DISABLED
-    enchants: Optional[List[Enchant]] = None
+    store: Optional[_EnchantStore] = None
     date: Optional[datetime.date] = None
+    progress: Optional[float] = None
+    stale: bool = False  # a cached scrape is in use while checking for a newer one
 
     def __post_init__(self):
         super().__init__()
-        self._refresh_task = None
+        # NOTE: the following attributes are set by download_or_load
+        self._base_url: Optional[str] = None
+        self._scrapes: Optional[_BlobCache] = None
+        self._client: Optional[_HttpClient] = None
 
-    def set_enchants(self, date: Optional[datetime.date], enchants: Optional[List[Enchant]]):
+    def set_state(self, state: State, progress: Optional[float] = None):
+        if state is self.state and progress == self.progress:
+            return
+        self.state = state
+        self.progress = progress
+        self.notify(state=(state, progress), _log=False)
+
+    def _reporter(self) -> Reporter:
+        loop = asyncio.get_running_loop()
+
+        def report(state: State, progress: Optional[float] = None):
+            loop.call_soon_threadsafe(self.set_state, state, progress)
+        return report
+
+    async def _load(self, scrapes: _BlobCache, date: Optional[datetime.date]):
+        # NOTE: decompression, parsing and index building are slow for large scrapes, so they run in a worker
+        # thread to keep the ui responsive
+        self.set_state(State.LOADING)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(load_enchants, scrapes, date=date, report=self._reporter()))
+
+    async def _download(self, scrapes: _BlobCache, client: _HttpClient,
+                        date: Optional[datetime.date] = None):
+        if self.store is None:
+            self.set_state(State.DOWNLOADING)
+            report = self._reporter()
+        else:
+            # NOTE: the loaded scrape stays searchable until the download replaces it
+            report = _no_report
+        if date is not None:
+            return await download_date(scrapes, self.type, client, date, report=report,
+                                       base_url=self._base_url)
+        return await download(scrapes, self.type, client, past_days=_HISTORICAL_DAYS, report=report,
+                              base_url=self._base_url)
+
+    def set_enchants(self, date: Optional[datetime.date], enchants: Optional[_EnchantStore],
+                     stale: bool = False):
+        self.set_stale(stale)
         if enchants is not None:
-            self.state = State.LOADED
+            enchants.build_indexes()
+            self.set_state(State.LOADED)
         else:
-            self.state = State.DISABLED
-            if self._refresh_task:
-                self._refresh_task.cancel()
-                self._refresh_task = None
-        self.enchants = enchants
+            self.set_state(State.DISABLED)
+        self.store = enchants
         self.date = date
-        self.notify(enchants=enchants, date=date, _log=False)
+        self.notify(enchants=self.enchants, date=date, _log=False)
+
+    def set_stale(self, stale: bool):
+        if stale is not self.stale:
+            self.stale = stale
+            self.notify(stale=stale)
 
     def refresh_needed(self):
         return self.date != datetime.date.today()
 
-    async def download_or_load(self, constants: _Constants):
-        logger.info(f'starting refresh task for {self.type}')
-        self._refresh_task = asyncio.create_task(self._download_when_available(constants))
-
-        cache_dir = constants.helm_enchants_dir / self.type
-        today = today_utc()
-
-        # first try to load from cache if most recent data is cached
+    async def download_or_load(self, constants: _Constants, client: _HttpClient, blob_cache: _BlobCache):
+        """Loads the newest cached scrape or downloads one, refresh keeps it up to date afterwards."""
+        scrapes = blob_cache.namespace(f'helm/{self.type}')
+        self._base_url = constants.enchants_base_url
+        self._scrapes = scrapes
+        self._client = client
+        loop = asyncio.get_running_loop()
+        legacy_dir = constants.helm_enchants_dir / self.type
+        await loop.run_in_executor(None, import_legacy_scrapes, scrapes, legacy_dir)
+
+        # NOTE: offline first, the newest cached scrape is searchable right away and revalidated in the
+        # background, so the time to the first search doesn't depend on the network
         try:
-            self.state = State.LOADING
-            date, enchants = load_enchants(cache_dir, date=today)
-            self.set_enchants(date, enchants)
+            date, enchants = await self._load(scrapes, None)
+            self.set_enchants(date, enchants, stale=date != today_utc())
             return
         except errors.EnchantDataNotFound:
             pass
 
-        # either most recent data cache was corrupt or we don't have it, load most recent cached if it's
-        # the most recent downloadable, otherwise download latest
-        first_cached, last_cached = cached_dates(cache_dir)
-        last_downloadable = await last_downloadable_date(constants.user_agent, self.type, past_days=_HISTORICAL_DAYS)
-
-        # try to load (fresh) cached content if we can
-        if last_cached is not None:
-            date = last_cached
-            earliest_date = first_cached if last_downloadable is None else last_downloadable
-            while date >= earliest_date:
-                try:
-                    self.state = State.LOADING
-                    date, enchants = load_enchants(cache_dir, date=date)
-                    self.set_enchants(date, enchants)
-                    return
-                except errors.EnchantDataInvalid:
-                    date -= datetime.timedelta(days=1)
-                except errors.EnchantDataNotFound:
-                    # ignore missing files
-                    break
-
-        if last_downloadable is None:
-            self.state = State.MISSING
-            return
-
         try:
-            self.state = State.DOWNLOADING
-            date, enchants = await download(cache_dir, self.type, constants.user_agent,
-                                            past_days=_HISTORICAL_DAYS)
+            date, enchants = await self._download(scrapes, client)
             self.set_enchants(date, enchants)
         except errors.EnchantDataNotFound:
-            # this shouldn't happen because we checked the last downloadable date and one existed within
-            # _HISTORICAL_DAYS
-            logger.debug(f'{first_cached=} {last_cached=} {last_downloadable=}')
-            raise
-
-    async def _download_when_available(self, constants: _Constants):
-        await asyncio.sleep(15)
-        cache_dir = constants.helm_enchants_dir / self.type
-        while True:
-            if self.date == today_utc():
-                now = datetime.datetime.now(datetime.timezone.utc)
-                tomorrow = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0)
-                duration = (tomorrow - now).total_seconds()
-                logger.info(f'{self.type} scrape is fresh, sleeping until tomorrow ({duration=})')
-                await asyncio.sleep(duration)
-
-            while True:
-                logger.info(f'checking if fresh {self.type} scrape is downloadable')
-                available = await last_downloadable_date(constants.user_agent, self.type, 1)
-                if available:
-                    self.state = State.DOWNLOADING
-                    date, enchants = await download(cache_dir, self.type, constants.user_agent,
-                                                    past_days=_HISTORICAL_DAYS)
-                    self.set_enchants(date, enchants)
-                    break
-                else:
-                    await asyncio.sleep(_REFRESH_DELAY)
+            self.set_state(State.MISSING)
+
+    async def refresh(self) -> Optional[bool]:
+        """Checks for a newer scrape, returns whether one was loaded or None if today's isn't published yet.
+
+        Called by the refresh scheduler once download_or_load is done.
+        """
+        date = self.date
+        if self.store is None:
+            try:
+                self.set_enchants(*await self._download(self._scrapes, self._client))
+            except errors.EnchantDataNotFound:
+                self.set_state(State.MISSING)
+                return None
+        elif self.stale:
+            await self._revalidate(self._scrapes, self._client)
+
+        if self.date == today_utc():
+            return self.date != date
+        # a single GET, which 404s until the scrape is published
+        result = await self._download(self._scrapes, self._client, today_utc())
+        if result is None:
+            return None
+        self.set_enchants(*result)
+        return True
+
+    async def _revalidate(self, scrapes: _BlobCache, client: _HttpClient):
+        """Replaces a stale scrape with the newest published one, if there is a newer one."""
+        try:
+            last_downloadable = await last_downloadable_date(client, self.type, past_days=_HISTORICAL_DAYS,
+                                                             base_url=self._base_url)
+            if last_downloadable is not None and last_downloadable > self.date:
+                # NOTE: the date was just found, so the newer scrape is fetched without probing for it again
+                result = await self._download(scrapes, client, last_downloadable)
+                if result is not None:
+                    self.set_enchants(*result)
+            else:
+                self.set_stale(False)
+        except (aiohttp.ClientError, asyncio.TimeoutError, errors.EnchantDataNotFound):
+            logger.exception(f'failed to revalidate {self.type} scrape, continuing with {self.date=}')
+
+    @property
+    def enchants(self) -> Optional[_EnchantRows]:
+        if self.store is None:
+            return None
+        return self.store.all()
 
     @property
     def enabled(self):
@@ -189,224 +231,364 @@ class Enchants(mixins.ObservableMixin):
         if self.state is not State.LOADED:
             raise errors.EnchantsNotLoaded
 
-        return set(enchant.display_name for enchant in self.enchants)
+        return set(self.store.strings[id_] for id_ in self.store.attribute_index.first_rows)
 
     @property
     def mods(self):
         if self.state is not State.LOADED:
             raise errors.EnchantsNotLoaded
 
-        mods = set()
-        for enchant in self.enchants:
-            mods.update(set(enchant.mods))
-
-        return mods
+        return set(self.store.mods)
 
     def find_matching_enchants(self, target: str):
         if self.state is not State.LOADED:
             raise errors.EnchantsNotLoaded
-        return find_matching_enchants(self.enchants, target)
+        return find_matching_enchants(self.store, target)
 
     def find_matching_helms(self, target: Helm):
         if self.state is not State.LOADED:
             raise errors.EnchantsNotLoaded
-        return find_matching_helms(self.enchants, target)
+        return find_matching_helms(self.store, target)
 
     def find_matching_bases(self, base_name: str, ilvl: int, influences: List[str]):
         logger.debug(f'{influences=}')
         if self.state is not State.LOADED:
             raise errors.EnchantsNotLoaded
 
-        for enchant in self.enchants:
-            if enchant.display_name == base_name:
-                unique = enchant.unique
-                item_name = enchant.item_name
-                item_base = enchant.item_base
-                logger.debug(f'found match for {base_name=} - {unique=} {item_name=} {item_base=}')
-                break
-        else:
+        row = self.store.attribute_index.first_row(base_name)
+        if row is None:
             raise errors.NoSuchBase
+        enchant = self.store.all()[row]
+        unique = enchant.unique
+        item_name = enchant.item_name
+        item_base = enchant.item_base
+        logger.debug(f'found match for {base_name=} - {unique=} {item_name=} {item_base=}')
         helm = Helm(item_name=item_name, item_base=item_base, ilvl=ilvl, influences=influences, unique=unique)
-        return find_matching_helms(self.enchants, helm)
+        return find_matching_helms(self.store, helm)
 
 
 def today_utc():
     return datetime.datetime.now(datetime.timezone.utc).date()
 
 
-def refresh_needed(cache_dir: pathlib.Path):
-    path = cache_dir / _FILENAME_FORMAT.format(date=today_utc())
-    return not path.exists()
+def refresh_needed(scrapes: _BlobCache):
+    return scrapes.entry(_KEY_FORMAT.format(date=today_utc())) is None
 
 
-def cached_dates(cache_dir: pathlib.Path):
-    paths = sorted(cache_dir.iterdir())
-
-    earliest_date = None
-    for path in paths:
+def cached_dates(scrapes: _BlobCache):
+    dates = []
+    for key in scrapes.keys():
         try:
-            earliest_date = datetime.date.fromisoformat(path.stem)
-            break
+            dates.append(datetime.date.fromisoformat(key))
         except ValueError:
             pass
-    else:
-        # short circuit if we found no valid date filenames
+
+    if not dates:
         return None, None
 
-    latest_date = None
-    for path in reversed(paths):
+    return min(dates), max(dates)
+
+
+def import_legacy_scrapes(scrapes: _BlobCache, legacy_dir: pathlib.Path):
+    """Moves scrapes cached by older versions, one file per date in legacy_dir, into the blob cache."""
+    if not legacy_dir.is_dir():
+        return
+
+    for path in legacy_dir.glob(_FILENAME_GLOB):
         try:
-            latest_date = datetime.date.fromisoformat(path.stem)
-            break
+            date = datetime.date.fromisoformat(path.name[:-len(_FILENAME_SUFFIX)])
         except ValueError:
-            pass
+            continue
+        key = _KEY_FORMAT.format(date=date)
+        if scrapes.entry(key) is None:
+            logger.info(f'importing {path} into the cache')
+            scrapes.put(key, path, _FILENAME_SUFFIX)
+        else:
+            path.unlink()
 
-    return earliest_date, latest_date
+    # the snapshots and validators of the legacy files are rebuilt (or refetched) as needed
+    for path in legacy_dir.iterdir():
+        try:
+            path.unlink()
+        except OSError:
+            logger.exception(f'failed to remove {path}')
+    try:
+        legacy_dir.rmdir()
+    except OSError:
+        pass
 
 
-async def last_downloadable_date(user_agent: str, type_: str, past_days):
+def _date_window(past_days: int) -> List[datetime.date]:
+    """The dates of the last past_days days, newest first."""
     today = today_utc()
-    async with aiohttp.ClientSession(headers={'User-Agent': user_agent}) as session:
-        for days_back in range(past_days):
-            date = today - datetime.timedelta(days=days_back)
-            async with session.head(_URL_FORMAT.format(type=type_, date=date)) as resp:
-                if resp.status == 404:
-                    continue
+    return [today - datetime.timedelta(days=days_back) for days_back in range(past_days)]
+
+
+async def last_downloadable_date(client: _HttpClient, type_: str, past_days: int, base_url: str):
+    return await _newest_available_date(client, base_url, type_, _date_window(past_days))
+
+
+async def _newest_available_date(client: _HttpClient, base_url: str, type_: str,
+                                 dates: List[datetime.date]) -> Optional[datetime.date]:
+    """Returns the newest of dates (ordered newest first) for which a scrape is published, if any."""
+    if not dates:
+        return None
+
+    manifest_date = await _manifest_date(client, base_url, type_)
+    if manifest_date is not None and manifest_date in dates:
+        return manifest_date
+    return await _probe_dates(client, base_url, type_, dates)
+
+
+async def _manifest_date(client: _HttpClient, base_url: str,
+                         type_: str) -> Optional[datetime.date]:
+    try:
+        async with client.get(_MANIFEST_URL_FORMAT.format(base_url=base_url, type=type_)) as resp:
+            if resp.status != 200:
+                return None
+            manifest = orjson.loads(await resp.read())
+        return datetime.date.fromisoformat(manifest['date'])
+    except (aiohttp.ClientError, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        logger.exception(f'invalid {type_} manifest, probing dates instead')
+        return None
+
+
+async def _probe_dates(client: _HttpClient, base_url: str, type_: str,
+                       dates: List[datetime.date]) -> Optional[datetime.date]:
+    semaphore = asyncio.Semaphore(_PROBE_CONCURRENCY)
 
+    async def probe(date):
+        async with semaphore:
+            async with client.head(_URL_FORMAT.format(base_url=base_url, type=type_, date=date)) as resp:
+                return resp.status != 404
+
+    # NOTE: probes are started newest first and the semaphore wakes waiters in order, so the newest dates are
+    # checked first and the remaining probes are cancelled as soon as the newest published date is known
+    probes = [asyncio.create_task(probe(date)) for date in dates]
+    try:
+        for date, published in zip(dates, probes):
+            if await published:
                 return date
-    return None
+        return None
+    finally:
+        for published in probes:
+            published.cancel()
+        await asyncio.gather(*probes, return_exceptions=True)
 
 
-async def download(cache_dir: pathlib.Path, type_: str, user_agent: str, past_days: int):
+async def download(scrapes: _BlobCache, type_: str, client: _HttpClient, past_days: int, base_url: str,
+                   report: Reporter = _no_report):
     logger.info(f'downloading {type_} enchants')
-    today = today_utc()
-    async with aiohttp.ClientSession(headers={'User-Agent': user_agent}) as session:
-        for days_back in range(past_days):
-            date = today - datetime.timedelta(days=days_back)
-            async with session.get(_URL_FORMAT.format(type=type_, date=date)) as resp:
-                if resp.status == 404:
-                    continue
-
-                logger.info(f'found data for {date=:%Y-%m-%d}')
-                content = await resp.content.read()
-                path = cache_dir / _FILENAME_FORMAT.format(date=date)
-                with path.open('wb') as f:
-                    f.write(content)
-                with gzip.open(io.BytesIO(content)) as f:
-                    decompressed_content = f.read()
-                try:
-                    enchants = [Enchant(*vals) for vals in orjson.loads(decompressed_content)]
-                except orjson.JSONDecodeError:
-                    logger.error(f'Invalid enchant data downloaded for {date=}')
-                    path.unlink()
-                    continue
-                return date, enchants
-
-        logger.error(f'no data found for the last {past_days} days, aborting')
-        # if nothing was found for the window, raise
-        raise errors.EnchantDataNotFound
-
-
-def load_enchants(cache_dir: pathlib.Path, date=None):
+    dates = _date_window(past_days)
+    if (date := await _newest_available_date(client, base_url, type_, dates)) is not None:
+        if (result := await download_date(scrapes, type_, client, date, base_url, report)) is not None:
+            return result
+        # NOTE: the newest scrape is invalid, which is rare, so older dates are walked newest first with a GET
+        # each (which 404s if the date isn't published) rather than fetching the manifest and probing again
+        for older in (older for older in dates if older < date):
+            if (result := await download_date(scrapes, type_, client, older, base_url, report)) is not None:
+                return result
+
+    logger.error(f'no data found for the last {past_days} days, aborting')
+    # if nothing was found for the window, raise
+    raise errors.EnchantDataNotFound
+
+
+async def download_date(scrapes: _BlobCache, type_: str, client: _HttpClient, date: datetime.date,
+                        base_url: str, report: Reporter = _no_report):
+    """Downloads the scrape for date with a single GET, returns None if it isn't published or is invalid.
+
+    If the scrape is already cached it is revalidated with a conditional GET instead.
+    """
+    loop = asyncio.get_running_loop()
+    key = _KEY_FORMAT.format(date=date)
+    validators = scrapes.validators(key)
+    headers = validators.conditional_headers() if validators else {}
+    url = _URL_FORMAT.format(base_url=base_url, type=type_, date=date)
+    # NOTE: the body is written to a partial file while it is hashed, decompressed and parsed, so peak memory
+    # stays flat, and only added to the cache once the whole scrape has been verified. An interrupted download
+    # is resumed rather than started over.
+    stream = ScrapeStream()
+    try:
+        with scrapes.writer(_PARTIAL_SUFFIX, key=key, sink=stream) as writer:
+            status, validators = await cache.download(
+                client, url, writer, headers, report=functools.partial(report, State.DOWNLOADING))
+            if status == 200:
+                logger.info(f'downloaded data for {date=:%Y-%m-%d}')
+                enchants = await loop.run_in_executor(None, stream.finish)
+    except (errors.EnchantDataInvalid, errors.DownloadCorrupt):
+        logger.exception(f'Invalid enchant data downloaded for {date=}')
+        return None
+
+    if status == 200:
+        await loop.run_in_executor(None, _cache_scrape, scrapes, key, writer, validators, enchants, report)
+        return date, enchants
+    if status == 404:
+        return None
+    if status != 304:
+        logger.error(f'failed to download data for {date=:%Y-%m-%d}, {status=}')
+        return None
+
+    logger.info(f'cached data for {date=:%Y-%m-%d} is up to date')
+    try:
+        return await loop.run_in_executor(None, functools.partial(load_enchants, scrapes, date, report))
+    except errors.EnchantDataNotFound:
+        # the cached copy was invalid and has been removed along with its validators, download it again
+        return await download_date(scrapes, type_, client, date, base_url, report)
+
+
+def _cache_scrape(scrapes: _BlobCache, key: str, writer: cache.BlobWriter, validators: net.Validators,
+                  enchants: _EnchantStore, report: Reporter):
+    path = scrapes.put(key, writer.path, _FILENAME_SUFFIX, validators=validators, hash=writer.hash)
+    report(State.INDEXING, None)
+    enchants.build_indexes()
+    try:
+        snapshot.write(path, enchants)
+    except OSError:
+        # a missing snapshot only costs a slower start, it is rebuilt on the next load
+        logger.exception(f'failed to write snapshot for {path}')
+
+
+def load_enchants(scrapes: _BlobCache, date=None, report: Reporter = _no_report):
     if date is not None:
         dates = (date, )
     else:
-        today = today_utc()
-        dates = (today - datetime.timedelta(days=days_back) for days_back in range(15))
+        dates = _date_window(_HISTORICAL_DAYS)
 
     for date in dates:
-        path = cache_dir / _FILENAME_FORMAT.format(date=date)
-        if path.exists():
+        key = _KEY_FORMAT.format(date=date)
+        if (path := scrapes.path(key)) is not None:
             try:
-                with gzip.open(path) as f:
-                    content = f.read().decode('utf8')
-                return date, [Enchant(*vals) for vals in orjson.loads(content)]
-            except orjson.JSONDecodeError:
-                # delete broken files when we find them
-                path.unlink()
+                build = functools.partial(_build_enchants, report=report)
+                return date, snapshot.load_or_build(path, build)
+            except errors.EnchantDataInvalid:
+                # delete broken files when we find them, their snapshots are removed along with them
+                logger.exception(f'Invalid enchant data in {path}')
+                scrapes.remove(key)
 
     raise errors.EnchantDataNotFound
 
 
-def find_matching_enchants(enchants: List[Enchant], target: str):
-    target = target.lower()
-    logger.info(f'{target=}')
-    matches = []
-    for enchant in enchants:
-        for mod in enchant.mods:
-            if target in mod.lower() or target in inexact_mod(mod).lower():
-                matches.append(enchant)
-    return matches
+class ScrapeStream:
+    """Incrementally decompresses and parses a gzipped scrape (a JSON array of rows) into an EnchantStore.
 
+    Decompressed data is buffered only until the next row boundary, complete rows are parsed in batches and
+    added to a StoreBuilder, so memory use doesn't depend on the size of the scrape.
+    """
 
-def find_matching_helms(enchants: List[Enchant], target: Helm):
-    matches = []
-    for enchant in enchants:
-        if enchant.matches_helm(target):
-            matches.append(enchant)
-    return matches
+    def __init__(self):
+        self.reset()
 
+    def reset(self):
+        """Discards everything fed so far, e.g., when a download starts over."""
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip header and trailer
+        self._builder = store.StoreBuilder()
+        self._buffer = bytearray()
+        self._started = False
+        self._scanned = 0  # boundaries before this offset in the buffer have already been tried
 
-def inexact_mod(mod):
-    return _VALUE_PATTERN.sub('#', mod)
+    def feed(self, chunk: bytes):
+        while True:
+            try:
+                data = self._decompressor.decompress(chunk, _READ_CHUNK_SIZE)
+            except zlib.error as e:
+                raise errors.EnchantDataInvalid(f'Invalid compressed enchant data: {e}') from e
+            self._consume(data)
+            chunk = self._decompressor.unconsumed_tail
+            if not chunk:
+                return
+
+    def finish(self) -> _EnchantStore:
+        try:
+            self._consume(self._decompressor.flush())
+        except zlib.error as e:
+            raise errors.EnchantDataInvalid(f'Invalid compressed enchant data: {e}') from e
+        if not self._decompressor.eof:
+            raise errors.EnchantDataInvalid('Truncated enchant data.')
+        if not self._started:
+            raise errors.EnchantDataInvalid('Empty enchant data.')
+
+        # the remaining buffer holds the last rows and the closing bracket of the top level array
+        try:
+            rows = orjson.loads(b'[' + self._buffer)
+        except orjson.JSONDecodeError as e:
+            raise errors.EnchantDataInvalid(f'Invalid enchant data: {e}') from e
+        self._add_rows(rows)
+        self._buffer = bytearray()
+        return self._builder.build()
+
+    def _consume(self, data: bytes):
+        self._buffer += data
+        if not self._started:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return
+            if not stripped.startswith(b'['):
+                raise errors.EnchantDataInvalid('Enchant data is not an array.')
+            self._buffer = bytearray(stripped[1:])
+            self._started = True
+
+        boundary = None
+        for boundary in _ROW_BOUNDARY.finditer(self._buffer, self._scanned):
+            pass
+        if boundary is None:
+            self._check_unparsed()
+            return
 
+        # NOTE: a boundary can also be matched inside of a string, in which case the batch fails to parse and
+        # is retried with a later boundary once more data arrives
+        try:
+            rows = orjson.loads(b'[' + self._buffer[:boundary.start() + 1] + b']')
+        except orjson.JSONDecodeError:
+            self._scanned = boundary.end()
+            self._check_unparsed()
+            return
+        del self._buffer[:boundary.end() - 1]
+        self._scanned = 0
+        self._add_rows(rows)
 
-def enchant_summary(enchants: List[Enchant]):
-    items = collections.Counter()
-    influences = collections.defaultdict(collections.Counter)
-    ilvls = collections.defaultdict(list)
-    rare_bases = []
+    def _check_unparsed(self):
+        if len(self._buffer) > _MAX_UNPARSED_SIZE:
+            raise errors.EnchantDataInvalid(f'Invalid enchant data, no rows in {len(self._buffer)} bytes.')
 
-    for enchant in enchants:
-        items[enchant.display_name] += 1
-        if not enchant.unique:
-            influences[enchant.item_base][', '.join(enchant.influences) or 'Uninfluenced'] += 1
-            ilvls[enchant.item_base].append(enchant.ilvl)
-            rare_bases.append(enchant.item_base)
+    def _add_rows(self, rows: list):
+        for row in rows:
+            try:
+                self._builder.add(*row)
+            except (TypeError, ValueError, OverflowError) as e:
+                raise errors.EnchantDataInvalid(f'Invalid enchant row {row!r}: {e}') from e
 
-    summary = []
 
-    summary.append('Bases')
-    summary.extend(f'  {count:>3d} {val}' for val, count in items.most_common())
+def read_enchants(path: pathlib.Path, report: Reporter = _no_report) -> _EnchantStore:
+    total_size = path.stat().st_size
+    stream = ScrapeStream()
+    with path.open('rb') as f:
+        while chunk := f.read(_READ_CHUNK_SIZE):
+            stream.feed(chunk)
+            report(State.PARSING, f.tell() / total_size)
+    return stream.finish()
 
-    if rare_bases:
-        rare_bases = [val for val, _ in items.most_common() if val in rare_bases]
 
-        summary.append('')
-        for base in rare_bases:
-            summary.append(f'{base} ({items[base]})')
-            summary.append('  Influence')
-            summary.extend(f'    {count:>3d} {val}' for val, count in influences[base].most_common())
+def _build_enchants(path: pathlib.Path, report: Reporter) -> _EnchantStore:
+    enchants = read_enchants(path, report)
+    report(State.INDEXING, None)
+    enchants.build_indexes()
+    return enchants
 
-            summary.append('')
-            summary.append('  Item Level')
-            item_levels = sorted(ilvls[base], reverse=True)
-            last = item_levels[0]
-            appended = False
-            count = 0
-            for count, ilvl in enumerate(item_levels[1:], start=1):
-                if ilvl == last:
-                    continue
 
-                prefix = '>=' if appended else '  '
-                summary.append(f'    {count:>3d} {prefix}{last:>3d}')
-                appended = True
-                last = ilvl
+def find_matching_enchants(enchants: _EnchantStore, target: str):
+    target = target.lower()
+    logger.info(f'{target=}')
+    return enchants.select(enchants.mod_index.find(target))
 
-            count += 1
-            prefix = '>=' if appended else '  '
-            summary.append(f'    {count:>3d} {prefix}{last:>3d}')
-            summary.append('')
-    return '\n'.join(summary)
 
+def find_matching_helms(enchants: _EnchantStore, target: Helm):
+    return enchants.select(enchants.attribute_index.find(target))
 
-def base_summary(enchants: List[Enchant]):
-    mods = collections.Counter()
 
-    for enchant in enchants:
-        for mod in enchant.mods:
-            mods[mod] += 1
+def enchant_summary(enchants: _EnchantRows):
+    return summary.enchant_summary(enchants)
 
-    summary = [f'  {count:>3d} {val}' for val, count in mods.most_common()]
 
-    return '\n'.join(summary)
+def base_summary(enchants: _EnchantRows):
+    return summary.base_summary(enchants)
@@ -33,6 +33,13 @@ class NoSuchBase(Exception):
         super().__init__(error)
 
 
+class DownloadCorrupt(Exception):
+    def __init__(self, error=None):
+        if error is None:
+            error = 'Downloaded content is corrupt.'
+        super().__init__(error)
+
+
 class FailedToDownloadResource(Exception):
     def __init__(self, remote_resource: str):
         error = f"Failed to download resource {remote_resource}."
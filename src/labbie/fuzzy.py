@@ -0,0 +1,105 @@
+import dataclasses
+from typing import Dict, Iterable, List, Optional
+
+# NOTE: OCR mistakes are mostly single characters, so a line is matched if it's at most one edit per this many
+# characters away from a key
+_CHARS_PER_EDIT = 8
+
+
+@dataclasses.dataclass(frozen=True)
+class Match:
+    key: str
+    distance: int  # Levenshtein distance between the query and the key
+
+    @property
+    def score(self) -> float:
+        """1 for an exact match, decreasing towards 0 with the share of characters which had to be edited."""
+        return 1 - self.distance / max(len(self.key), 1)
+
+
+class _Node:
+
+    __slots__ = ('children', 'key', 'min_length', 'max_length')
+
+    def __init__(self):
+        self.children: Dict[str, _Node] = {}
+        self.key: Optional[str] = None
+        # lengths of the shortest and longest keys below this node, used to prune the search
+        self.min_length = float('inf')
+        self.max_length = 0
+
+
+def distance(a: str, b: str) -> int:
+    """The Levenshtein distance between a and b."""
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, start=1):
+        previous, row = row, [i]
+        for j, other in enumerate(b, start=1):
+            row.append(min(row[j - 1] + 1, previous[j] + 1, previous[j - 1] + (char != other)))
+    return row[-1]
+
+
+def max_distance(query: str) -> int:
+    return max(1, len(query) // _CHARS_PER_EDIT)
+
+
+class LevenshteinTrie:
+    """A trie over a set of keys which finds all keys within an edit distance of a query.
+
+    The search walks the trie depth first and computes one row of the edit distance matrix per node, which
+    is shared by every key with that prefix. A subtree is skipped once every cell of its row exceeds the
+    allowed distance, or when none of its keys has a length within the allowed distance of the query.
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self._root = _Node()
+        for key in keys:
+            node = self._root
+            self._update_lengths(node, key)
+            for char in key:
+                node = node.children.setdefault(char, _Node())
+                self._update_lengths(node, key)
+            node.key = key
+
+    @staticmethod
+    def _update_lengths(node: _Node, key: str):
+        node.min_length = min(node.min_length, len(key))
+        node.max_length = max(node.max_length, len(key))
+
+    def search(self, query: str, distance: Optional[int] = None, limit: Optional[int] = None) -> List[Match]:
+        """Keys within distance edits of query (by default, see max_distance), closest first."""
+        if distance is None:
+            distance = max_distance(query)
+        length = len(query)
+        unreachable = distance + 1
+        matches = []
+        first_row = list(range(length + 1))
+        # NOTE: an explicit stack instead of recursion, keys can be longer than the recursion limit allows
+        stack = [(child, char, 1, first_row) for char, child in self._root.children.items()]
+        while stack:
+            node, char, depth, previous_row = stack.pop()
+            if node.max_length < length - distance or node.min_length > length + distance:
+                continue
+            # only cells within distance of the diagonal can be within distance, the rest are left unreachable
+            row = [unreachable] * (length + 1)
+            if depth <= distance:
+                row[0] = depth
+            for column in range(max(1, depth - distance), min(length, depth + distance) + 1):
+                cost = 0 if query[column - 1] == char else 1
+                row[column] = min(row[column - 1] + 1, previous_row[column] + 1,
+                                  previous_row[column - 1] + cost, unreachable)
+            if node.key is not None and row[-1] <= distance:
+                matches.append(Match(node.key, row[-1]))
+                if limit == 1:
+                    # NOTE: only as close or closer keys matter from here on, which prunes much more
+                    distance = row[-1]
+                    unreachable = distance + 1
+            if min(row) <= distance:
+                stack.extend((child, child_char, depth + 1, row)
+                             for child_char, child in node.children.items())
+        matches.sort(key=lambda match: (match.distance, match.key))
+        return matches[:limit] if limit is not None else matches
+
+    def best(self, query: str, distance: Optional[int] = None) -> Optional[Match]:
+        matches = self.search(query, distance, limit=1)
+        return matches[0] if matches else None
@@ -0,0 +1,343 @@
+import bisect
+import collections
+import dataclasses
+import functools
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+_QUERY_CACHE_SIZE = 256
+_GRAM_SIZE = 3
+_VALUE_PATTERN = re.compile(r'-?\d+')
+# a bound on the value which takes the place of the bound, e.g., "at least 30% increased arc damage"
+_VALUE_QUERY_PATTERN = re.compile(r'\b(?:at (least|most) (-?\d+)|between (-?\d+) and (-?\d+))')
+
+
+def inexact_mod(mod):
+    return _VALUE_PATTERN.sub('#', mod)
+
+
+def mod_values(mod) -> Tuple[int, ...]:
+    return tuple(int(value) for value in _VALUE_PATTERN.findall(mod))
+
+
+class TemplateIndex:
+    """Index of mods by `#` template (see inexact_mod), with the values of each template's mods in order.
+
+    Answers which mod of a template has the values nearest to some (e.g., misread) values, and which mods of a
+    template have a value within a range.
+    """
+
+    def __init__(self, templates: Sequence[str], values: Sequence[Tuple[int, ...]]):
+        ids = collections.defaultdict(list)
+        for mod_id, template in enumerate(templates):
+            ids[template].append(mod_id)
+        self._ids: Dict[str, List[int]] = {}
+        self._values: Dict[str, List[Tuple[int, ...]]] = {}
+        for template, template_ids in ids.items():
+            template_ids.sort(key=lambda mod_id: values[mod_id])
+            self._ids[template] = template_ids
+            self._values[template] = [values[mod_id] for mod_id in template_ids]
+
+    def __contains__(self, template: str):
+        return template in self._ids
+
+    def templates(self) -> Iterable[str]:
+        return self._ids.keys()
+
+    def ids(self, template: str) -> List[int]:
+        """Ids of the mods with template, ordered by their values."""
+        return self._ids.get(template, [])
+
+    def nearest(self, template: str, values: Tuple[int, ...]) -> Optional[int]:
+        """Id of the mod with template whose values are nearest to values, the lowest on a tie."""
+        best, best_distance = None, None
+        for mod_id, mod_values_ in zip(self.ids(template), self._values.get(template, [])):
+            if len(mod_values_) != len(values):
+                continue
+            distance = sum(abs(a - b) for a, b in zip(mod_values_, values))
+            if best_distance is None or distance < best_distance:
+                best, best_distance = mod_id, distance
+        return best
+
+    def in_range(self, template: str, low: Optional[int] = None, high: Optional[int] = None,
+                 position: int = 0) -> List[int]:
+        """Ids of the mods with template whose value at position is within [low, high]."""
+        ids, values = self.ids(template), self._values.get(template, [])
+        if position == 0:
+            # NOTE: ordered by values, so the first value is a binary search
+            start = 0 if low is None else bisect.bisect_left(values, (low,))
+            end = len(values) if high is None else bisect.bisect_left(values, (high + 1,))
+            return [mod_id for mod_id, mod_values_ in zip(ids[start:end], values[start:end])
+                    if mod_values_]
+        return [mod_id for mod_id, mod_values_ in zip(ids, values)
+                if len(mod_values_) > position
+                and (low is None or mod_values_[position] >= low)
+                and (high is None or mod_values_[position] <= high)]
+
+
+@dataclasses.dataclass(frozen=True)
+class ValueQuery:
+    """A query for mods containing template with its value at position within [low, high]."""
+
+    template: str
+    position: int  # of the bounded value among the `#` of template
+    low: Optional[int]
+    high: Optional[int]
+
+    @classmethod
+    def parse(cls, query: str) -> Optional['ValueQuery']:
+        """Parses queries like "at least 30% increased arc damage", "at most 2" or "between 10 and 20"."""
+        match = _VALUE_QUERY_PATTERN.search(query)
+        if match is None:
+            return None
+        bound, value, low, high = match.groups()
+        if bound == 'least':
+            low, high = int(value), None
+        elif bound == 'most':
+            low, high = None, int(value)
+        else:
+            low, high = int(low), int(high)
+        before = inexact_mod(query[:match.start()])
+        return cls(template=before + '#' + inexact_mod(query[match.end():]), position=before.count('#'),
+                   low=low, high=high)
+
+
+class ModTable:
+    """Normalized forms of the distinct mods of a scrape, computed once when the scrape is loaded.
+
+    For each mod id this holds the lowercased exact mod, the lowercased `#`-templated mod (see inexact_mod)
+    and the numeric values which were replaced by `#`.
+    """
+
+    def __init__(self, mods: Sequence[str]):
+        self.mods = mods
+        self.lower: List[str] = []
+        self.templates: List[str] = []
+        self.values: List[Tuple[int, ...]] = []
+        for mod in mods:
+            self.lower.append(mod.lower())
+            self.templates.append(inexact_mod(mod).lower())
+            self.values.append(mod_values(mod))
+        self.template_index = TemplateIndex(self.templates, self.values)
+
+    def __len__(self):
+        return len(self.mods)
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + _GRAM_SIZE] for i in range(len(text) - _GRAM_SIZE + 1)}
+
+
+class TrigramIndex:
+    """Trigram index over a set of strings, used to narrow down candidates for substring queries.
+
+    Each string id may be indexed under several forms (e.g., exact and templated), a string is a candidate
+    for a query when any of its forms could contain the query.
+    """
+
+    def __init__(self, forms: Iterable[Sequence[str]]):
+        postings = collections.defaultdict(set)
+        self._num_ids = 0
+        for id_, id_forms in enumerate(forms):
+            self._num_ids += 1
+            for form in id_forms:
+                for gram in trigrams(form):
+                    postings[gram].add(id_)
+        self.postings: Dict[str, np.ndarray] = {
+            gram: np.fromiter(sorted(ids), dtype=np.int32, count=len(ids)) for gram, ids in postings.items()
+        }
+
+    def candidates(self, query: str) -> Optional[np.ndarray]:
+        """Sorted ids of strings which may contain the query, or None if the query is too short to filter."""
+        grams = trigrams(query)
+        if not grams:
+            return None
+
+        lists = []
+        for gram in grams:
+            ids = self.postings.get(gram)
+            if ids is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(ids)
+
+        # intersect starting from the rarest trigram so that the intermediate results stay small
+        lists.sort(key=len)
+        result = lists[0]
+        for ids in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, ids, assume_unique=True)
+        return result
+
+
+class ModIndex:
+    """Inverted index from mod id to the sorted ids of the rows which have that mod.
+
+    Posting lists are stored CSR-style, the rows with mod `i` are `rows[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, mod_table: ModTable, offsets: np.ndarray, rows: np.ndarray):
+        self.mod_table = mod_table
+        self.offsets = offsets
+        self.rows = rows
+
+        self.trigrams = TrigramIndex(zip(mod_table.lower, mod_table.templates))
+        # NOTE: searches repeat the same targets (every OCR'd enchant and every tab of a search), caching per
+        # index means that a repeated lookup only costs the size of its posting lists
+        self.matching_mod_ids = functools.lru_cache(maxsize=_QUERY_CACHE_SIZE)(self._matching_mod_ids)
+        self.matching_value_mod_ids = functools.lru_cache(maxsize=_QUERY_CACHE_SIZE)(
+            self._matching_value_mod_ids)
+
+    @classmethod
+    def build(cls, store) -> 'ModIndex':
+        num_mods = len(store.mods)
+        # encode (mod id, row) pairs into a single key so that one sort groups rows by mod, orders the rows
+        # within each posting list and drops duplicate mods within a row
+        keys = np.unique((store.mod_ids.astype(np.int64) << 32) | store.mod_rows())
+        mod_ids = keys >> 32
+        rows = (keys & 0xffffffff).astype(np.int32)
+        counts = np.bincount(mod_ids, minlength=num_mods)
+        offsets = np.zeros(num_mods + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(store.mod_table, offsets, rows)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {'offsets': self.offsets, 'rows': self.rows}
+
+    @classmethod
+    def from_arrays(cls, store, arrays: Dict[str, np.ndarray]) -> 'ModIndex':
+        return cls(store.mod_table, arrays['offsets'], arrays['rows'])
+
+    def postings(self, mod_id: int) -> np.ndarray:
+        return self.rows[self.offsets[mod_id]:self.offsets[mod_id + 1]]
+
+    def rows_for_mods(self, mod_ids: Sequence[int]) -> np.ndarray:
+        if not mod_ids:
+            return self.rows[:0]
+        if len(mod_ids) == 1:
+            return self.postings(mod_ids[0])
+        return np.unique(np.concatenate([self.postings(mod_id) for mod_id in mod_ids]))
+
+    def find(self, target: str) -> np.ndarray:
+        target = target.lower()
+        # NOTE: a target which reads like a value query may be (part of) a mod, e.g., one with "at least 5" in
+        # its text, so it's only read as a value query if it isn't found as is
+        if mod_ids := self.matching_mod_ids(target):
+            return self.rows_for_mods(mod_ids)
+        query = ValueQuery.parse(target)
+        if query is None:
+            return self.rows_for_mods(())
+        return self.rows_for_mods(self.matching_value_mod_ids(query))
+
+    def _matching_value_mod_ids(self, query: ValueQuery) -> Tuple[int, ...]:
+        """Ids of the mods containing the template of the query, with the bounded value within its range."""
+        candidates = self.trigrams.candidates(query.template)
+        if candidates is None:
+            candidates = range(len(self.mod_table))
+        templates = {self.mod_table.templates[mod_id] for mod_id in candidates}
+
+        mod_ids = []
+        for template in templates:
+            if (offset := template.find(query.template)) < 0:
+                continue
+            position = template[:offset].count('#') + query.position
+            mod_ids.extend(self.mod_table.template_index.in_range(template, query.low, query.high, position))
+        return tuple(sorted(mod_ids))
+
+    def _matching_mod_ids(self, target: str) -> Tuple[int, ...]:
+        """Ids of the mods containing the (lowercased) target, either exactly or with values templated."""
+        candidates = self.trigrams.candidates(target)
+        if candidates is None:
+            candidates = range(len(self.mod_table))
+        else:
+            candidates = candidates.tolist()
+
+        lower = self.mod_table.lower
+        templates = self.mod_table.templates
+        return tuple(mod_id for mod_id in candidates
+                     if target in lower[mod_id] or target in templates[mod_id])
+
+
+class AttributeIndex:
+    """Index of rows grouped by helm (display name and uniqueness) and sorted by item level within each group.
+
+    Within a group, the item levels are sorted so that an item level bound is a binary search and the
+    influence bitmasks are stored in the same order so that influence filters are a vectorized mask.
+    """
+
+    def __init__(self, store, order: np.ndarray, groups: Dict[int, Tuple[int, int]],
+                 first_rows: Dict[int, int]):
+        self._store = store
+        self.order = order
+        self.groups = groups  # group key -> (start, end) in order
+        self.first_rows = first_rows  # display name id -> first row with that display name
+        self.ilvl = store.ilvl[order]
+        self.influences = store.influences[order]
+
+    @staticmethod
+    def group_key(display_name_id: int, unique: bool) -> int:
+        return display_name_id * 2 + int(unique)
+
+    @classmethod
+    def build(cls, store) -> 'AttributeIndex':
+        group_keys = store.display_name.astype(np.int64) * 2 + store.unique
+        order = np.lexsort((store.ilvl, group_keys)).astype(np.int32)
+
+        sorted_keys = group_keys[order]
+        keys, starts = np.unique(sorted_keys, return_index=True)
+        ends = np.append(starts[1:], len(order))
+        groups = dict(zip(keys.tolist(), zip(starts.tolist(), ends.tolist())))
+
+        display_name_ids, first_rows = np.unique(store.display_name, return_index=True)
+        first_rows = dict(zip(display_name_ids.tolist(), first_rows.tolist()))
+        return cls(store, order, groups, first_rows)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        group_keys = np.array(list(self.groups), dtype=np.int64)
+        group_bounds = np.array(list(self.groups.values()), dtype=np.int64).reshape(-1, 2)
+        return {
+            'order': self.order,
+            'group_keys': group_keys,
+            'group_starts': group_bounds[:, 0].copy(),
+            'group_ends': group_bounds[:, 1].copy(),
+            'first_row_names': np.array(list(self.first_rows), dtype=np.int32),
+            'first_rows': np.array(list(self.first_rows.values()), dtype=np.int32),
+        }
+
+    @classmethod
+    def from_arrays(cls, store, arrays: Dict[str, np.ndarray]) -> 'AttributeIndex':
+        groups = dict(zip(arrays['group_keys'].tolist(),
+                          zip(arrays['group_starts'].tolist(), arrays['group_ends'].tolist())))
+        first_rows = dict(zip(arrays['first_row_names'].tolist(), arrays['first_rows'].tolist()))
+        return cls(store, arrays['order'], groups, first_rows)
+
+    def first_row(self, display_name: str) -> Optional[int]:
+        display_name_id = self._store.strings.id(display_name)
+        if display_name_id is None:
+            return None
+        return self.first_rows.get(display_name_id)
+
+    def find(self, target) -> np.ndarray:
+        """Returns the sorted rows matching the target helm."""
+        empty = self.order[:0]
+        display_name_id = self._store.strings.id(target.item_name if target.unique else target.item_base)
+        if display_name_id is None:
+            return empty
+        group = self.groups.get(self.group_key(display_name_id, target.unique))
+        if group is None:
+            return empty
+
+        start, end = group
+        if target.ilvl:
+            start += int(np.searchsorted(self.ilvl[start:end], target.ilvl, side='left'))
+
+        rows = self.order[start:end]
+        if target.influences:
+            influence_mask = self._store.influence_mask(target.influences)
+            if influence_mask is None:
+                return empty
+            rows = rows[(self.influences[start:end] & influence_mask) == influence_mask]
+
+        return np.sort(rows)
@@ -1,16 +1,36 @@
+import asyncio
 import dataclasses
 import string
 import functools
+import re
 from typing import Dict, List, Optional, Tuple, Union
 
 import injector
 import loguru
 import datrie
 
+from labbie import confusables
+from labbie import fuzzy
+from labbie import index
+from labbie import mixins
 from labbie import resources
+from labbie import spotting
 from labbie import trade
 
 logger = loguru.logger
+# NOTE: derived from the enchants resource and persisted next to it, bump the version in a suffix whenever the
+# format of that file changes
+_HELM_ENCHANTS_SUFFIX = '.helm_enchants-1.json'
+# NOTE: the trie is keyed by folded enchants, so it also depends on the confusion table
+_HELM_ENCHANT_TRIE_SUFFIX = '.helm_enchants-2-{confusions}.trie'
+_MAX_ENCHANT_LINES = 4  # the most lines a single enchant wraps to in a capture
+# a value in an OCR line, where digits may have been read as similar letters (e.g., 4O or l0)
+_OCR_VALUE_PATTERN = re.compile(r'(?<![A-Za-z])-?[\dOoIl|]*\d[\dOoIl|]*(?![A-Za-z])')
+_OCR_DIGITS = str.maketrans('OoIl|', '00111')
+
+# how OCR results are matched to enchants, see get_enchant_list_from_ocr_results
+OCR_MATCHING_LINES = 'lines'
+OCR_MATCHING_SPOTTING = 'spotting'
 
 
 @dataclasses.dataclass
@@ -20,21 +40,65 @@ class HelmEnchantInfo:
     trade_stat_value: Union[None, int, float]
 
 
+@dataclasses.dataclass(frozen=True)
+class OcrMatch:
+    enchant: str
+    confidence: float  # 1 for an exact match, lower the more the OCR lines had to be corrected
+    lines: Tuple[int, int]  # the [start, end) range of the OCR lines which were matched
+
+
 @injector.singleton
-class Mods:
+class Mods(mixins.ObservableMixin):
 
     @injector.inject
     def __init__(self, resource_manager: resources.ResourceManager, trade_: trade.Trade):
+        super().__init__()
         self._resource_manager = resource_manager
         self._trade = trade_
+        self.confusions = confusables.default_table()
+        self._load_task = None
+        resource_manager.attach(self, self._on_resources, to='resources')
 
-        self._raw_enchants = resource_manager.enchants
+    async def load(self):
+        """Loads the helm enchants from the enchants resource, called once resources are ready."""
+        raw_enchants = self._resource_manager.enchants
+        load_or_build_derived = self._resource_manager.load_or_build_derived
 
-        self.helm_enchant_info = self._build_helm_enchant_info(self._raw_enchants['helmet'])  # exact mod -> HelmModInfo
+        # sorted and deduplicated (enchant, trade stat id, trade stat value) rows
+        rows = await load_or_build_derived(
+            'enchants', _HELM_ENCHANTS_SUFFIX, functools.partial(self._build_helm_enchant_rows, raw_enchants),
+            resources.save_json, resources.load_json)
+        helm_enchants = [enchant for enchant, _, _ in rows]
+        # folded enchant (see confusables) -> the enchants which fold to it, almost always just one
+        helm_enchant_trie = await load_or_build_derived(
+            'enchants', _HELM_ENCHANT_TRIE_SUFFIX.format(confusions=self.confusions.digest),
+            functools.partial(self._build_helm_enchant_trie, helm_enchants),
+            lambda trie, path: trie.save(str(path)), lambda path: datrie.Trie.load(str(path)))
 
-    @functools.cached_property
-    def helm_enchants(self):
-        return sorted(self.helm_enchant_info.keys())
+        self.helm_enchant_info = self._build_helm_enchant_info(rows)  # exact mod -> HelmModInfo
+        self.helm_enchants = helm_enchants
+        self.helm_enchant_trie = helm_enchant_trie
+        # drop anything derived from the previous enchants
+        self.__dict__.pop('helm_enchant_matcher', None)
+        self.__dict__.pop('helm_enchant_spotter', None)
+        self.__dict__.pop('helm_enchant_templates', None)
+        self.__dict__.pop('helm_enchant_max_length', None)
+
+    async def _reload(self):
+        await self.load()
+        self.notify(helm_enchants=self.helm_enchants, _log=False)
+
+    def _on_resources(self, names):
+        if 'enchants' in names:
+            self._load_task = asyncio.create_task(self._reload())
+
+    def _build_helm_enchant_rows(
+        self,
+        raw_enchants: Dict[str, List[Tuple[str, str, Optional[float]]]]
+    ) -> List[Tuple[str, Optional[str], Union[None, int, float]]]:
+        info = self._build_helm_enchant_info(raw_enchants['helmet'])
+        return [(enchant, info[enchant].trade_stat_id, info[enchant].trade_stat_value)
+                for enchant in sorted(info)]
 
     def _build_helm_enchant_info(
         self,
@@ -49,49 +113,176 @@ class Mods:
             )
         return result
 
-    @functools.cached_property
-    def helm_enchant_trie(self) -> datrie.Trie:
+    def _build_helm_enchant_trie(self, helm_enchants: List[str]) -> datrie.Trie:
         logger.debug('Creating helm enchant trie')
         trie = datrie.Trie(string.printable)
-        for mod in self.helm_enchants:
-            trie[mod] = 1
+        for mod in helm_enchants:
+            key = self.confusions.fold(mod)
+            trie[key] = trie.get(key, []) + [mod]
         return trie
 
-    def get_enchant_list_from_ocr_results(self, enchant_list):
+    @functools.cached_property
+    def helm_enchant_matcher(self) -> fuzzy.LevenshteinTrie:
+        logger.debug('Creating helm enchant matcher')
+        return fuzzy.LevenshteinTrie(self.helm_enchant_trie.keys())
+
+    def match_enchant(self, text: str, limit: Optional[int] = 5) -> List[fuzzy.Match]:
+        """Helm enchants within a few edits of text (e.g., an OCR line), closest first.
+
+        Confusable characters are folded before matching, so they don't count as edits.
+        """
+        matches = self.helm_enchant_matcher.search(self.confusions.fold(text), limit=limit)
+        return [fuzzy.Match(enchant, match.distance)
+                for match in matches for enchant in self.helm_enchant_trie[match.key]][:limit]
+
+    def _closest(self, enchants: List[str], text: str) -> str:
+        if len(enchants) == 1:
+            return enchants[0]
+        return min(enchants, key=lambda enchant: fuzzy.distance(text, enchant))
+
+    @functools.cached_property
+    def helm_enchant_templates(self) -> index.TemplateIndex:
+        """Helm enchants by folded `#` template (see index.inexact_mod), with their values."""
+        logger.debug('Creating helm enchant template index')
+        templates = [self.confusions.fold(index.inexact_mod(enchant)) for enchant in self.helm_enchants]
+        return index.TemplateIndex(templates, [index.mod_values(enchant) for enchant in self.helm_enchants])
+
+    def nearest_enchant(self, text: str) -> Optional[str]:
+        """The helm enchant with the template of text (e.g., an OCR line) whose values are nearest to its own.
+
+        Enchants mostly differ by their values, which OCR often garbles, e.g., a misread 45% is matched to
+        the legal 40% rather than 25%.
+        """
+        values = []
+
+        def template_value(match):
+            values.append(int(match[0].translate(_OCR_DIGITS)))
+            return '#'
+
+        template = self.confusions.fold(_OCR_VALUE_PATTERN.sub(template_value, text))
+        enchant_id = self.helm_enchant_templates.nearest(template, tuple(values))
+        return self.helm_enchants[enchant_id] if enchant_id is not None else None
+
+    def _match_ocr_text(self, text: str) -> Optional[Tuple[str, float]]:
+        """The enchant matching text (e.g., joined OCR lines) best, along with the confidence of the match."""
         trie = self.helm_enchant_trie
-        logger.debug(f'Data from OCR{enchant_list}')
-
-        state = datrie.State(trie)
-        parts = []
-        enchants = []
-        for part in enchant_list:
-            to_walk = f' {part}' if parts else part
-            if state.walk(to_walk):
-                parts.append(to_walk)
-                continue
-
-            if not parts:
-                state.rewind()
-                continue
-
-            if parts:
-                enchant = ''.join(parts)
-                if enchant in trie:
-                    enchants.append(enchant)
-                elif len(keys := trie.keys(enchant)) == 1 and len(enchant) > 20:
-                    enchants.append(keys[0])
-                parts = []
-
-            state.rewind()
-            if state.walk(part):
-                parts.append(part)
-                continue
-
-        if parts:
-            enchant = ''.join(parts)
-            if enchant in trie:
-                enchants.append(enchant)
-            elif len(keys := trie.keys(enchant)) == 1 and len(enchant) > 20:
-                enchants.append(keys[0])
-
-        return enchants
+        folded = self.confusions.fold(text)
+        if folded in trie:
+            return self._closest(trie[folded], text), 1.0
+
+        candidates = []
+        if enchant := self.nearest_enchant(text):
+            distance = fuzzy.distance(folded, self.confusions.fold(enchant))
+            candidates.append((enchant, 1 - distance / len(enchant)))
+        if match := self.helm_enchant_matcher.best(folded):
+            candidates.append((self._closest(trie[match.key], text), match.score))
+        # the lines of an enchant may be cut off at the end of a capture
+        if len(values := trie.values(folded)) == 1 and len(text) > 20:
+            enchant = self._closest(values[0], text)
+            candidates.append((enchant, len(text) / len(enchant)))
+        return max(candidates, key=lambda candidate: candidate[1], default=None)
+
+    def parse_ocr_results(self, lines: List[str]) -> List[OcrMatch]:
+        """Splits OCR lines into the enchants which explain them best.
+
+        Every split of the lines into groups of up to _MAX_ENCHANT_LINES consecutive lines (or lines which
+        match nothing, e.g., other text of the tooltip) is considered, each group is scored by the number of
+        characters it explains times the confidence of its match. The best split is found by dynamic
+        programming over the lines, which is linear in the number of lines.
+
+        Groups of several lines are only matched if they could be an enchant, i.e., if they aren't longer than
+        the longest enchant and none of their lines is an exact match on its own, which skips most of the
+        (slowest) fuzzy searches of long groups.
+        """
+        logger.debug(f'Data from OCR{lines}')
+        max_length = self.helm_enchant_max_length
+        # the match of each line on its own, and whether it's exact
+        line_matches: List[Optional[Tuple[str, float]]] = []
+        exact: List[bool] = []
+        # best[end] is the score of the best split of lines[:end], along with its last match
+        best: List[Tuple[float, Optional[OcrMatch]]] = [(0.0, None)]
+        # previous[end] is where the best split of lines[:end] continues, i.e., the start of its last group
+        previous: List[int] = [0]
+        for end in range(1, len(lines) + 1):
+            # lines[end - 1] matches nothing
+            best.append(best[end - 1][:1] + (None,))
+            previous.append(end - 1)
+            line_matches.append(self._match_ocr_text(lines[end - 1]))
+            exact.append(line_matches[-1] is not None and line_matches[-1][1] == 1.0)
+            for start in range(max(0, end - _MAX_ENCHANT_LINES), end):
+                text = ' '.join(lines[start:end])
+                if end - start == 1:
+                    match = line_matches[start]
+                elif len(text) > max_length or any(exact[start:end]):
+                    continue
+                else:
+                    match = self._match_ocr_text(text)
+                if match is None:
+                    continue
+                score = best[start][0] + len(text) * match[1]
+                if score > best[end][0]:
+                    best[end] = (score, OcrMatch(match[0], match[1], (start, end)))
+                    previous[end] = start
+
+        matches = []
+        end = len(lines)
+        while end > 0:
+            if (match := best[end][1]) is not None:
+                matches.append(match)
+            end = previous[end]
+        matches.reverse()
+        logger.debug(f'OCR matches {matches}')
+        return matches
+
+    @functools.cached_property
+    def helm_enchant_max_length(self) -> int:
+        """The length of the longest text which may still match a helm enchant, allowing for OCR mistakes."""
+        longest = max(self.helm_enchants, key=len, default='')
+        return len(longest) + fuzzy.max_distance(longest)
+
+    def _spotting_key(self, text: str) -> str:
+        # NOTE: whitespace is dropped, so that it doesn't matter where OCR merged or split lines
+        return ''.join(self.confusions.fold(text).split())
+
+    @functools.cached_property
+    def helm_enchant_spotter(self) -> Tuple[spotting.AhoCorasick, List[List[str]]]:
+        """An automaton over the spotting keys of the helm enchants, along with the enchants of each key."""
+        logger.debug('Creating helm enchant spotter')
+        enchants = {}
+        for enchant in self.helm_enchants:
+            enchants.setdefault(self._spotting_key(enchant), []).append(enchant)
+        return spotting.AhoCorasick(enchants), list(enchants.values())
+
+    def spot_ocr_results(self, lines: List[str]) -> List[OcrMatch]:
+        """Finds the enchants anywhere in the OCR text, in one pass over all of it.
+
+        Unlike parse_ocr_results, this doesn't depend on how OCR split the text into lines, but only finds
+        enchants which were read without mistakes (other than confusable characters).
+        """
+        logger.debug(f'Data from OCR{lines}')
+        automaton, enchants = self.helm_enchant_spotter
+        # the spotting key of all lines, along with the line of each of its characters
+        text, text_lines = [], []
+        for line_index, line in enumerate(lines):
+            key = self._spotting_key(line)
+            text.append(key)
+            text_lines.extend([line_index] * len(key))
+
+        matches = []
+        for occurrence in spotting.leftmost_longest(automaton.find_all(''.join(text))):
+            start, end = text_lines[occurrence.start], text_lines[occurrence.end - 1] + 1
+            enchant = self._closest(enchants[occurrence.pattern], ' '.join(lines[start:end]))
+            matches.append(OcrMatch(enchant, 1.0, (start, end)))
+        logger.debug(f'OCR matches {matches}')
+        return matches
+
+    def get_enchant_list_from_ocr_results(self, enchant_list: List[str],
+                                          matching: str = OCR_MATCHING_LINES) -> List[str]:
+        if matching == OCR_MATCHING_LINES:
+            matches = self.parse_ocr_results(enchant_list)
+        elif matching == OCR_MATCHING_SPOTTING:
+            matches = self.spot_ocr_results(enchant_list)
+        else:
+            raise ValueError(f'Unknown OCR matching {matching!r}, expected {OCR_MATCHING_LINES!r} or '
+                             f'{OCR_MATCHING_SPOTTING!r}')
+        return [match.enchant for match in matches]
@@ -0,0 +1,185 @@
+import asyncio
+import contextlib
+import dataclasses
+import random
+import re
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib import parse
+
+import aiohttp
+import injector
+import loguru
+
+from labbie import constants
+
+logger = loguru.logger
+_Constants = constants.Constants
+
+_MAX_CONNECTIONS = 16
+_MAX_CONNECTIONS_PER_HOST = 6
+_KEEPALIVE_TIMEOUT = 60
+_CONNECT_TIMEOUT = 10
+_READ_TIMEOUT = 30  # between reads of the body, not for the whole body, so large downloads don't time out
+_RETRIES = 3
+_BACKOFF_BASE = 0.5
+_BACKOFF_MAX = 8
+_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+# errors which interrupt the transfer of a body, after which it can be resumed
+INTERRUPTED = (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+@dataclasses.dataclass
+class HttpStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    bytes_received: int = 0
+    latency: float = 0  # total seconds from sending requests until their headers were received
+    max_latency: float = 0
+
+    @property
+    def mean_latency(self) -> Optional[float]:
+        return self.latency / self.requests if self.requests else None
+
+
+@dataclasses.dataclass
+class Validators:
+    """Cache validators of a downloaded file, stored along with it so that it can be revalidated with a
+    conditional GET."""
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    md5: Optional[str] = None  # base64 encoded, as in the Content-MD5 header
+
+    @classmethod
+    def from_response(cls, resp: aiohttp.ClientResponse) -> 'Validators':
+        return cls(etag=resp.headers.get('ETag'), last_modified=resp.headers.get('Last-Modified'),
+                   md5=resp.headers.get('Content-MD5'))
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def range_headers(self, offset: int) -> Dict[str, str]:
+        """Headers requesting the content from offset on, only if it is still the content these validators
+        describe, empty if they can't tell (a weak ETag can't be used with If-Range)."""
+        if self.etag and not self.etag.startswith('W/'):
+            validator = self.etag
+        elif self.last_modified:
+            validator = self.last_modified
+        else:
+            return {}
+        return {'Range': f'bytes={offset}-', 'If-Range': validator}
+
+
+def expected_body(resp: aiohttp.ClientResponse) -> Tuple[Optional[str], Optional[int]]:
+    """The base64 MD5 and the size the body of resp should have, either is None if it can't be checked."""
+    if resp.headers.get('Content-Encoding', 'identity') != 'identity':
+        # both describe the encoded body, but aiohttp hands out the decoded one
+        return None, None
+    return resp.headers.get('Content-MD5'), resp.content_length
+
+
+def accepts_ranges(resp: aiohttp.ClientResponse) -> bool:
+    # a body with a Content-Encoding is decoded by aiohttp, so ranges of it can't be requested
+    return (resp.headers.get('Accept-Ranges') == 'bytes'
+            and resp.headers.get('Content-Encoding', 'identity') == 'identity')
+
+
+def range_start(resp: aiohttp.ClientResponse) -> Optional[int]:
+    if match := _CONTENT_RANGE.fullmatch(resp.headers.get('Content-Range', '')):
+        return int(match[1])
+    return None
+
+
+def range_total(resp: aiohttp.ClientResponse) -> Optional[int]:
+    if (match := _CONTENT_RANGE.fullmatch(resp.headers.get('Content-Range', ''))) and match[3] != '*':
+        return int(match[3])
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full jitter exponential backoff, i.e., a uniformly random delay up to base * 2**attempt (capped)."""
+    return random.uniform(0, min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** attempt))
+
+
+@injector.singleton
+class HttpClient:
+    """The shared HTTP client, every network request of the app goes through its pooled session.
+
+    Requests which fail to connect, time out or get a retryable status are retried with jittered exponential
+    backoff, retries only happen before the response is handed to the caller.
+    """
+
+    @injector.inject
+    def __init__(self, constants: _Constants):
+        self._user_agent = constants.user_agent
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.stats = HttpStats()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # NOTE: created lazily because a session is bound to the event loop which is running when it's created
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=_MAX_CONNECTIONS, limit_per_host=_MAX_CONNECTIONS_PER_HOST,
+                                             keepalive_timeout=_KEEPALIVE_TIMEOUT)
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=_CONNECT_TIMEOUT,
+                                            sock_read=_READ_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                  headers={'User-Agent': self._user_agent})
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        attempt = 0
+        while True:
+            self.stats.requests += 1
+            start = time.perf_counter()
+            try:
+                resp = await self.session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= _RETRIES:
+                    self.stats.failures += 1
+                    raise
+                logger.warning(f'{method} {loggable(url)} failed ({e!r}), retrying')
+            else:
+                latency = time.perf_counter() - start
+                self.stats.latency += latency
+                self.stats.max_latency = max(self.stats.max_latency, latency)
+                if resp.status not in _RETRY_STATUSES or attempt >= _RETRIES:
+                    break
+                logger.warning(f'{method} {loggable(url)} returned {resp.status}, retrying')
+                resp.release()
+
+            self.stats.retries += 1
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+        try:
+            yield resp
+        finally:
+            self.stats.bytes_received += resp.content.total_bytes
+            resp.release()
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        logger.info(f'http client closed, {self.stats}')
+
+
+def loggable(url: str) -> str:
+    # drop any query string, e.g., SAS tokens
+    return parse.urlsplit(url)._replace(query='').geturl()
@@ -1,6 +1,6 @@
 import os
 import pathlib
-from typing import List, Optional
+from typing import Optional
 
 import cv2 as cv
 import loguru
@@ -12,9 +12,6 @@ from labbie import bounds
 from labbie import utils
 
 logger = loguru.logger
-_KRANGLES = [
-    ('Sammon', 'Summon'),
-]
 
 if os.name == 'nt':
     pytesseract.pytesseract.tesseract_cmd = str(utils.bin_dir() / 'tesseract' / 'tesseract.exe')
@@ -72,14 +69,5 @@ def parse_image(image, save_path, dilate):
     if save_path:
         Image.fromarray(im_bw).save(save_path / 'full_processed.png')
     enchants = pytesseract.image_to_string(im_bw, config='--psm 12').replace('\x0c', '').replace('’', "'")
-    enchants = [e.strip().rstrip('.') for e in enchants.split('\n') if e]
-    return _fix_krangled_ocr(enchants)
-
-
-def _fix_krangled_ocr(enchants: List[str]):
-    unkrangled_enchants = []
-    for enchant in enchants:
-        for krangle in _KRANGLES:
-            enchant = enchant.replace(*krangle)
-        unkrangled_enchants.append(enchant)
-    return unkrangled_enchants
+    # NOTE: OCR mistakes are corrected by matching against the enchants, see Mods and confusables
+    return [e.strip().rstrip('.') for e in enchants.split('\n') if e]
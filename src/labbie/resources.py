@@ -2,21 +2,25 @@ import asyncio
 import dataclasses
 import functools
 import gzip
+import os
 import pathlib
-from typing import ClassVar, Dict, List, Optional, Tuple, Union
+import shutil
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 
-import aiohttp
 import injector
 from loguru import logger
 import orjson
 
+from labbie import cache
 from labbie import constants
 from labbie import errors
+from labbie import mixins
+from labbie import net
 from labbie import state
-from labbie import utils
 
 _Constants = constants.Constants
 _LOADERS = {}
+_T = TypeVar('_T')
 
 
 def loader(type_):
@@ -29,8 +33,7 @@ def loader(type_):
 @loader('.json.gz')
 def load_json_gz(path: pathlib.Path):
     with gzip.open(path) as f:
-        content = f.read().decode('utf8')
-    return orjson.loads(content)
+        return orjson.loads(f.read())
 
 
 @loader('.json')
@@ -39,6 +42,10 @@ def load_json(path: pathlib.Path):
         return orjson.loads(f.read())
 
 
+def save_json(value, path: pathlib.Path):
+    path.write_bytes(orjson.dumps(value))
+
+
 def get_loader(path: pathlib.Path):
     suffixes = path.suffixes
 
@@ -50,9 +57,24 @@ def get_loader(path: pathlib.Path):
     raise ValueError(f'No loader specified for file with suffixes {suffixes}')
 
 
+def remove_legacy_resources(legacy_dir: pathlib.Path):
+    """Removes resources cached by older versions, one file (and .md5) per resource in legacy_dir.
+
+    They aren't imported into the blob cache since they don't record the version of the resource they hold,
+    so this is only called once the blob cache holds every resource.
+    """
+    if not legacy_dir.is_dir():
+        return
+
+    def on_error(_, path, exc_info):
+        logger.opt(exception=exc_info).error(f'failed to remove {path}')
+
+    logger.info(f'removing legacy resources in {legacy_dir}')
+    shutil.rmtree(legacy_dir, onerror=on_error)
+
+
 @dataclasses.dataclass
 class Resource:
-    _CONTAINER_URL: ClassVar[str] = 'https://labbie.blob.core.windows.net/resources'
 
     version: int
     path_format: str
@@ -61,86 +83,76 @@ class Resource:
     def path(self) -> pathlib.Path:
         return pathlib.Path(self.path_format.format(version=self.version))
 
-    @functools.cached_property
-    def url(self) -> pathlib.Path:
-        return f'{self._CONTAINER_URL}/{self.path}'
+    def url(self, base_url: str) -> str:
+        return f'{base_url}/{self.key}'
 
     @functools.cached_property
     def name(self) -> pathlib.Path:
         return self.path.name
 
-    def local_path(self, resources_dir: pathlib.Path):
-        return resources_dir / self.name
-
-    def cached_hash_path(self, resources_dir: pathlib.Path):
-        local_path = self.local_path(resources_dir)
-        return local_path.parent / f'{local_path.name}.md5'
-
-    async def needs_update(self, resources_dir: pathlib.Path,
-                           session: Optional[aiohttp.ClientSession] = None):
-        async with utils.client_session(session) as session:
-            async with session.head(self.url) as resp:
-                if resp.status == 404:
-                    return True
-                cached_hash = self.cached_hash(resources_dir)
-                remote_hash = resp.headers['Content-MD5']
-                needs_update = cached_hash != remote_hash
-                logger.debug(f'{self.local_path(resources_dir)} {needs_update=} '
-                             f'{cached_hash=}{"==" if not needs_update else "!="}{remote_hash=}')
-                return needs_update
-
-    def cached_hash(self, resources_dir: pathlib.Path):
-        hash_path = self.cached_hash_path(resources_dir)
-
-        if not hash_path.exists():
-            return None
-
-        with hash_path.open(encoding='utf8') as f:
-            return f.read()
-
-    async def load_or_download(self, resources_dir: pathlib.Path, force: bool = False,
-                               session: Optional[aiohttp.ClientSession] = None):
-        needs_update = await self.needs_update(resources_dir, session=session)
-        if force or needs_update:
-            async with utils.client_session(session) as session:
-                async with session.get(self.url) as resp:
-                    if resp.status != 200:
-                        raise errors.FailedToDownloadResource(self.url)
-
-                    content = await resp.content.read()
-                    hash = resp.headers['Content-MD5']
-                    self.save(resources_dir, content, hash)
-
-        return self.load(resources_dir)
-
-    def save(self, resources_dir: pathlib.Path, content: Union[str, bytes], hash: str):
-        kwargs = {}
-        if isinstance(content, str):
-            mode = 'w'
-            kwargs['encoding'] = 'utf8'
-        elif isinstance(content, bytes):
-            mode = 'wb'
-        else:
-            raise ValueError(f'Invalid content type, expected str or bytes but got {type(content).__name__}')
-
-        local_path = self.local_path(resources_dir)
-        with local_path.open(mode, **kwargs) as f:
-            f.write(content)
-
-        hash_path = self.cached_hash_path(resources_dir)
-        with hash_path.open('w', encoding='utf8') as f:
-            f.write(hash)
+    @functools.cached_property
+    def key(self) -> str:
+        return self.path.as_posix()
 
-    def load(self, resources_dir: pathlib.Path):
-        local_path = self.local_path(resources_dir)
+    @functools.cached_property
+    def suffix(self) -> str:
+        return ''.join(self.path.suffixes)
+
+    def local_path(self, resources: cache.BlobCache) -> Optional[pathlib.Path]:
+        return resources.path(self.key)
+
+    def is_cached(self, resources: cache.BlobCache):
+        return self.local_path(resources) is not None and resources.validators(self.key) is not None
+
+    async def update(self, resources: cache.BlobCache, client: net.HttpClient, base_url: str,
+                     force: bool = False) -> bool:
+        """Downloads the resource if it isn't cached or has changed, returns whether it was downloaded.
+
+        A cached resource is revalidated with a conditional GET, so an unchanged resource costs a single 304.
+        """
+        validators = None if force or not self.is_cached(resources) else resources.validators(self.key)
+        headers = validators.conditional_headers() if validators else {}
+        url = self.url(base_url)
+        try:
+            # NOTE: an interrupted download is kept and resumed by the next update, rather than started over
+            with resources.writer(self.suffix, key=self.key) as writer:
+                status, validators = await cache.download(client, url, writer, headers)
+        except errors.DownloadCorrupt as e:
+            logger.error(f'{self.key} is corrupt: {e}')
+            raise errors.FailedToDownloadResource(url) from e
+        if status == 304:
+            logger.debug(f'{self.key} is up to date')
+            return False
+        if status != 200:
+            raise errors.FailedToDownloadResource(url)
+
+        # syncing and renaming run in a worker so that resources are processed concurrently, off the loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(resources.put, self.key, writer.path, self.suffix, validators=validators,
+                                    hash=writer.hash))
+        return True
+
+    async def load_or_download(self, resources: cache.BlobCache, client: net.HttpClient, base_url: str,
+                               force: bool = False):
+        await self.update(resources, client, base_url, force=force)
+        return await self.load_in_executor(resources)
+
+    async def load_in_executor(self, resources: cache.BlobCache):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.load, resources)
+
+    def load(self, resources: cache.BlobCache):
+        local_path = self.local_path(resources)
+        if local_path is None:
+            raise FileNotFoundError(f'{self.key} is not cached')
         loader = get_loader(local_path)
         return loader(local_path)
 
 
 @injector.singleton
-class ResourceManager:
+class ResourceManager(mixins.ObservableMixin):
 
-    # NOTE: file names must not collide, as the local path only includes the name and not the full path
     _RESOURCES = {
         'trade_stats': Resource(version=7, path_format='pathofexile/{version}/stats.json.gz'),
         'items': Resource(version=7, path_format='pathofexile/{version}/items.json.gz'),
@@ -148,9 +160,13 @@ class ResourceManager:
     }
 
     @injector.inject
-    def __init__(self, constants: _Constants, app_state: state.AppState):
+    def __init__(self, constants: _Constants, app_state: state.AppState, client: net.HttpClient,
+                 blob_cache: cache.BlobCache):
+        super().__init__()
         self._constants = constants
         self._app_state = app_state
+        self._client = client
+        self._resources = blob_cache.namespace('resources')
 
         self._init_task = None
 
@@ -160,14 +176,84 @@ class ResourceManager:
         self.enchants: Dict[str, List[Tuple[str, str, Optional[float]]]] = None
 
     def initialize(self):
-        self._constants.resources_dir.mkdir(parents=True, exist_ok=True)
         self._init_task = asyncio.create_task(self._get_all_resources())
 
     async def _get_all_resources(self):
         # TODO(bnorick): handle potential PermissionError / OSError from disk write failures in a reasonable way
-        async with aiohttp.ClientSession() as session:
-            for name, resource in self._RESOURCES.items():
-                value = await resource.load_or_download(
-                    resources_dir=self._constants.resources_dir, session=session)
-                setattr(self, name, value)
-        self._app_state.resources_ready = True
+        if all(resource.is_cached(self._resources) for resource in self._RESOURCES.values()):
+            # NOTE: offline first, a complete cache is used right away and revalidated in the background (by
+            # the refresh scheduler) so that startup doesn't wait on the network
+            await self._load_resources(self._RESOURCES)
+            self._app_state.resources_stale = True
+            self._app_state.resources_ready = True
+        else:
+            await asyncio.gather(*(
+                resource.update(self._resources, self._client, self._constants.resources_base_url)
+                for resource in self._RESOURCES.values()
+            ))
+            await self._load_resources(self._RESOURCES)
+            self._app_state.resources_ready = True
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, remove_legacy_resources, self._constants.resources_dir)
+
+    async def _load_resources(self, names: Iterable[str]):
+        names = list(names)
+        values = await asyncio.gather(*(
+            self._RESOURCES[name].load_in_executor(self._resources) for name in names
+        ))
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+
+    async def load_or_build_derived(self, name: str, suffix: str, build: Callable[[], _T],
+                                    save: Callable[[_T, pathlib.Path], None],
+                                    load: Callable[[pathlib.Path], _T]) -> _T:
+        """Loads a structure derived from the named resource, (re)building it with build() if it isn't cached.
+
+        Derived files are stored next to the resource's blob as `{md5}{suffix}`, so they are keyed by the
+        content they were built from and evicted along with it. Include a format version in suffix and bump it
+        whenever the saved format changes. Loading, building and saving run in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self._load_or_build_derived, name, suffix, build, save, load))
+
+    def _load_or_build_derived(self, name: str, suffix: str, build: Callable[[], _T],
+                               save: Callable[[_T, pathlib.Path], None],
+                               load: Callable[[pathlib.Path], _T]) -> _T:
+        entry = self._resources.entry(self._RESOURCES[name].key)
+        if entry is None:
+            return build()
+
+        path = self._resources.blob_path(entry.hash, suffix)
+        try:
+            return load(path)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.exception(f'invalid derived file {path}, rebuilding')
+
+        value = build()
+        tmp_path = self._resources.temp_path(suffix)
+        try:
+            save(value, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            # a missing derived file only costs a rebuild on the next start, so don't fail the load
+            logger.exception(f'failed to save {path}')
+        return value
+
+    async def refresh(self) -> bool:
+        """Revalidates all resources and hot swaps those which changed, returns whether any did."""
+        updated = await asyncio.gather(*(
+            resource.update(self._resources, self._client, self._constants.resources_base_url)
+            for resource in self._RESOURCES.values()
+        ))
+
+        names = [name for name, was_updated in zip(self._RESOURCES, updated) if was_updated]
+        if names:
+            logger.info(f'hot swapping updated resources {names}')
+            await self._load_resources(names)
+            self.notify(resources=(names, ))
+        self._app_state.resources_stale = False
+        return bool(names)
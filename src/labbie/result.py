@@ -1,5 +1,5 @@
 import dataclasses
-from typing import List, Optional
+from typing import Optional, Sequence
 
 from labbie import enchants
 
@@ -9,8 +9,8 @@ class Result:
     title: str
     search: str
     base: bool  # is this a result from a base search
-    league_result: Optional[List[enchants.Enchant]]
-    daily_result: Optional[List[enchants.Enchant]]
+    league_result: Optional[Sequence[enchants.Enchant]]
+    daily_result: Optional[Sequence[enchants.Enchant]]
 
     def _summary(self, type_: str, base: bool):
         results = getattr(self, f'{type_}_result')
@@ -0,0 +1,178 @@
+import asyncio
+import dataclasses
+import datetime
+import enum
+import random
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib import parse
+
+import injector
+import loguru
+
+from labbie import enchants
+from labbie import resources
+from labbie import state
+
+logger = loguru.logger
+
+_PUBLISH_TIME = datetime.time(0, 0)  # UTC, scrapes are published shortly after
+_PUBLISH_JITTER = 10 * 60  # seconds, spreads out the checks of all clients after data is published
+_RESOURCES_PERIOD = datetime.timedelta(hours=6)
+_BACKOFF_BASE = 5 * 60
+_BACKOFF_MAX = 2 * 60 * 60
+_COALESCE_WINDOW = datetime.timedelta(minutes=2)
+_MAX_SLEEP = 5 * 60  # the clock is rechecked at least this often, e.g., in case the machine was suspended
+
+
+class Result(enum.Enum):
+
+    UPDATED = 'Updated'
+    CURRENT = 'Up to date'
+    PENDING = 'Not published yet'
+    FAILED = 'Failed'
+
+
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def next_publish(now: datetime.datetime, publish_time: datetime.time) -> datetime.datetime:
+    """The first time after now (UTC) at which data is published."""
+    publish = datetime.datetime.combine(now.date(), publish_time, tzinfo=datetime.timezone.utc)
+    if publish <= now:
+        publish += datetime.timedelta(days=1)
+    return publish
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with equal jitter, i.e., between half and all of base * 2**attempt (capped)."""
+    delay = min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+@dataclasses.dataclass
+class Job:
+    """A dataset which is refreshed in the background by check."""
+
+    name: str
+    url: str  # checks of jobs for the same host are coalesced
+    check: Callable[[], Awaitable[Result]]
+    # current data is checked again after the next publish time (UTC) or, without one, after period
+    publish_time: Optional[datetime.time] = None
+    period: datetime.timedelta = datetime.timedelta(days=1)
+    next_run: Optional[datetime.datetime] = None
+    attempts: int = 0  # consecutive checks which didn't find current data
+
+    @property
+    def host(self) -> str:
+        return parse.urlsplit(self.url).netloc
+
+    def reschedule(self, result: Result, now: datetime.datetime):
+        if result in (Result.UPDATED, Result.CURRENT):
+            self.attempts = 0
+            if self.publish_time is not None:
+                next_run = next_publish(now, self.publish_time)
+            else:
+                next_run = now + self.period
+            self.next_run = next_run + datetime.timedelta(seconds=random.uniform(0, _PUBLISH_JITTER))
+        else:
+            self.next_run = now + datetime.timedelta(seconds=backoff_delay(self.attempts))
+            self.attempts += 1
+
+
+@injector.singleton
+class RefreshScheduler:
+    """Refreshes every dataset which is published over time, e.g., scrapes and resources, in one task.
+
+    Current data is checked again shortly after it is next published, data which isn't published yet (or
+    failed to download) is checked with exponential backoff. Checks of jobs for the same host which are due
+    around the same time run together, so that they share connections. The schedule of each job is exposed as
+    AppState.refresh.
+    """
+
+    @injector.inject
+    def __init__(self, app_state: state.AppState):
+        self._app_state = app_state
+        self._jobs: Dict[str, Job] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    def add(self, job: Job, current: bool = False):
+        """Schedules job to run right away or, if its data is known to be current, once it's due."""
+        if current:
+            job.reschedule(Result.CURRENT, utc_now())
+        else:
+            job.next_run = utc_now()
+        self._jobs[job.name] = job
+        self._publish(job)
+        if self._task is None:
+            # NOTE: created here since an event is bound to the loop which is running when it's created
+            self._changed = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._changed.set()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            now = utc_now()
+            due = self._due(now)
+            if due:
+                await asyncio.gather(*(self._run_job(job) for job in due))
+                continue
+
+            next_run = min(job.next_run for job in self._jobs.values())
+            timeout = min(_MAX_SLEEP, (next_run - now).total_seconds())
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _due(self, now: datetime.datetime) -> List[Job]:
+        """Jobs which are due, along with jobs for the same hosts which are due soon."""
+        due = [job for job in self._jobs.values() if job.next_run <= now]
+        hosts = {job.host for job in due}
+        soon = now + _COALESCE_WINDOW
+        return due + [job for job in self._jobs.values()
+                      if job.next_run > now and job.next_run <= soon and job.host in hosts]
+
+    async def _run_job(self, job: Job):
+        logger.info(f'checking {job.name} for updates')
+        try:
+            result = await job.check()
+        except Exception:
+            logger.exception(f'failed to refresh {job.name}, continuing with the current data')
+            result = Result.FAILED
+        now = utc_now()
+        job.reschedule(result, now)
+        logger.info(f'{job.name}: {result.value}, next check at {job.next_run:%Y-%m-%d %H:%M:%S} UTC')
+        self._publish(job, last_run=now, last_result=result)
+
+    def _publish(self, job: Job, last_run: Optional[datetime.datetime] = None,
+                 last_result: Optional[Result] = None):
+        previous = self._app_state.refresh.get(job.name, state.RefreshStatus())
+        status = dataclasses.replace(previous, next_run=job.next_run, attempts=job.attempts)
+        if last_result is not None:
+            status = dataclasses.replace(status, last_run=last_run, last_result=last_result.value)
+        # NOTE: replaced rather than updated in place, so that AppState notifies observers
+        self._app_state.refresh = {**self._app_state.refresh, job.name: status}
+
+
+def enchants_job(scrape: enchants.Enchants, base_url: str) -> Job:
+    async def check():
+        updated = await scrape.refresh()
+        if updated is None:
+            return Result.PENDING
+        return Result.UPDATED if updated else Result.CURRENT
+    return Job(f'{scrape.type} enchants', base_url, check, publish_time=_PUBLISH_TIME)
+
+
+def resources_job(resource_manager: resources.ResourceManager, base_url: str) -> Job:
+    async def check():
+        return Result.UPDATED if await resource_manager.refresh() else Result.CURRENT
+    return Job('resources', base_url, check, period=_RESOURCES_PERIOD)
@@ -0,0 +1,184 @@
+import mmap
+import os
+import pathlib
+import struct
+from typing import Callable, Dict
+
+import loguru
+import numpy as np
+import orjson
+
+from labbie import index
+from labbie import store
+
+logger = loguru.logger
+
+# NOTE: bump _VERSION whenever the layout of the snapshot or of any persisted column / index changes, existing
+# snapshots are then rebuilt from their source file on the next load
+_VERSION = 2
+_MAGIC = b'LABBIESS'
+_PREAMBLE = struct.Struct('<8sIQ')  # magic, version, header length
+_ALIGNMENT = 64
+_SUFFIX = '.snapshot'
+_INDEXES = {
+    'mod_index': index.ModIndex,
+    'attribute_index': index.AttributeIndex,
+}
+
+
+class SnapshotInvalid(Exception):
+    pass
+
+
+def snapshot_path(source_path: pathlib.Path) -> pathlib.Path:
+    """The path of the snapshot for a source file, e.g., 2021-11-07.snapshot for 2021-11-07.json.gz."""
+    name = source_path.name.split('.', 1)[0]
+    return source_path.with_name(f'{name}{_SUFFIX}')
+
+
+def _source_info(source_path: pathlib.Path) -> Dict[str, int]:
+    stat = source_path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write(source_path: pathlib.Path, enchant_store: store.EnchantStore):
+    """Writes a snapshot of the store (with its indexes) for the given source file."""
+    enchant_store.build_indexes()
+
+    arrays: Dict[str, np.ndarray] = {
+        f'store.{name}': column for name, column in enchant_store.columns().items()
+    }
+    for name in _INDEXES:
+        for array_name, array in getattr(enchant_store, name).arrays().items():
+            arrays[f'{name}.{array_name}'] = array
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = [array.dtype.str, len(array), offset]
+        offset = _aligned(offset + array.nbytes)
+
+    header = orjson.dumps({
+        'source': _source_info(source_path),
+        'tables': {
+            'strings': enchant_store.strings.strings,
+            'mods': enchant_store.mods.strings,
+            'influences': enchant_store.influence_table.strings,
+            'influence_orders': enchant_store.influence_orders.strings,
+        },
+        'arrays': layout,
+        'length': offset,
+    })
+
+    path = snapshot_path(source_path)
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    with tmp_path.open('wb') as f:
+        f.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)))
+        f.write(header)
+        data_start = _aligned(f.tell())
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    logger.debug(f'wrote snapshot {path} ({data_start + offset} bytes)')
+
+
+def load(source_path: pathlib.Path) -> store.EnchantStore:
+    """Memory maps the snapshot for the given source file.
+
+    Raises SnapshotInvalid if the snapshot is missing, was written by a different format version or is stale
+    relative to its source file.
+    """
+    path = snapshot_path(source_path)
+    try:
+        with path.open('rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError) as e:  # ValueError is raised when mapping an empty file
+        raise SnapshotInvalid(f'unable to map {path}') from e
+
+    try:
+        return _load(mm, source_path)
+    except SnapshotInvalid:
+        _close(mm)
+        raise
+    except Exception as e:
+        _close(mm)
+        raise SnapshotInvalid(f'corrupt snapshot {path}') from e
+
+
+def _close(mm: mmap.mmap):
+    try:
+        mm.close()
+    except BufferError:
+        # arrays still reference the mapping, it is closed once they are garbage collected
+        pass
+
+
+def _load(mm: mmap.mmap, source_path: pathlib.Path) -> store.EnchantStore:
+    magic, version, header_length = _PREAMBLE.unpack_from(mm)
+    if magic != _MAGIC or version != _VERSION:
+        raise SnapshotInvalid(f'snapshot format mismatch, {magic=} {version=}')
+
+    header_start = _PREAMBLE.size
+    header = orjson.loads(mm[header_start:header_start + header_length])
+    if header['source'] != _source_info(source_path):
+        raise SnapshotInvalid('snapshot is stale')
+
+    data_start = _aligned(header_start + header_length)
+    if len(mm) != data_start + header['length']:
+        raise SnapshotInvalid('snapshot is truncated')
+
+    arrays = {}
+    for name, (dtype, length, offset) in header['arrays'].items():
+        # NOTE: these arrays are read-only views into the mapped file, which stays open as long as they do
+        arrays[name] = np.frombuffer(mm, dtype=np.dtype(dtype), count=length, offset=data_start + offset)
+
+    def prefixed(prefix):
+        prefix = f'{prefix}.'
+        return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+    tables = header['tables']
+    enchant_store = store.EnchantStore(
+        strings=store.StringTable(tables['strings']),
+        mods=store.StringTable(tables['mods']),
+        influence_table=store.StringTable(tables['influences']),
+        influence_orders=store.StringTable(tuple(order) for order in tables['influence_orders']),
+        **prefixed('store'),
+    )
+    for name, index_cls in _INDEXES.items():
+        setattr(enchant_store, name, index_cls.from_arrays(enchant_store, prefixed(name)))
+    return enchant_store
+
+
+def load_or_build(source_path: pathlib.Path,
+                  build: Callable[[pathlib.Path], store.EnchantStore]) -> store.EnchantStore:
+    """Loads the snapshot for source_path, (re)building it with build(source_path) when it isn't valid."""
+    try:
+        return load(source_path)
+    except SnapshotInvalid as e:
+        logger.info(f'rebuilding snapshot for {source_path}: {e}')
+
+    enchant_store = build(source_path)
+    try:
+        write(source_path, enchant_store)
+    except OSError:
+        # a missing snapshot only costs a slower start, so don't fail the load
+        logger.exception(f'failed to write snapshot for {source_path}')
+    return enchant_store
+
+
+def remove(source_path: pathlib.Path):
+    try:
+        snapshot_path(source_path).unlink()
+    except FileNotFoundError:
+        pass
+    except OSError:
+        # on Windows a snapshot can't be deleted while it is mapped, it will be rebuilt as stale instead
+        logger.exception(f'failed to remove snapshot for {source_path}')
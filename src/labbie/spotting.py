@@ -0,0 +1,83 @@
+import collections
+import dataclasses
+from typing import Dict, Iterable, List, Tuple
+
+
+@dataclasses.dataclass(frozen=True)
+class Occurrence:
+    pattern: int  # index of the pattern in the patterns the automaton was built from
+    start: int
+    end: int
+
+
+class AhoCorasick:
+    """An Aho-Corasick automaton, which finds every occurrence of a set of patterns in one pass over a text.
+
+    Transitions are kept in one dict keyed by (state, char) rather than a dict per state, which takes a
+    fraction of the memory for thousands of patterns.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: Dict[Tuple[int, str], int] = {}
+        self._depth: List[int] = [0]
+        self._pattern: List[int] = [-1]  # pattern which ends at each state, -1 for none
+        children: List[List[Tuple[str, int]]] = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto.get((state, char))
+                if next_state is None:
+                    next_state = len(self._depth)
+                    self._goto[state, char] = next_state
+                    self._depth.append(self._depth[state] + 1)
+                    self._pattern.append(-1)
+                    children.append([])
+                    children[state].append((char, next_state))
+                state = next_state
+            if pattern:
+                self._pattern[state] = index
+
+        # fail links point to the state of the longest proper suffix which is also a prefix of a pattern,
+        # output links to the nearest state along the fail links where a pattern ends, both set breadth first
+        self._fail = [0] * len(self._depth)
+        self._output = [0] * len(self._depth)
+        queue = collections.deque(state for _, state in children[0])
+        while queue:
+            state = queue.popleft()
+            for char, child in children[state]:
+                fail = self._fail[state]
+                while fail and (fail, char) not in self._goto:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto.get((fail, char), 0)
+                suffix = self._fail[child]
+                self._output[child] = suffix if self._pattern[suffix] >= 0 else self._output[suffix]
+                queue.append(child)
+
+    def __len__(self):
+        return len(self._depth)
+
+    def find_all(self, text: str) -> List[Occurrence]:
+        """Every occurrence of every pattern in text, ordered by where they end."""
+        goto, fail, pattern, output, depth = self._goto, self._fail, self._pattern, self._output, self._depth
+        occurrences = []
+        state = 0
+        for end, char in enumerate(text, start=1):
+            while state and (state, char) not in goto:
+                state = fail[state]
+            state = goto.get((state, char), 0)
+            match = state if pattern[state] >= 0 else output[state]
+            while match:
+                occurrences.append(Occurrence(pattern[match], end - depth[match], end))
+                match = output[match]
+        return occurrences
+
+
+def leftmost_longest(occurrences: Iterable[Occurrence]) -> List[Occurrence]:
+    """The occurrences which don't overlap, preferring ones which start earlier and then longer ones."""
+    result = []
+    end = 0
+    for occurrence in sorted(occurrences, key=lambda o: (o.start, -o.end)):
+        if occurrence.start >= end:
+            result.append(occurrence)
+            end = occurrence.end
+    return result
@@ -1,6 +1,8 @@
 import dataclasses
+import datetime
 import enum
-from typing import Optional
+import functools
+from typing import Dict, Optional
 
 import injector
 
@@ -15,14 +17,28 @@ class State(enum.Enum):
     ERROR = 'Error'
 
 
+@dataclasses.dataclass(frozen=True)
+class RefreshStatus:
+    """The schedule of a dataset which is refreshed in the background, see scheduler.RefreshScheduler."""
+    next_run: Optional[datetime.datetime] = None
+    last_run: Optional[datetime.datetime] = None
+    last_result: Optional[str] = None
+    attempts: int = 0  # consecutive checks which didn't find current data
+
+
 @injector.singleton
 @dataclasses.dataclass
 class AppState(mixins.ObservableMixin):
     state: State = State.STARTING
     resources_ready: bool = False
-    league_enchants: enchants.Enchants = enchants.Enchants('league')
-    daily_enchants: enchants.Enchants = enchants.Enchants('daily')
+    resources_stale: bool = False  # cached resources are in use while they're revalidated
+    league_enchants: enchants.Enchants = dataclasses.field(
+        default_factory=functools.partial(enchants.Enchants, 'league'))
+    daily_enchants: enchants.Enchants = dataclasses.field(
+        default_factory=functools.partial(enchants.Enchants, 'daily'))
     last_error: Optional[str] = None
+    # name of each dataset which is refreshed in the background -> its status
+    refresh: Dict[str, RefreshStatus] = dataclasses.field(default_factory=dict)
 
     def ensure_scrape_enabled(self):
         league_disabled = self.league_enchants.state is enchants.State.DISABLED
@@ -32,7 +48,8 @@ class AppState(mixins.ObservableMixin):
 
     def __setattr__(self, name, val):
         cls_fields = {f.name for f in dataclasses.fields(self)}
-        if name not in cls_fields:
+        # NOTE: fields with a default_factory are first set by __init__, before there is anything to notify
+        if name not in cls_fields or not hasattr(self, name):
             object.__setattr__(self, name, val)
             return
 
@@ -0,0 +1,333 @@
+import array
+import functools
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from labbie import index
+
+# NOTE: influences are stored as a bitmask, known influences get stable bits and any unknown influences
+# found in scrape data are appended as they are encountered. The bitmask is for filtering, the influences of
+# a row in their original order are an id into a table of the distinct orders.
+_INFLUENCES = ('Shaper', 'Elder', 'Crusader', 'Redeemer', 'Hunter', 'Warlord')
+_MAX_INFLUENCES = 16
+_COLUMNS = ('account', 'character', 'item_name', 'item_base', 'display_name', 'ilvl', 'influences',
+            'influence_order', 'unique', 'mod_offsets', 'mod_ids')
+
+
+class StringTable:
+    """Interned strings, each distinct string is stored once and referenced by its integer id.
+
+    Any hashable values can be interned, e.g., the influence orders are tuples of strings.
+    """
+
+    def __init__(self, strings: Iterable[Optional[str]] = ()):
+        self.strings: List[Optional[str]] = []
+        self._ids = {}
+        for string in strings:
+            self.intern(string)
+
+    def intern(self, string: Optional[str]) -> int:
+        id_ = self._ids.get(string)
+        if id_ is None:
+            id_ = self._ids[string] = len(self.strings)
+            self.strings.append(string)
+        return id_
+
+    def id(self, string: Optional[str]) -> Optional[int]:
+        return self._ids.get(string)
+
+    def __getitem__(self, id_: int) -> Optional[str]:
+        return self.strings[id_]
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __contains__(self, string):
+        return string in self._ids
+
+
+class EnchantView:
+    """A read-only, Enchant-like view of a single row of an EnchantStore."""
+
+    __slots__ = ('_store', 'row')
+
+    def __init__(self, store: 'EnchantStore', row: int):
+        self._store = store
+        self.row = row
+
+    @property
+    def account(self) -> str:
+        return self._store.strings[self._store.account[self.row]]
+
+    @property
+    def character(self) -> str:
+        return self._store.strings[self._store.character[self.row]]
+
+    @property
+    def item_name(self) -> str:
+        return self._store.strings[self._store.item_name[self.row]]
+
+    @property
+    def item_base(self) -> str:
+        return self._store.strings[self._store.item_base[self.row]]
+
+    @property
+    def display_name(self) -> str:
+        return self._store.strings[self._store.display_name[self.row]]
+
+    @property
+    def ilvl(self) -> int:
+        return int(self._store.ilvl[self.row])
+
+    @property
+    def influences(self) -> List[str]:
+        return list(self._store.influence_orders[self._store.influence_order[self.row]])
+
+    @property
+    def unique(self) -> bool:
+        return bool(self._store.unique[self.row])
+
+    @property
+    def mods(self) -> List[str]:
+        return [self._store.mods[mod_id] for mod_id in self._store.row_mod_ids(self.row)]
+
+    def matches_helm(self, target):
+        return self._store.matches_helm(np.array([self.row]), target).size == 1
+
+    def __eq__(self, other):
+        if not isinstance(other, EnchantView):
+            return NotImplemented
+        return self._store is other._store and self.row == other.row
+
+    def __hash__(self):
+        return hash((id(self._store), self.row))
+
+    def __repr__(self):
+        return (f'Enchant(account={self.account!r}, character={self.character!r}, '
+                f'item_name={self.item_name!r}, item_base={self.item_base!r}, '
+                f'display_name={self.display_name!r}, ilvl={self.ilvl!r}, influences={self.influences!r}, '
+                f'unique={self.unique!r}, mods={self.mods!r})')
+
+
+class EnchantRows(Sequence[EnchantView]):
+    """An ordered selection of rows from an EnchantStore, behaves like a list of Enchants."""
+
+    def __init__(self, store: 'EnchantStore', rows: np.ndarray):
+        self.store = store
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return EnchantRows(self.store, self.rows[index])
+        return EnchantView(self.store, int(self.rows[index]))
+
+    def __iter__(self) -> Iterator[EnchantView]:
+        store = self.store
+        for row in self.rows.tolist():
+            yield EnchantView(store, row)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(rows={len(self)})'
+
+
+class EnchantStore:
+    """Columnar, dictionary-encoded storage for a single enchant scrape.
+
+    Strings (accounts, characters, item names and bases) share one interned table and mods have their own
+    table so that mod ids are dense. Per-row values are NumPy columns and the mods of each row are stored
+    CSR-style, i.e., the mod ids of row `i` are `mod_ids[mod_offsets[i]:mod_offsets[i + 1]]`.
+    """
+
+    def __init__(
+        self,
+        strings: StringTable,
+        mods: StringTable,
+        influence_table: StringTable,
+        influence_orders: StringTable,
+        account: np.ndarray,
+        character: np.ndarray,
+        item_name: np.ndarray,
+        item_base: np.ndarray,
+        ilvl: np.ndarray,
+        influences: np.ndarray,
+        influence_order: np.ndarray,
+        unique: np.ndarray,
+        mod_offsets: np.ndarray,
+        mod_ids: np.ndarray,
+        display_name: Optional[np.ndarray] = None,
+    ):
+        self.strings = strings
+        self.mods = mods
+        self.influence_table = influence_table
+        self.influence_orders = influence_orders
+        self.account = account
+        self.character = character
+        self.item_name = item_name
+        self.item_base = item_base
+        self.ilvl = ilvl
+        self.influences = influences
+        self.influence_order = influence_order
+        self.unique = unique
+        self.mod_offsets = mod_offsets
+        self.mod_ids = mod_ids
+
+        if display_name is None:
+            display_name = np.where(unique, item_name, item_base)
+        self.display_name = display_name
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> 'EnchantStore':
+        builder = StoreBuilder()
+        builder.add_rows(rows)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.ilvl)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns().values())
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in _COLUMNS}
+
+    @functools.cached_property
+    def mod_table(self) -> index.ModTable:
+        return index.ModTable(self.mods)
+
+    @functools.cached_property
+    def mod_index(self) -> index.ModIndex:
+        return index.ModIndex.build(self)
+
+    @functools.cached_property
+    def attribute_index(self) -> index.AttributeIndex:
+        return index.AttributeIndex.build(self)
+
+    def build_indexes(self):
+        """Eagerly builds all indexes, which are otherwise built on first use."""
+        self.mod_table
+        self.mod_index
+        self.attribute_index
+
+    def all(self) -> EnchantRows:
+        return EnchantRows(self, np.arange(len(self), dtype=np.int32))
+
+    def select(self, rows: np.ndarray) -> EnchantRows:
+        return EnchantRows(self, rows)
+
+    def row_mod_ids(self, row: int) -> np.ndarray:
+        return self.mod_ids[self.mod_offsets[row]:self.mod_offsets[row + 1]]
+
+    def mod_rows(self) -> np.ndarray:
+        """The row of each entry in mod_ids."""
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.mod_offsets))
+
+    def influence_mask(self, influences: Iterable[str]) -> Optional[int]:
+        """Returns the bitmask for the given influences, or None if an influence never occurs in the store."""
+        mask = 0
+        for influence in influences:
+            bit = self.influence_table.id(influence)
+            if bit is None:
+                return None
+            mask |= 1 << bit
+        return mask
+
+    def matches_helm(self, rows: np.ndarray, target) -> np.ndarray:
+        """Returns the subset of `rows` which match the target helm."""
+        if target.unique:
+            name_id = self.strings.id(target.item_name)
+            if name_id is None:
+                return rows[:0]
+            mask = self.item_name[rows] == name_id
+        else:
+            base_id = self.strings.id(target.item_base)
+            if base_id is None:
+                return rows[:0]
+            mask = (self.item_base[rows] == base_id) & ~self.unique[rows]
+
+        if target.ilvl:
+            mask &= self.ilvl[rows] >= target.ilvl
+
+        if target.influences:
+            influence_mask = self.influence_mask(target.influences)
+            if influence_mask is None:
+                return rows[:0]
+            mask &= (self.influences[rows] & influence_mask) == influence_mask
+
+        return rows[mask]
+
+
+class StoreBuilder:
+    """Incrementally builds an EnchantStore from scrape rows without materializing per-row objects."""
+
+    def __init__(self):
+        self.strings = StringTable()
+        self.mods = StringTable()
+        self.influence_table = StringTable(_INFLUENCES)
+        self.influence_orders = StringTable()
+
+        self._account = array.array('i')
+        self._character = array.array('i')
+        self._item_name = array.array('i')
+        self._item_base = array.array('i')
+        self._ilvl = array.array('h')
+        self._influences = array.array('H')
+        self._influence_order = array.array('i')
+        self._unique = array.array('b')
+        self._mod_offsets = array.array('q', [0])
+        self._mod_ids = array.array('i')
+
+    def __len__(self):
+        return len(self._ilvl)
+
+    def add(self, account: str, character: str, item_name: str, item_base: str, ilvl: int,
+            influences: List[str], unique: bool, mods: List[str]):
+        intern = self.strings.intern
+        self._account.append(intern(account))
+        self._character.append(intern(character))
+        self._item_name.append(intern(item_name))
+        self._item_base.append(intern(item_base))
+        self._ilvl.append(ilvl)
+
+        mask = 0
+        for influence in influences:
+            bit = self.influence_table.intern(influence)
+            if bit >= _MAX_INFLUENCES:
+                raise ValueError(f'Too many distinct influences, unable to store {influence!r}')
+            mask |= 1 << bit
+        self._influences.append(mask)
+        self._influence_order.append(self.influence_orders.intern(tuple(influences)))
+        self._unique.append(bool(unique))
+
+        intern_mod = self.mods.intern
+        self._mod_ids.extend(intern_mod(mod) for mod in mods)
+        self._mod_offsets.append(len(self._mod_ids))
+
+    def add_rows(self, rows: Iterable[Sequence]):
+        for row in rows:
+            self.add(*row)
+
+    def build(self) -> EnchantStore:
+        return EnchantStore(
+            strings=self.strings,
+            mods=self.mods,
+            influence_table=self.influence_table,
+            influence_orders=self.influence_orders,
+            account=np.frombuffer(self._account, dtype=np.int32),
+            character=np.frombuffer(self._character, dtype=np.int32),
+            item_name=np.frombuffer(self._item_name, dtype=np.int32),
+            item_base=np.frombuffer(self._item_base, dtype=np.int32),
+            ilvl=np.frombuffer(self._ilvl, dtype=np.int16),
+            influences=np.frombuffer(self._influences, dtype=np.uint16),
+            influence_order=np.frombuffer(self._influence_order, dtype=np.int32),
+            unique=np.frombuffer(self._unique, dtype=np.bool_),
+            mod_offsets=np.frombuffer(self._mod_offsets, dtype=np.int64),
+            mod_ids=np.frombuffer(self._mod_ids, dtype=np.int32),
+        )
@@ -0,0 +1,153 @@
+import collections
+import hashlib
+from typing import List, Sequence, Tuple
+import weakref
+
+import numpy as np
+
+from labbie import store as enchant_store
+
+_CACHE_SIZE = 128
+_KEY_BITS = 32  # (base, value) pairs are grouped on base << _KEY_BITS | value
+
+
+def _counts_by_frequency(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Groups keys, returning (keys, counts, first index) ordered like collections.Counter.most_common.
+
+    Ties are broken by the first occurrence of each key, which is the insertion order of a Counter.
+    """
+    unique_keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.lexsort((first, -counts))
+    return unique_keys[order], counts[order], first[order]
+
+
+def _selected_mod_ids(store, rows: np.ndarray) -> np.ndarray:
+    """The mod ids of the selected rows, in row order."""
+    starts = store.mod_offsets[rows]
+    lengths = store.mod_offsets[rows + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return store.mod_ids[:0]
+    # position i of the output reads from mod_ids[starts[row of i] + (i - first output index of that row)]
+    row_output_starts = np.cumsum(lengths) - lengths
+    positions = np.arange(total) + np.repeat(starts - row_output_starts, lengths)
+    return store.mod_ids[positions]
+
+
+class _SummaryCache:
+    """A small LRU of rendered summaries for a single store (i.e., scrape date), shared across tabs."""
+
+    def __init__(self):
+        self._summaries = collections.OrderedDict()
+
+    @staticmethod
+    def key(kind: str, rows: np.ndarray):
+        return kind, len(rows), hashlib.blake2b(np.ascontiguousarray(rows).tobytes(), digest_size=16).digest()
+
+    def get(self, key):
+        summary = self._summaries.get(key)
+        if summary is not None:
+            self._summaries.move_to_end(key)
+        return summary
+
+    def put(self, key, summary: str):
+        self._summaries[key] = summary
+        if len(self._summaries) > _CACHE_SIZE:
+            self._summaries.popitem(last=False)
+
+
+# NOTE: weak so that the summaries of a store are dropped along with it, e.g., once a newer scrape is loaded
+_CACHES: 'weakref.WeakKeyDictionary[enchant_store.EnchantStore, _SummaryCache]' = weakref.WeakKeyDictionary()
+
+
+def _cache(store: enchant_store.EnchantStore) -> _SummaryCache:
+    cache = _CACHES.get(store)
+    if cache is None:
+        cache = _CACHES[store] = _SummaryCache()
+    return cache
+
+
+def _cached(kind: str, build):
+    def summarize(enchants: Sequence):
+        if not len(enchants):
+            return build(None, None)
+        if not isinstance(enchants, enchant_store.EnchantRows):
+            # e.g., a list of enchants, which is summarized through a store of its own without caching
+            store = enchant_store.EnchantStore.from_rows(
+                (enchant.account, enchant.character, enchant.item_name, enchant.item_base, enchant.ilvl,
+                 enchant.influences, enchant.unique, enchant.mods) for enchant in enchants)
+            return build(store, store.all().rows)
+
+        store, rows = enchants.store, enchants.rows
+        cache = _cache(store)
+        key = cache.key(kind, rows)
+        if (summary := cache.get(key)) is None:
+            summary = build(store, rows)
+            cache.put(key, summary)
+        return summary
+    return summarize
+
+
+def _build_enchant_summary(store, rows: np.ndarray) -> str:
+    summary = ['Bases']
+    if rows is None:
+        return '\n'.join(summary)
+
+    strings = store.strings
+    display_names = store.display_name[rows]
+    items, item_counts, _ = _counts_by_frequency(display_names)
+    item_counts_by_id = dict(zip(items.tolist(), item_counts.tolist()))
+    summary.extend(f'  {count:>3d} {strings[id_]}' for id_, count in item_counts_by_id.items())
+
+    rare = ~store.unique[rows]
+    if not rare.any():
+        return '\n'.join(summary)
+
+    rare_bases = store.item_base[rows][rare].astype(np.int64)
+    rare_base_ids = set(np.unique(rare_bases).tolist())
+    value_mask = (1 << _KEY_BITS) - 1
+
+    # influence distribution per base, grouped on (base, influences in row order) like the labels are
+    influence_keys = (rare_bases << _KEY_BITS) | store.influence_order[rows][rare]
+    keys, counts, first = _counts_by_frequency(influence_keys)
+    order = np.argsort(keys >> _KEY_BITS, kind='stable')
+    influences = collections.defaultdict(list)
+    for key, count in zip(keys[order].tolist(), counts[order].tolist()):
+        names = ', '.join(store.influence_orders[key & value_mask]) or 'Uninfluenced'
+        influences[key >> _KEY_BITS].append((names, count))
+
+    # cumulative item level histogram per base, grouped on (base, ilvl)
+    ilvl_keys, ilvl_counts = np.unique((rare_bases << _KEY_BITS) | store.ilvl[rows][rare], return_counts=True)
+    ilvls = collections.defaultdict(list)
+    for key, count in zip(ilvl_keys[::-1].tolist(), ilvl_counts[::-1].tolist()):
+        ilvls[key >> _KEY_BITS].append((key & value_mask, count))
+
+    summary.append('')
+    for base in (id_ for id_ in items.tolist() if id_ in rare_base_ids):
+        summary.append(f'{strings[base]} ({item_counts_by_id[base]})')
+        summary.append('  Influence')
+        summary.extend(f'    {count:>3d} {names}' for names, count in influences[base])
+
+        summary.append('')
+        summary.append('  Item Level')
+        cumulative = 0
+        for index, (ilvl, count) in enumerate(ilvls[base]):
+            cumulative += count
+            prefix = '>=' if index else '  '
+            summary.append(f'    {cumulative:>3d} {prefix}{ilvl:>3d}')
+        summary.append('')
+    return '\n'.join(summary)
+
+
+def _build_base_summary(store, rows: np.ndarray) -> str:
+    if rows is None:
+        return ''
+
+    mods, counts, _ = _counts_by_frequency(_selected_mod_ids(store, rows))
+    summary: List[str] = [f'  {count:>3d} {store.mods[mod_id]}'
+                          for mod_id, count in zip(mods.tolist(), counts.tolist())]
+    return '\n'.join(summary)
+
+
+enchant_summary = _cached('enchant', _build_enchant_summary)
+base_summary = _cached('base', _build_base_summary)
@@ -11,6 +11,15 @@ class Trade:
 
     @injector.inject
     def __init__(self, resource_manager: resources.ResourceManager):
-        self._trade_stats = resource_manager.trade_stats
+        self._resource_manager = resource_manager
+        self._load()
+        resource_manager.attach(self, self._on_resources, to='resources')
+
+    def _load(self):
+        self._trade_stats = self._resource_manager.trade_stats
 
         self.text_to_stat_id = self._trade_stats
+
+    def _on_resources(self, names):
+        if 'trade_stats' in names:
+            self._load()
@@ -70,11 +70,14 @@ class AppPresenter:
             save_path = self._constants.screenshots_dir / datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S')
             save_path.mkdir(exist_ok=True)
         partial_enchant_list = ocr.read_enchants(self._config.ocr.bounds, save_path)
-        curr_enchants = self.mods.get_enchant_list_from_ocr_results(partial_enchant_list)
+        curr_enchants = self.mods.get_enchant_list_from_ocr_results(partial_enchant_list,
+                                                                    self._config.ocr.matching)
         logger.debug(f'{curr_enchants=}')
         if curr_enchants:
             with (self._constants.logs_dir / 'enchants.jsonl').open('ab') as f:
-                f.write(orjson.dumps({'timestamp': str(datetime.datetime.utcnow()), 'enchants': curr_enchants})+b'\n')
+                # NOTE: the raw OCR lines are used to learn the OCR confusion table, see confusables
+                f.write(orjson.dumps({'timestamp': str(datetime.datetime.utcnow()), 'enchants': curr_enchants,
+                                      'ocr': partial_enchant_list})+b'\n')
         results = []
         # TODO: make this work for gloves/boots?
         for index, enchant in enumerate(curr_enchants, start=1):
@@ -6,6 +6,7 @@ import loguru
 
 from labbie import bases
 from labbie import constants
+from labbie import enchants
 from labbie import errors
 from labbie import mods
 from labbie import state
@@ -58,19 +59,49 @@ class SearchPresenter:
         self._view.set_influence_options(influences, influences)
         self._view.set_mods(self._mods.helm_enchants, None)
         self._view.set_bases(self._bases.helm_display_texts)
+        # NOTE: mods and bases notify once they've reloaded updated resources, rather than attaching to the
+        # resource manager, which notifies its observers in no particular order
+        self._mods.attach(self, self._on_helm_enchants, to='helm_enchants')
+        self._bases.attach(self, self._on_helm_display_texts, to='helm_display_texts')
 
         if constants_.debug:
             self._view.set_selected_mod('Tornado Shot fires an additional secondary Projectile')
 
+        self._app_state.league_enchants.attach(self, self._on_enchants_state, to=('state', 'stale'))
+        self._app_state.daily_enchants.attach(self, self._on_enchants_state, to=('state', 'stale'))
+        self._on_enchants_state()
+
     @property
     def widget(self):
         return self._view
 
+    def _on_enchants_state(self, *args):
+        statuses = []
+        for name, scrape in (('League', self._app_state.league_enchants),
+                             ('Daily', self._app_state.daily_enchants)):
+            if scrape.state is enchants.State.LOADED and scrape.stale:
+                statuses.append(f'{name}: Using {scrape.date:%Y-%m-%d}, checking for updates')
+                continue
+            if scrape.state in (enchants.State.DISABLED, enchants.State.LOADED):
+                continue
+            progress = f' ({scrape.progress:.0%})' if scrape.progress is not None else ''
+            statuses.append(f'{name}: {scrape.state.value}{progress}')
+        self._view.set_status(', '.join(statuses))
+
+    def _on_helm_enchants(self, helm_enchants: List[str]):
+        self._view.set_mods(helm_enchants, None)
+
+    def _on_helm_display_texts(self, helm_display_texts: List[str]):
+        self._view.set_bases(helm_display_texts)
+
     def reset_position(self):
         self._view.set_position(None)
 
     def cleanup(self):
-        pass
+        self._app_state.league_enchants.detatch(self)
+        self._app_state.daily_enchants.detatch(self)
+        self._mods.detatch(self)
+        self._bases.detatch(self)
 
     def populate_view(self, results: Union[None, search_result.Result, List[search_result.Result]],
                       clear=False, switch=False):
@@ -56,6 +56,7 @@ class SearchWidget(base.BaseWidget):
 
         self.btn_all = QtWidgets.QPushButton('All', self)
         self.btn_screen_capture = QtWidgets.QPushButton('Screen Capture', self)
+        self.lbl_status = QtWidgets.QLabel('', self)
 
         self.tabs = QtWidgets.QTabWidget(self)
         self.tab_bar = TabBar()
@@ -97,6 +98,7 @@ class SearchWidget(base.BaseWidget):
         layout.addLayout(layout_base_section)
         layout.addSpacing(10)
         layout.addLayout(layout_screen_capture)
+        layout.addWidget(self.lbl_status)
         layout.addSpacing(10)
         layout.addWidget(self.tabs)
         self.setLayout(layout)
@@ -170,6 +172,10 @@ class SearchWidget(base.BaseWidget):
         if not selected:
             self.combo_base.setCurrentIndex(0)
 
+    def set_status(self, text: str):
+        self.lbl_status.setText(text)
+        self.lbl_status.setVisible(bool(text))
+
     def add_result_tab(self, title, widget: QtWidgets.QWidget, switch=False):
         index = self.tabs.addTab(widget, title)
         if switch:
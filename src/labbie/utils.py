@@ -1,12 +1,9 @@
 import atexit
-import contextlib
 import dataclasses
 import mmap
 import os
 import pathlib
 import sys
-from typing import Optional
-import aiohttp
 
 import loguru
 
@@ -101,15 +98,6 @@ def make_slotted_dataclass(cls):
     return cls
 
 
-@contextlib.asynccontextmanager
-async def client_session(session: Optional[aiohttp.ClientSession] = None) -> aiohttp.ClientSession:
-    if session:
-        yield session
-    else:
-        async with aiohttp.ClientSession() as session:
-            yield session
-
-
 class LogFilter:
 
     def __init__(self, level):
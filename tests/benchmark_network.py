@@ -0,0 +1,145 @@
+"""Benchmarks of startup and the daily refresh against a local blob server with simulated network conditions.
+
+    python -m tests.benchmark_network --rows 100000 --latency 0.05 --bandwidth 5
+
+Each scenario reports the time until the app is usable (resources and the league scrape loaded), along with
+the requests made and bytes downloaded:
+    cold start: nothing is cached, everything is downloaded
+    warm start: everything is cached, the cache is used and revalidated in the background
+    daily refresh: a new scrape is published and downloaded by the refresh scheduler
+"""
+import argparse
+import asyncio
+import dataclasses
+import datetime
+import pathlib
+import tempfile
+import time
+from typing import List, Optional
+
+from labbie import cache
+from labbie import constants
+from labbie import enchants
+from labbie import net
+from labbie import resources
+from labbie import state
+
+from tests import blob_server
+
+
+@dataclasses.dataclass
+class Result:
+    scenario: str
+    seconds: float
+    requests: int
+    bytes_received: int
+    revalidated_seconds: Optional[float] = None  # until background revalidation finished
+
+    def __str__(self):
+        revalidated = f'{self.revalidated_seconds:8.3f}s' if self.revalidated_seconds is not None else ' ' * 9
+        return (f'{self.scenario:<14} {self.seconds:8.3f}s {revalidated} {self.requests:>9} '
+                f'{self.bytes_received / 1e6:>9.2f}')
+
+
+class _App:
+    """The parts of the app involved in downloading, as wired up by __main__."""
+
+    def __init__(self, data_dir: pathlib.Path, base_url: str):
+        self.constants = constants.Constants(
+            data_dir=data_dir,
+            enchants_base_url=f'{base_url}{blob_server.ENCHANTS_CONTAINER}',
+            resources_base_url=f'{base_url}{blob_server.RESOURCES_CONTAINER}',
+        )
+        self.client = net.HttpClient(self.constants)
+        self.blob_cache = cache.BlobCache(self.constants.cache_dir)
+        self.resource_manager = resources.ResourceManager(self.constants, state.AppState(), self.client,
+                                                          self.blob_cache)
+        self.scrape = enchants.Enchants(blob_server.TYPE)
+
+    async def start(self) -> float:
+        """Starts the app, returning the seconds until it was usable."""
+        start = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, self.blob_cache.collect_garbage)
+        await asyncio.gather(self.resource_manager._get_all_resources(),
+                             self.scrape.download_or_load(self.constants, self.client, self.blob_cache))
+        seconds = time.perf_counter() - start
+        assert self.scrape.state is enchants.State.LOADED, self.scrape.state
+        return seconds
+
+    async def revalidated(self):
+        # NOTE: what the refresh scheduler does right after startup, run explicitly so that it's measured
+        if self.resource_manager._app_state.resources_stale:
+            await self.resource_manager.refresh()
+        if self.scrape.stale:
+            await self.scrape._revalidate(self.blob_cache.namespace(f'helm/{self.scrape.type}'), self.client)
+
+    async def close(self):
+        await self.client.close()
+
+
+async def _start(scenario: str, data_dir: pathlib.Path, server: blob_server.BlobServer,
+                 base_url: str) -> Result:
+    server.requests.clear()
+    app = _App(data_dir, base_url)
+    try:
+        seconds = await app.start()
+        start = time.perf_counter() - seconds
+        await app.revalidated()
+        revalidated_seconds = time.perf_counter() - start
+        return Result(scenario, seconds, len(server.requests), server.bytes_sent, revalidated_seconds)
+    finally:
+        await app.close()
+
+
+async def _refresh(data_dir: pathlib.Path, server: blob_server.BlobServer, base_url: str,
+                   rows: int) -> Result:
+    app = _App(data_dir, base_url)
+    try:
+        await app.start()
+        await app.revalidated()
+        server.add_scrape(enchants.today_utc(), blob_server.synthetic_rows(rows, seed=0),
+                          container=blob_server.ENCHANTS_CONTAINER)
+
+        server.requests.clear()
+        start = time.perf_counter()
+        # what the refresh scheduler does once per check, a single GET of today's scrape
+        assert await app.scrape.refresh()
+        seconds = time.perf_counter() - start
+        return Result('daily refresh', seconds, len(server.requests), server.bytes_sent)
+    finally:
+        await app.close()
+
+
+async def run(rows: int, days: int = 3, manifest: bool = False, **server_kwargs) -> List[Result]:
+    server = blob_server.synthetic_server(rows, days=days, manifest=manifest, **server_kwargs)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = pathlib.Path(tmp_dir)
+        async with server.serve() as base_url:
+            return [
+                await _start('cold start', data_dir, server, base_url),
+                await _start('warm start', data_dir, server, base_url),
+                await _refresh(data_dir, server, base_url, rows),
+            ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('--rows', type=int, default=50_000, help='rows of each synthetic scrape')
+    parser.add_argument('--days', type=int, default=3, help='number of past days with a scrape')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds before each response')
+    parser.add_argument('--bandwidth', type=float, default=10, help='MB/s of each response body')
+    parser.add_argument('--no-md5', action='store_true', help="don't send Content-MD5 headers")
+    parser.add_argument('--manifest', action='store_true', help='publish latest.json manifests')
+    args = parser.parse_args()
+
+    print(f'{datetime.datetime.now():%Y-%m-%d %H:%M:%S} {args}')
+    bandwidth = args.bandwidth * 1e6 if args.bandwidth else None
+    results = asyncio.run(run(args.rows, days=args.days, manifest=args.manifest, latency=args.latency,
+                              bandwidth=bandwidth, md5=not args.no_md5))
+    print(f'{"scenario":<14} {"usable":>9} {"settled":>9} {"requests":>9} {"MB":>9}')
+    for result in results:
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
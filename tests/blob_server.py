@@ -0,0 +1,234 @@
+"""A local stand-in for the blob containers which scrapes and resources are downloaded from.
+
+It serves synthetic scrapes and resources with configurable latency, bandwidth, missing paths and MD5 headers,
+for tests and benchmarks. It can also be run on its own and the app pointed at it, e.g.,
+
+    python -m tests.blob_server --port 8000 --latency 0.05 --bandwidth 5
+    LABBIE_ENCHANTS_BASE_URL=http://127.0.0.1:8000/enchants \
+        LABBIE_RESOURCES_BASE_URL=http://127.0.0.1:8000/resources labbie
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import datetime
+import fnmatch
+import gzip
+import hashlib
+import random
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from aiohttp import web
+
+from labbie import enchants
+from labbie import resources
+
+TYPE = 'league'
+ENCHANTS_CONTAINER = '/enchants'
+RESOURCES_CONTAINER = '/resources'
+_CHUNK_SIZE = 16 * 1024
+_RANGE = re.compile(r'bytes=(\d+)-')
+
+_BASES = ['Eternal Burgonet', 'Sinner Tricorne', 'Nightmare Bascinet', 'Hubris Circlet', 'Lion Pelt',
+          'Royal Burgonet', 'Deicide Mask', 'Bone Helmet']
+_UNIQUES = [('Abyssus', 'Ezomyte Burgonet'), ("Devoto's Devotion", 'Nightmare Bascinet'),
+            ('Starkonja\'s Head', 'Silken Hood'), ('Crown of Eyes', 'Hubris Circlet')]
+_INFLUENCES = ['Shaper', 'Elder', 'Crusader', 'Hunter', 'Redeemer', 'Warlord']
+_SKILLS = ['Tornado Shot', 'Arc', 'Cyclone', 'Dual Strike', 'Raised Zombies', 'Ice Nova', 'Blade Vortex',
+           'Lightning Arrow', 'Spark', 'Frostblink', 'Vortex', 'Flicker Strike']
+
+
+def synthetic_mods() -> List[str]:
+    mods = []
+    for skill in _SKILLS:
+        mods.extend(f'{value}% increased {skill} Damage' for value in (25, 40))
+        mods.extend(f'{skill} has {value}% increased Area of Effect' for value in (16, 24))
+        mods.append(f'{skill} fires an additional Projectile')
+    return mods
+
+
+def synthetic_rows(count: int, seed: int = 0) -> List[list]:
+    """Scrape rows, [account, character, item name, item base, ilvl, influences, unique, mods]."""
+    rng = random.Random(seed)
+    mods = synthetic_mods()
+    rows = []
+    for i in range(count):
+        if rng.random() < 0.1:
+            item_name, item_base = rng.choice(_UNIQUES)
+            unique, influences = True, []
+        else:
+            item_base = rng.choice(_BASES)
+            item_name = f'Synthetic {item_base} {i % 97}'
+            unique, influences = False, rng.sample(_INFLUENCES, rng.choice((0, 0, 1, 2)))
+        rows.append([f'acct{i}', f'char{i}', item_name, item_base, rng.randint(60, 86), influences, unique,
+                     [rng.choice(mods)]])
+    return rows
+
+
+def synthetic_resources() -> Dict[str, object]:
+    """Values of the resources loaded by ResourceManager, keyed by name."""
+    mods = synthetic_mods()
+    return {
+        'trade_stats': {mod: f'enchant.stat_{i}' for i, mod in enumerate(mods)},
+        'items': {'helmet': ([[False, base, base] for base in _BASES]
+                             + [[True, name, base] for name, base in _UNIQUES])},
+        'enchants': {'helmet': [[mod, f'enchant.stat_{i}', None] for i, mod in enumerate(mods)]},
+    }
+
+
+class BlobServer:
+    """Serves blobs from a dict of path -> body, e.g., /enchants/league/2021-11-07.json.gz.
+
+    Responses carry an ETag (and a Content-MD5 unless disabled), conditional GETs with a matching
+    If-None-Match get a 304.
+    """
+
+    def __init__(self, latency: float = 0, bandwidth: Optional[float] = None, not_found: Iterable[str] = (),
+                 md5: bool = True):
+        self.blobs: Dict[str, bytes] = {}
+        self.latency = latency  # seconds before each response is sent
+        self.bandwidth = bandwidth  # bytes per second of each response body, None for unlimited
+        self.not_found = list(not_found)  # glob patterns of paths which 404 even if they exist
+        self.md5 = md5
+        self.failures: Dict[str, int] = {}  # path -> number of requests to fail with a 503 before succeeding
+        self.corrupt = set()  # paths whose body doesn't match their Content-MD5
+        self.interrupt: Dict[str, int] = {}  # path -> bytes after which the next response is cut off
+        self.ranges = True  # whether Range requests are supported
+        self.requests = []
+
+    def add_scrape(self, date: datetime.date, rows, type_: str = TYPE, container: str = ''):
+        self.blobs[f'{container}/{type_}/{date:%Y-%m-%d}.json.gz'] = gzip.compress(orjson.dumps(rows))
+
+    def add_manifest(self, date: datetime.date, type_: str = TYPE, container: str = ''):
+        self.blobs[f'{container}/{type_}/latest.json'] = orjson.dumps({'date': f'{date:%Y-%m-%d}'})
+
+    def add_resources(self, values: Dict[str, object], container: str = RESOURCES_CONTAINER):
+        for name, value in values.items():
+            resource = resources.ResourceManager._RESOURCES[name]
+            self.blobs[f'{container}/{resource.key}'] = gzip.compress(orjson.dumps(value))
+
+    @property
+    def bytes_sent(self) -> int:
+        return sum(size for _, _, size in self.requests)
+
+    async def handle(self, request: web.Request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        body = self.blobs.get(request.path)
+        sent = 0
+        if self.failures.get(request.path):
+            self.failures[request.path] -= 1
+            response = web.Response(status=503)
+        elif body is None or any(fnmatch.fnmatchcase(request.path, pattern) for pattern in self.not_found):
+            response = web.Response(status=404)
+        else:
+            response, sent = await self._respond(request, body)
+        self.requests.append((request.method, request.path, sent if request.method == 'GET' else 0))
+        return response
+
+    async def _respond(self, request: web.Request, body: bytes) -> Tuple[web.StreamResponse, int]:
+        """The response for an existing blob, along with the number of body bytes sent."""
+        digest = hashlib.md5(body).digest()
+        headers = {'ETag': f'"{digest.hex()}"'}
+        if request.headers.get('If-None-Match') == headers['ETag']:
+            return web.Response(status=304, headers=headers), 0
+        if self.md5:
+            headers['Content-MD5'] = base64.b64encode(digest).decode('ascii')
+        if request.path in self.corrupt:
+            body = bytes([body[0] ^ 1]) + body[1:]
+
+        status = 200
+        if self.ranges:
+            headers['Accept-Ranges'] = 'bytes'
+            range_ = _RANGE.fullmatch(request.headers.get('Range', ''))
+            if range_ and request.headers.get('If-Range', headers['ETag']) == headers['ETag']:
+                start = int(range_[1])
+                if start >= len(body):
+                    return web.Response(status=416, headers={'Content-Range': f'bytes */{len(body)}'}), 0
+                # NOTE: like blob storage, the Content-MD5 of a range is only sent when it is asked for
+                headers.pop('Content-MD5', None)
+                headers['Content-Range'] = f'bytes {start}-{len(body) - 1}/{len(body)}'
+                status, body = 206, body[start:]
+
+        interrupt = self.interrupt.pop(request.path, None)
+        if request.method == 'HEAD' or (self.bandwidth is None and interrupt is None):
+            return web.Response(status=status, body=body, headers=headers), len(body)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = len(body)
+        await response.prepare(request)
+        for start in range(0, len(body), _CHUNK_SIZE):
+            chunk = body[start:start + _CHUNK_SIZE]
+            if interrupt is not None and start + len(chunk) > interrupt:
+                await response.write(chunk[:interrupt - start])
+                # drop the connection mid body like a flaky network, once the client has read what was sent
+                await asyncio.sleep(0.05)
+                request.transport.close()
+                return response, interrupt
+            await response.write(chunk)
+            if self.bandwidth is not None:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+        await response.write_eof()
+        return response, len(body)
+
+    @contextlib.asynccontextmanager
+    async def serve(self, port: int = 0):
+        """Serves until the block exits, yielding the base URL of the server."""
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', port)
+        await site.start()
+        try:
+            port = runner.addresses[0][1]
+            yield f'http://127.0.0.1:{port}'
+        finally:
+            await runner.cleanup()
+
+
+def synthetic_server(rows: int, days: int = 1, manifest: bool = False, **kwargs) -> BlobServer:
+    """A server with synthetic resources and a scrape of rows for each of the last days, through yesterday."""
+    server = BlobServer(**kwargs)
+    server.add_resources(synthetic_resources())
+    today = enchants.today_utc()
+    for days_back in range(1, days + 1):
+        server.add_scrape(today - datetime.timedelta(days=days_back), synthetic_rows(rows, seed=days_back),
+                          container=ENCHANTS_CONTAINER)
+    if manifest:
+        server.add_manifest(today - datetime.timedelta(days=1), container=ENCHANTS_CONTAINER)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--rows', type=int, default=50_000, help='rows of each synthetic scrape')
+    parser.add_argument('--days', type=int, default=3, help='number of past days with a scrape')
+    parser.add_argument('--latency', type=float, default=0, help='seconds before each response')
+    parser.add_argument('--bandwidth', type=float, default=None, help='MB/s of each response body')
+    parser.add_argument('--not-found', action='append', default=[], help='glob of paths which 404')
+    parser.add_argument('--no-md5', action='store_true', help="don't send Content-MD5 headers")
+    parser.add_argument('--manifest', action='store_true', help='publish latest.json manifests')
+    args = parser.parse_args()
+
+    server = synthetic_server(args.rows, days=args.days, manifest=args.manifest, latency=args.latency,
+                              bandwidth=args.bandwidth * 1e6 if args.bandwidth else None,
+                              not_found=args.not_found, md5=not args.no_md5)
+
+    async def serve():
+        async with server.serve(args.port) as base_url:
+            print(f'serving {len(server.blobs)} blobs at {base_url}, {ENCHANTS_CONTAINER} and '
+                  f'{RESOURCES_CONTAINER}')
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import base64
+import datetime
+import gzip
+import hashlib
+import time
+
+import orjson
+import pytest
+
+from labbie import cache
+from labbie import enchants
+from labbie import errors
+from labbie import net
+
+from tests import test_enchants
+
+
+def put_bytes(blob_cache, key, content, suffix='.bin', **kwargs):
+    path = blob_cache.temp_path(suffix)
+    path.write_bytes(content)
+    return blob_cache.put(key, path, suffix, **kwargs)
+
+
+def test_blobs_are_content_addressed(tmp_path):
+    blob_cache = cache.BlobCache(tmp_path)
+    first = put_bytes(blob_cache.namespace('a'), 'stats.json.gz', b'same')
+    validators = net.Validators(etag='"1"')
+    second = put_bytes(blob_cache.namespace('b'), 'stats.json.gz', b'same', validators=validators)
+    assert first == second
+    assert first.name.endswith('.bin')
+    assert blob_cache.keys() == ['a/stats.json.gz', 'b/stats.json.gz']
+    assert blob_cache.namespace('b').validators('stats.json.gz').etag == '"1"'
+
+    # a blob is only removed once nothing references it, the index survives reopening the cache
+    blob_cache.namespace('a').remove('stats.json.gz')
+    assert first.exists()
+    reopened = cache.BlobCache(tmp_path)
+    assert reopened.namespace('b').path('stats.json.gz') == first
+    reopened.namespace('b').remove('stats.json.gz')
+    assert not first.exists()
+
+
+def test_writes_are_verified(tmp_path):
+    blob_cache = cache.BlobCache(tmp_path)
+    content_md5 = base64.b64encode(hashlib.md5(b'content').digest()).decode('ascii')
+    with blob_cache.writer('.bin') as writer:
+        writer.write(b'cont')
+        writer.write(b'ent')
+        writer.verify(content_md5, len(b'content'))
+    path = blob_cache.put('good', writer.path, '.bin', hash=writer.hash)
+    assert path.read_bytes() == b'content'
+
+    with pytest.raises(errors.DownloadCorrupt):
+        with blob_cache.writer('.bin') as writer:
+            writer.write(b'truncated')
+            writer.verify(content_md5)
+    assert not writer.path.exists()
+
+    # a blob modified outside the cache is dropped instead of being handed out
+    path.write_bytes(b'short')
+    assert blob_cache.path('good') is None
+    assert blob_cache.keys() == []
+    assert not path.exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    blob_cache = cache.BlobCache(tmp_path)
+    for day in range(4):
+        put_bytes(blob_cache, f'day{day}', bytes([day]) * 100)
+        snapshot = blob_cache.blob_path(blob_cache.entry(f'day{day}').hash, '.snapshot')
+        snapshot.write_bytes(b'x' * 100)  # derived files count towards the budget and are evicted too
+
+    blob_cache = cache.BlobCache(tmp_path, max_bytes=450)
+    blob_cache.path('day0')  # entries used since opening the cache are never evicted
+    blob_cache.collect_garbage()
+    assert blob_cache.keys() == ['day0', 'day3']
+    assert len(list(tmp_path.glob('blobs/*/*'))) == 4
+
+
+def test_old_entries_are_evicted(tmp_path):
+    blob_cache = cache.BlobCache(tmp_path)
+    put_bytes(blob_cache, 'old', b'old')
+    put_bytes(blob_cache, 'new', b'new')
+    blob_cache.entry('old').accessed = time.time() - 100
+    blob_cache._save_index()
+
+    blob_cache = cache.BlobCache(tmp_path, max_age=50)
+    blob_cache.collect_garbage()
+    assert blob_cache.keys() == ['new']
+
+
+def test_access_times_are_saved_on_flush(tmp_path):
+    blob_cache = cache.BlobCache(tmp_path)
+    put_bytes(blob_cache.namespace('a'), 'key', b'content')
+    index_path = tmp_path / cache._INDEX_NAME
+    saved = index_path.read_bytes()
+
+    # hits only update the entry in memory, the index isn't rewritten on every read
+    time.sleep(0.01)
+    assert blob_cache.namespace('a').path('key') is not None
+    accessed = blob_cache.entry('a/key').accessed
+    assert index_path.read_bytes() == saved
+    blob_cache.flush()
+    assert cache.BlobCache(tmp_path).entry('a/key').accessed == accessed
+
+
+def test_legacy_scrapes_are_imported(tmp_path):
+    legacy_dir = tmp_path / 'helm' / 'league'
+    legacy_dir.mkdir(parents=True)
+    date = datetime.date(2021, 11, 7)
+    with gzip.open(legacy_dir / f'{date:%Y-%m-%d}.json.gz', 'wb') as f:
+        f.write(orjson.dumps(test_enchants.ROWS))
+    (legacy_dir / f'{date:%Y-%m-%d}.snapshot').write_bytes(b'stale')
+
+    scrapes = cache.BlobCache(tmp_path / 'cache').namespace('helm/league')
+    enchants.import_legacy_scrapes(scrapes, legacy_dir)
+    assert not legacy_dir.exists()
+    assert enchants.cached_dates(scrapes) == (date, date)
+    _, enchant_store = enchants.load_enchants(scrapes, date)
+    assert len(enchant_store) == len(test_enchants.ROWS)
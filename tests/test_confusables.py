@@ -0,0 +1,29 @@
+from labbie import confusables
+
+TABLE = confusables.ConfusionTable(classes=('ct', 'Il1|'), substitutions=(('Sammon', 'Summon'),))
+
+
+def test_fold():
+    assert TABLE.fold('Sammon Skitterbots') == TABLE.fold('Summon Skiccerbocs') == 'Summon Skiccerbocs'
+    assert TABLE.fold('l0% increased') == TABLE.fold('10% increased') == 'I0% increased'
+    assert TABLE.digest != confusables.ConfusionTable().digest
+    assert confusables.ConfusionTable.from_dict(TABLE.to_dict()) == TABLE
+
+
+def test_substitutions_are_aligned_within_other_text():
+    ocr = 'Item Level: 84\n4O% increased Arc Damaqe\nCorrupted'
+    assert confusables.substitutions(ocr, '40% increased Arc Damage') == [('O', '0'), ('q', 'g')]
+
+
+def test_learn_merges_frequent_confusions_into_classes():
+    captures = [('4O% increased Arc Damage', ['40% increased Arc Damage'])] * 3
+    captures.append(('Arc has 16% increased Area of Eftect', ['Arc has 16% increased Area of Effect']))
+    table = confusables.learn(captures, TABLE)
+    assert table.classes == ('0O', 'I1l|', 'ct')
+    assert table.substitutions == TABLE.substitutions
+    assert confusables.learn(captures, TABLE, min_count=4) == confusables.ConfusionTable(
+        classes=('I1l|', 'ct'), substitutions=TABLE.substitutions)
+
+
+def test_default_table_is_shipped():
+    assert confusables.default_table().fold('c') == confusables.default_table().fold('t')
@@ -0,0 +1,12 @@
+from labbie import constants
+
+
+def test_environment_overrides_are_cast(monkeypatch, tmp_path):
+    monkeypatch.setenv('LABBIE_DATA_DIR', str(tmp_path))
+    monkeypatch.setenv('LABBIE_CACHE_MAX_MB', '500')
+    monkeypatch.setenv('LABBIE_CACHE_MAX_AGE_DAYS', '7')
+    monkeypatch.setenv('LABBIE_DEBUG', 'true')
+    lab_constants = constants.Constants.load(None)
+    assert (lab_constants.cache_max_mb, lab_constants.cache_max_age_days) == (500, 7)
+    assert lab_constants.data_dir == tmp_path
+    assert lab_constants.debug is True
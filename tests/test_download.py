@@ -0,0 +1,240 @@
+import asyncio
+import contextlib
+import datetime
+import time
+
+import pytest
+
+from labbie import cache
+from labbie import constants
+from labbie import enchants
+from labbie import net
+from labbie import store
+
+from tests import benchmark_network
+from tests import blob_server
+from tests import test_enchants
+from tests import test_snapshot
+
+TYPE = 'league'
+
+
+@contextlib.asynccontextmanager
+async def make_client():
+    client = net.HttpClient(constants.Constants())
+    try:
+        yield client
+    finally:
+        await client.close()
+
+
+def days_ago(days):
+    return enchants.today_utc() - datetime.timedelta(days=days)
+
+
+def test_probes_return_newest_published_date():
+    server = blob_server.BlobServer()
+    server.add_scrape(days_ago(3), test_enchants.ROWS)
+    server.add_scrape(days_ago(6), test_enchants.ROWS)
+
+    async def probe():
+        async with server.serve() as base_url:
+            async with make_client() as client:
+                return await enchants.last_downloadable_date(client, TYPE, 15, base_url=base_url)
+
+    assert asyncio.run(probe()) == days_ago(3)
+    # newer dates are probed first and the probes of older dates are cancelled once the answer is known
+    heads = [path for method, path, _ in server.requests if method == 'HEAD']
+    assert set(heads[:4]) == {f'/{TYPE}/{days_ago(days):%Y-%m-%d}.json.gz' for days in range(4)}
+    assert f'/{TYPE}/{days_ago(14):%Y-%m-%d}.json.gz' not in heads
+
+
+def test_manifest_skips_probing():
+    server = blob_server.BlobServer()
+    server.add_scrape(days_ago(2), test_enchants.ROWS)
+    server.add_manifest(days_ago(2))
+
+    async def probe():
+        async with server.serve() as base_url:
+            async with make_client() as client:
+                return await enchants.last_downloadable_date(client, TYPE, 15, base_url=base_url)
+
+    assert asyncio.run(probe()) == days_ago(2)
+    assert [(method, path) for method, path, _ in server.requests] == [('GET', f'/{TYPE}/latest.json')]
+
+
+def test_download_falls_back_past_invalid_scrapes(tmp_path):
+    scrapes = test_snapshot.make_scrapes(tmp_path)
+    server = blob_server.BlobServer()
+    server.add_scrape(days_ago(4), test_enchants.ROWS)
+    server.add_manifest(days_ago(1))
+    server.blobs[f'/{TYPE}/{days_ago(1):%Y-%m-%d}.json.gz'] = b'not a scrape'
+
+    async def download():
+        async with server.serve() as base_url:
+            async with make_client() as client:
+                return await enchants.download(scrapes, TYPE, client, 15, base_url=base_url)
+
+    date, enchant_store = asyncio.run(download())
+    assert date == days_ago(4)
+    assert len(enchant_store) == len(test_enchants.ROWS)
+    assert enchants.cached_dates(scrapes) == (days_ago(4), days_ago(4))
+    # the manifest is fetched once and older dates aren't probed again
+    assert [(method, path) for method, path, _ in server.requests] == [('GET', f'/{TYPE}/latest.json')] + [
+        ('GET', f'/{TYPE}/{days_ago(days):%Y-%m-%d}.json.gz') for days in range(1, 5)]
+    assert not list(tmp_path.rglob('*.part'))
+
+
+def test_cached_scrape_is_used_while_revalidating(tmp_path, monkeypatch):
+    blob_cache = cache.BlobCache(tmp_path / 'cache')
+    test_snapshot.write_scrape(blob_cache.namespace(f'helm/{TYPE}'), test_enchants.ROWS, days_ago(2))
+
+    async def last_downloadable_date(*args, **kwargs):
+        return days_ago(0)
+
+    downloaded = []
+
+    async def download_date(scrapes, type_, client, date, **kwargs):
+        # the date which was found is downloaded, rather than probing for the newest date again
+        downloaded.append(date)
+        return date, store.EnchantStore.from_rows(test_enchants.ROWS[:2])
+
+    monkeypatch.setattr(enchants, 'last_downloadable_date', last_downloadable_date)
+    monkeypatch.setattr(enchants, 'download_date', download_date)
+
+    async def load():
+        scrape = enchants.Enchants(TYPE)
+        lab_constants = constants.Constants(data_dir=tmp_path)
+        client = net.HttpClient(lab_constants)
+        await scrape.download_or_load(lab_constants, client, blob_cache)
+        # the cached scrape is searchable before anything was downloaded
+        assert (scrape.state, scrape.date, scrape.stale) == (enchants.State.LOADED, days_ago(2), True)
+        assert len(scrape.enchants) == len(test_enchants.ROWS)
+
+        assert await scrape.refresh() is True
+        await client.close()
+        return scrape
+
+    scrape = asyncio.run(load())
+    assert (scrape.state, scrape.date, scrape.stale) == (enchants.State.LOADED, days_ago(0), False)
+    assert len(scrape.enchants) == 2
+    assert downloaded == [days_ago(0)]
+
+
+def test_download_date_revalidates_cached_scrape(tmp_path):
+    scrapes = test_snapshot.make_scrapes(tmp_path)
+    server = blob_server.BlobServer()
+    server.add_scrape(days_ago(0), test_enchants.ROWS)
+
+    async def download_twice():
+        async with server.serve() as base_url, make_client() as client:
+            missing = await enchants.download_date(scrapes, TYPE, client, days_ago(1), base_url=base_url)
+            first = await enchants.download_date(scrapes, TYPE, client, days_ago(0), base_url=base_url)
+            second = await enchants.download_date(scrapes, TYPE, client, days_ago(0), base_url=base_url)
+            return missing, first, second, client.stats
+
+    missing, (_, first), (date, second), stats = asyncio.run(download_twice())
+    assert missing is None
+    assert date == days_ago(0)
+    assert len(second) == len(first) == len(test_enchants.ROWS)
+    assert not second.ilvl.flags.writeable  # loaded from the cached snapshot
+    assert stats.requests == 3
+    assert scrapes.validators(f'{days_ago(0):%Y-%m-%d}').etag
+
+
+def test_download_date_rejects_corrupt_scrape(tmp_path):
+    scrapes = test_snapshot.make_scrapes(tmp_path)
+    server = blob_server.BlobServer()
+    server.add_scrape(days_ago(0), test_enchants.ROWS)
+    server.corrupt.add(f'/{TYPE}/{days_ago(0):%Y-%m-%d}.json.gz')
+
+    async def download():
+        async with server.serve() as base_url, make_client() as client:
+            return await enchants.download_date(scrapes, TYPE, client, days_ago(0), base_url=base_url)
+
+    assert asyncio.run(download()) is None
+    assert scrapes.keys() == []
+    assert not list(tmp_path.rglob('*.part'))
+
+
+def test_blob_server_simulates_network_conditions():
+    server = blob_server.BlobServer(latency=0.05, bandwidth=100_000, not_found=['/league/*'], md5=False)
+    server.blobs['/blob'] = b'x' * 20_000
+    server.add_scrape(days_ago(0), test_enchants.ROWS)
+
+    async def fetch():
+        async with server.serve() as base_url, make_client() as client:
+            start = time.perf_counter()
+            async with client.get(f'{base_url}/blob') as resp:
+                body, headers = await resp.read(), resp.headers
+            elapsed = time.perf_counter() - start
+            async with client.get(f'{base_url}/{TYPE}/{days_ago(0):%Y-%m-%d}.json.gz') as resp:
+                return body, headers, elapsed, resp.status
+
+    body, headers, elapsed, status = asyncio.run(fetch())
+    assert body == b'x' * 20_000
+    assert 'Content-MD5' not in headers and 'ETag' in headers
+    assert elapsed >= 0.2  # 50ms of latency and 200ms to send the body
+    assert status == 404
+    assert server.bytes_sent == 20_000
+
+
+def test_benchmark_scenarios_run():
+    results = asyncio.run(benchmark_network.run(200, days=2))
+    cold, warm, refresh = results
+    assert (cold.scenario, warm.scenario, refresh.scenario) == ('cold start', 'warm start', 'daily refresh')
+    assert cold.bytes_received > 0
+    assert warm.bytes_received == 0  # everything is revalidated with 304s
+    assert refresh.bytes_received > 0
+
+
+def test_interrupted_download_is_resumed(tmp_path, monkeypatch):
+    scrapes = test_snapshot.make_scrapes(tmp_path)
+    server = blob_server.BlobServer()
+    rows = blob_server.synthetic_rows(2000)
+    server.add_scrape(days_ago(0), rows)
+    path = f'/{TYPE}/{days_ago(0):%Y-%m-%d}.json.gz'
+    size = len(server.blobs[path])
+    monkeypatch.setattr(cache, '_RESUME_ATTEMPTS', 0)
+
+    async def download():
+        async with server.serve() as base_url, make_client() as client:
+            return await enchants.download_date(scrapes, TYPE, client, days_ago(0), base_url=base_url)
+
+    # the partial download is kept when the connection drops and resumed by the next download
+    server.interrupt[path] = size // 2
+    with pytest.raises(net.INTERRUPTED):
+        asyncio.run(download())
+    assert scrapes.keys() == []
+    _, enchant_store = asyncio.run(download())
+    assert len(enchant_store) == len(rows)
+    assert server.bytes_sent == size
+    assert [sent for _, _, sent in server.requests] == [size // 2, size - size // 2]
+
+    # without support for ranges, the download starts over
+    server.requests.clear()
+    server.ranges = False
+    scrapes.remove(f'{days_ago(0):%Y-%m-%d}')
+    server.interrupt[path] = size // 2
+    with pytest.raises(net.INTERRUPTED):
+        asyncio.run(download())
+    asyncio.run(download())
+    assert server.bytes_sent == size + size // 2
+
+
+def test_download_resumes_within_one_call(tmp_path):
+    scrapes = test_snapshot.make_scrapes(tmp_path)
+    server = blob_server.BlobServer()
+    rows = blob_server.synthetic_rows(2000)
+    server.add_scrape(days_ago(0), rows)
+    path = f'/{TYPE}/{days_ago(0):%Y-%m-%d}.json.gz'
+    server.interrupt[path] = len(server.blobs[path]) // 3
+
+    async def download():
+        async with server.serve() as base_url, make_client() as client:
+            return await enchants.download_date(scrapes, TYPE, client, days_ago(0), base_url=base_url)
+
+    _, enchant_store = asyncio.run(download())
+    assert len(enchant_store) == len(rows)
+    assert server.bytes_sent == len(server.blobs[path])
+    assert not list(tmp_path.rglob('partial/*'))
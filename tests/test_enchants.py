@@ -0,0 +1,262 @@
+import collections
+import gzip
+
+import orjson
+import pytest
+
+from labbie import enchants
+from labbie import errors
+from labbie import index
+from labbie import store
+
+TORNADO_SHOT = 'Tornado Shot fires an additional secondary Projectile'
+ROWS = [
+    ['acct1', 'char1', 'Doom Crown', 'Eternal Burgonet', 86, ['Shaper'], False,
+     ['40% increased Dual Strike Damage']],
+    ['acct2', 'char2', 'Storm Visor', 'Eternal Burgonet', 84, ['Shaper', 'Elder'], False,
+     ['25% increased Dual Strike Damage']],
+    ['acct3', 'char3', 'Rat Cage', 'Sinner Tricorne', 75, [], False,
+     ['Raised Zombies deal 40% increased Damage']],
+    ['acct4', 'char4', "Devoto's Devotion", 'Nightmare Bascinet', 83, [], True,
+     [TORNADO_SHOT]],
+    ['acct5', 'char5', 'Grim Dome', 'Eternal Burgonet', 70, [], False,
+     [TORNADO_SHOT]],
+]
+
+
+def make_store():
+    return store.EnchantStore.from_rows(ROWS)
+
+
+def test_views_match_rows():
+    enchant_store = make_store()
+    assert len(enchant_store) == len(ROWS)
+    for enchant, row in zip(enchant_store.all(), ROWS):
+        account, character, item_name, item_base, ilvl, influences, unique, mods = row
+        assert enchant.account == account
+        assert enchant.character == character
+        assert enchant.item_name == item_name
+        assert enchant.item_base == item_base
+        assert enchant.display_name == (item_name if unique else item_base)
+        assert enchant.ilvl == ilvl
+        assert enchant.influences == influences
+        assert enchant.unique == unique
+        assert enchant.mods == mods
+
+
+def test_find_matching_enchants():
+    enchant_store = make_store()
+
+    matches = enchants.find_matching_enchants(enchant_store, TORNADO_SHOT)
+    assert [enchant.account for enchant in matches] == ['acct4', 'acct5']
+
+    matches = enchants.find_matching_enchants(enchant_store, '#% increased dual strike')
+    assert [enchant.account for enchant in matches] == ['acct1', 'acct2']
+
+    assert not enchants.find_matching_enchants(enchant_store, 'no such enchant')
+
+    matches = enchants.find_matching_enchants(enchant_store, 'at least 30% increased dual strike')
+    assert [enchant.account for enchant in matches] == ['acct1']
+    matches = enchants.find_matching_enchants(enchant_store, 'between 20 and 40% increased')
+    assert [enchant.account for enchant in matches] == ['acct1', 'acct2', 'acct3']
+    matches = enchants.find_matching_enchants(enchant_store, 'zombies deal at most 30% increased')
+    assert not matches
+
+    # mods which read like a value query are found as is, rather than as a bound on other mods
+    enchant_store = store.EnchantStore.from_rows(ROWS + [
+        ['acct6', 'char6', 'Blizzard Crown', 'Lacquered Helmet', 84, [], False,
+         ['Minions deal at least 10% increased Damage']],
+        ['acct7', 'char7', 'Blizzard Crown', 'Lacquered Helmet', 84, [], False,
+         ['Minions deal 25% increased Damage']],
+    ])
+    matches = enchants.find_matching_enchants(enchant_store, 'Minions deal at least 10% increased Damage')
+    assert [enchant.account for enchant in matches] == ['acct6']
+    matches = enchants.find_matching_enchants(enchant_store, 'minions deal at least 20% increased damage')
+    assert [enchant.account for enchant in matches] == ['acct7']
+
+
+def test_find_matching_helms():
+    enchant_store = make_store()
+
+    helm = enchants.Helm(item_name='', item_base='Eternal Burgonet', ilvl=84, influences=['Shaper'],
+                         unique=False)
+    matches = enchants.find_matching_helms(enchant_store, helm)
+    assert [enchant.account for enchant in matches] == ['acct1', 'acct2']
+
+    helm = enchants.Helm(item_name='', item_base='Eternal Burgonet', ilvl=0, influences=['Elder'],
+                         unique=False)
+    matches = enchants.find_matching_helms(enchant_store, helm)
+    assert [enchant.account for enchant in matches] == ['acct2']
+
+    helm = enchants.Helm(item_name="Devoto's Devotion", item_base=None, ilvl=0, influences=[], unique=True)
+    matches = enchants.find_matching_helms(enchant_store, helm)
+    assert [enchant.account for enchant in matches] == ['acct4']
+
+
+def test_summaries_accept_store_rows():
+    enchant_store = make_store()
+    summary = enchants.enchant_summary(enchant_store.all())
+    assert summary.startswith('Bases\n    3 Eternal Burgonet\n')
+    assert '    1 Shaper, Elder' in summary
+    assert enchants.base_summary(enchant_store.all()).splitlines()[0] == f'    2 {TORNADO_SHOT}'
+
+
+def test_mod_index_postings():
+    enchant_store = make_store()
+    mod_index = enchant_store.mod_index
+    tornado_shot_id = enchant_store.mods.id(TORNADO_SHOT)
+    assert mod_index.postings(tornado_shot_id).tolist() == [3, 4]
+    assert mod_index.find(TORNADO_SHOT).tolist() == [3, 4]
+    assert mod_index.find('increased').tolist() == [0, 1, 2]
+
+
+def test_trigram_candidates():
+    trigram_index = index.TrigramIndex([('tornado shot',), ('dual strike', '#% dual strike'), ('ab',)])
+    assert trigram_index.candidates('ab') is None
+    assert trigram_index.candidates('ado sh').tolist() == [0]
+    assert trigram_index.candidates('#% dual').tolist() == [1]
+    assert trigram_index.candidates('zzz').tolist() == []
+
+
+def test_find_matching_bases():
+    scrape = enchants.Enchants('league')
+    scrape.set_enchants(None, make_store())
+
+    matches = scrape.find_matching_bases('Eternal Burgonet', 80, [])
+    assert [enchant.account for enchant in matches] == ['acct1', 'acct2']
+
+    matches = scrape.find_matching_bases("Devoto's Devotion", 0, [])
+    assert [enchant.account for enchant in matches] == ['acct4']
+
+    assert not scrape.find_matching_bases('Eternal Burgonet', 0, ['Hunter'])
+    assert scrape.bases == {'Eternal Burgonet', 'Sinner Tricorne', "Devoto's Devotion"}
+    with pytest.raises(errors.NoSuchBase):
+        scrape.find_matching_bases('Bone Helmet', 0, [])
+
+
+def test_mod_table():
+    mod_table = index.ModTable(['Adds 45 to 68 Fire Damage', 'Adds 10 to 20 Fire Damage', TORNADO_SHOT])
+    assert mod_table.lower[0] == 'adds 45 to 68 fire damage'
+    assert mod_table.templates[0] == 'adds # to # fire damage'
+    assert mod_table.values[0] == (45, 68)
+    assert mod_table.values[2] == ()
+    assert mod_table.template_index.ids('adds # to # fire damage') == [1, 0]
+
+
+def test_template_index():
+    mod_table = index.ModTable(['Adds 45 to 68 Fire Damage', 'Adds 10 to 20 Fire Damage',
+                                'Adds 30 to 40 Fire Damage', TORNADO_SHOT])
+    template_index = mod_table.template_index
+    assert template_index.nearest('adds # to # fire damage', (12, 25)) == 1
+    assert template_index.nearest('adds # to # fire damage', (40,)) is None
+    assert template_index.in_range('adds # to # fire damage', low=30) == [2, 0]
+    assert template_index.in_range('adds # to # fire damage', high=30, position=1) == [1]
+    assert template_index.in_range(mod_table.templates[3]) == []
+
+    assert index.ValueQuery.parse('arc has at least 20% increased area') == index.ValueQuery(
+        'arc has #% increased area', 0, 20, None)
+    assert index.ValueQuery.parse('adds 10 to at most 30 fire damage') == index.ValueQuery(
+        'adds # to # fire damage', 1, None, 30)
+    assert index.ValueQuery.parse('between 10 and 30% more') == index.ValueQuery('#% more', 0, 10, 30)
+    assert index.ValueQuery.parse('40% increased dual strike damage') is None
+
+
+def test_summaries_are_cached_per_store():
+    enchant_store = make_store()
+    first = enchants.enchant_summary(enchant_store.all())
+    assert enchants.enchant_summary(enchant_store.all()) is first
+    assert enchants.enchant_summary(enchant_store.all()[:2]) is not first
+    assert enchants.enchant_summary([]) == 'Bases'
+    assert enchants.base_summary([]) == ''
+
+
+def reference_enchant_summary(enchants):
+    """The summary as it was built from a list of enchants before stores existed."""
+    items = collections.Counter()
+    influences = collections.defaultdict(collections.Counter)
+    ilvls = collections.defaultdict(list)
+    for enchant in enchants:
+        items[enchant.display_name] += 1
+        if not enchant.unique:
+            influences[enchant.item_base][', '.join(enchant.influences) or 'Uninfluenced'] += 1
+            ilvls[enchant.item_base].append(enchant.ilvl)
+
+    summary = ['Bases']
+    summary.extend(f'  {count:>3d} {val}' for val, count in items.most_common())
+    if ilvls:
+        summary.append('')
+    for base in (val for val, _ in items.most_common() if val in ilvls):
+        summary.append(f'{base} ({items[base]})')
+        summary.append('  Influence')
+        summary.extend(f'    {count:>3d} {val}' for val, count in influences[base].most_common())
+        summary.append('')
+        summary.append('  Item Level')
+        cumulative = 0
+        ilvl_counts = sorted(collections.Counter(ilvls[base]).items(), reverse=True)
+        for position, (ilvl, count) in enumerate(ilvl_counts):
+            cumulative += count
+            summary.append(f'    {cumulative:>3d} {">=" if position else "  "}{ilvl:>3d}')
+        summary.append('')
+    return '\n'.join(summary)
+
+
+def test_summaries_match_the_reference():
+    rows = ROWS + [
+        ['acct6', 'char6', 'Grim Dome', 'Eternal Burgonet', 84, ['Elder', 'Shaper'], False, []],
+        ['acct7', 'char7', 'Grim Dome', 'Eternal Burgonet', 86, ['Elder', 'Shaper'], False, []],
+    ]
+    enchant_store = store.EnchantStore.from_rows(rows)
+    summary = enchants.enchant_summary(enchant_store.all())
+    # influences are labelled in the order of their rows
+    assert '      2 Elder, Shaper\n      1 Shaper\n      1 Shaper, Elder\n' in summary
+    assert summary == reference_enchant_summary(enchant_store.all())
+    assert enchants.enchant_summary(enchant_store.all()[::-1]) == reference_enchant_summary(
+        enchant_store.all()[::-1])
+
+    # plain lists of enchants are summarized too, without caching
+    enchant_list = list(enchant_store.all())
+    assert enchants.enchant_summary(enchant_list) == summary
+    assert enchants.base_summary(enchant_list) == enchants.base_summary(enchant_store.all())
+
+
+def test_scrape_stream_parses_in_chunks():
+    # a row boundary inside of a string must not split a row
+    rows = ROWS + [['acct6', 'char6', 'Tricky], [Name', 'Eternal Burgonet', 80, [], False, ['a],[b']]]
+    data = gzip.compress(orjson.dumps(rows))
+    stream = enchants.ScrapeStream()
+    for i in range(0, len(data), 7):
+        stream.feed(data[i:i + 7])
+    enchant_store = stream.finish()
+    assert [repr(enchant) for enchant in enchant_store.all()] == \
+        [repr(enchant) for enchant in store.EnchantStore.from_rows(rows).all()]
+
+
+@pytest.mark.parametrize('data', [
+    gzip.compress(orjson.dumps(ROWS))[:-20],
+    gzip.compress(b'{"rows": []}'),
+    gzip.compress(b'[["acct1", "char1"]]'),
+    b'not gzip',
+])
+def test_scrape_stream_rejects_invalid_data(data):
+    stream = enchants.ScrapeStream()
+    with pytest.raises(errors.EnchantDataInvalid):
+        stream.feed(data)
+        stream.finish()
+
+
+def test_scrape_stream_fails_fast_on_corrupt_data():
+    # a bad row in valid JSON is rejected as soon as its batch parses, rather than buffering the rest
+    rows = ROWS + [['acct6', 'char6', 'Grim Dome', 'Eternal Burgonet', 'not a level', [], False, []]]
+    data = gzip.compress(orjson.dumps(rows * 1000))
+    stream = enchants.ScrapeStream()
+    with pytest.raises(errors.EnchantDataInvalid, match='Invalid enchant row'):
+        for i in range(0, len(data), 64):
+            stream.feed(data[i:i + 64])
+    assert i < len(data) // 2
+
+    # data which never parses is only buffered up to a limit
+    data = gzip.compress(b'[["' + b'], [' * enchants._MAX_UNPARSED_SIZE)
+    stream = enchants.ScrapeStream()
+    with pytest.raises(errors.EnchantDataInvalid, match='no rows'):
+        stream.feed(data)
+    assert len(stream._buffer) <= enchants._MAX_UNPARSED_SIZE + enchants._READ_CHUNK_SIZE
@@ -0,0 +1,169 @@
+import random
+
+from labbie import confusables
+from labbie import fuzzy
+from labbie import mods
+
+from tests import blob_server
+
+VOID_SPHERE = ("Enemies in Void Sphere's range take up to 10% increased Damage, based on distance from the "
+               'Void Sphere')
+ENCHANTS = sorted(blob_server.synthetic_mods() + [
+    VOID_SPHERE,
+    'Trigger Commandment of Reflection when Hit',
+])
+
+
+def make_mods(enchants=ENCHANTS, confusions=confusables.default_table()):
+    """Mods over the given helm enchants, without a resource manager."""
+    lab_mods = mods.Mods.__new__(mods.Mods)
+    lab_mods.confusions = confusions
+    lab_mods.helm_enchants = sorted(enchants)
+    lab_mods.helm_enchant_info = lab_mods._build_helm_enchant_info([(e, None, None) for e in enchants])
+    lab_mods.helm_enchant_trie = lab_mods._build_helm_enchant_trie(lab_mods.helm_enchants)
+    return lab_mods
+
+
+def levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, start=1):
+        previous, row = row, [i]
+        for j, other in enumerate(b, start=1):
+            row.append(min(row[j - 1] + 1, previous[j] + 1, previous[j - 1] + (char != other)))
+    return row[-1]
+
+
+def test_search_finds_keys_within_distance():
+    trie = fuzzy.LevenshteinTrie(ENCHANTS)
+    rng = random.Random(0)
+    for _ in range(50):
+        query = list(rng.choice(ENCHANTS))
+        for _ in range(rng.randint(0, 4)):
+            query[rng.randrange(len(query))] = rng.choice('lIt0Oc ')
+        query = ''.join(query)
+        expected = sorted((levenshtein(query, key), key) for key in ENCHANTS if levenshtein(query, key) <= 3)
+        assert [(match.distance, match.key) for match in trie.search(query, 3)] == expected
+        best = trie.best(query, 3)
+        assert (best.distance, best.key) == expected[0] if expected else best is None
+
+
+def test_ocr_lines_with_mistakes_are_matched():
+    lab_mods = make_mods()
+    ocr_lines = [
+        'Item Level: 84',
+        '4O% increased Arc Damage',  # a mistake in the first character used to drop the line
+        "Enemies in Void Sphere's range take up to 10% increased Damage, based on",
+        'distanco from the Void Sphere',  # a mistake in the continuation of a wrapped enchant
+        'Trigger Commandment of Reflection when Hit',
+        'Spark has 24% increased Area of Efect',
+    ]
+    assert lab_mods.get_enchant_list_from_ocr_results(ocr_lines) == [
+        '40% increased Arc Damage',
+        VOID_SPHERE,
+        'Trigger Commandment of Reflection when Hit',
+        'Spark has 24% increased Area of Effect',
+    ]
+
+    matches = lab_mods.match_enchant('25% increased Arc Damagr')
+    assert matches[0] == fuzzy.Match('25% increased Arc Damage', 1)
+    assert matches[0].score > matches[-1].score
+
+
+def test_confusable_characters_are_folded():
+    lab_mods = make_mods()
+    garbled = 'Spark fires an addicionaI Projecci|e'
+    assert lab_mods.match_enchant(garbled)[0] == fuzzy.Match('Spark fires an additional Projectile', 0)
+
+    # enchants which fold to the same key are told apart by the raw line
+    lab_mods = make_mods(['10% increased Arc Damage', 'l0% increased Arc Damage'])
+    assert lab_mods.helm_enchant_trie.keys() == ['IO% increased Arc Damage']
+    assert lab_mods.get_enchant_list_from_ocr_results(['l0% increased Arc Damage']) == [
+        'l0% increased Arc Damage']
+
+
+def test_ocr_lines_are_segmented_into_enchants_with_confidence():
+    lab_mods = make_mods()
+    ocr_lines = [
+        "Enemies in Void Sphere's range take up to 10% increased Damage, based",
+        'on distance from the Void Spere',
+        'Spark fires an additional Projectile',
+        'Corrupted',
+        'Arc has 16% increased Area of Effect Arc',  # merged with the start of a line which was cut off
+    ]
+    matches = lab_mods.parse_ocr_results(ocr_lines)
+    assert [(match.enchant, match.lines) for match in matches] == [
+        (VOID_SPHERE, (0, 2)),
+        ('Spark fires an additional Projectile', (2, 3)),
+        ('Arc has 16% increased Area of Effect', (4, 5)),
+    ]
+    assert 0.9 < matches[0].confidence < 1 and matches[1].confidence == 1 and matches[2].confidence < 1
+
+
+def test_ocr_lines_are_segmented_with_bounded_work(monkeypatch):
+    lab_mods = make_mods()
+    searches = []
+    search = fuzzy.LevenshteinTrie.search
+
+    def counted_search(self, query, *args, **kwargs):
+        searches.append(query)
+        return search(self, query, *args, **kwargs)
+
+    monkeypatch.setattr(fuzzy.LevenshteinTrie, 'search', counted_search)
+    ocr_lines = [
+        'Eternal Burgonet',
+        'Quality: +20%',
+        'Armour: 512',
+        'Requires Level 69, 138 Str',
+        'Item Level: 84',
+        "Enemies in Void Sphere's range take up to 10% increased Damage, based",
+        'on distance from the Void Spere',
+        'Spark fires an additional Projectile',
+        '4O% increased Arc Damage',
+        'Trigger Commandment of Reflection when Hit',
+        '+92 to maximum Life',
+        'Corrupted',
+    ]
+    assert lab_mods.get_enchant_list_from_ocr_results(ocr_lines) == [
+        VOID_SPHERE,
+        'Spark fires an additional Projectile',
+        '40% increased Arc Damage',
+        'Trigger Commandment of Reflection when Hit',
+    ]
+    # groups longer than any enchant or with a line which is an exact match on its own aren't searched
+    assert len(searches) <= 2 * len(ocr_lines)
+    assert max(map(len, searches)) <= lab_mods.helm_enchant_max_length
+
+
+def test_enchants_are_spotted_regardless_of_line_breaks():
+    lab_mods = make_mods()
+    ocr_lines = [
+        'Item Level: 84',
+        "Enemies in Void Sphere's range take up to 10% increased",
+        'Damage, based on distance from the Void Sphere Spark fires an',  # merged with the start of the next
+        'additional Projectile',
+        '4O% increased Ar',  # split within a word
+        'c Damage',
+    ]
+    matches = lab_mods.spot_ocr_results(ocr_lines)
+    assert [(match.enchant, match.lines) for match in matches] == [
+        (VOID_SPHERE, (1, 3)),
+        ('Spark fires an additional Projectile', (2, 4)),
+        ('40% increased Arc Damage', (4, 6)),
+    ]
+    assert lab_mods.get_enchant_list_from_ocr_results(ocr_lines, mods.OCR_MATCHING_SPOTTING) == [
+        match.enchant for match in matches]
+
+
+def test_garbled_values_are_matched_to_the_nearest_legal_value():
+    lab_mods = make_mods()
+    assert lab_mods.nearest_enchant('45% increased Arc Damage') == '40% increased Arc Damage'
+    assert lab_mods.nearest_enchant('3O% increased Arc Damage') == '25% increased Arc Damage'
+    assert lab_mods.nearest_enchant('Arc has l8% increased Area of Effecc') == (
+        'Arc has 16% increased Area of Effect')
+    assert lab_mods.nearest_enchant('45% increased Arc') is None
+
+    # both legal values are one edit away, the nearest value breaks the tie
+    assert [match.key for match in lab_mods.match_enchant('Spark has 14% increased Area of Effect')] == [
+        'Spark has 24% increased Area of Effect', 'Spark has 16% increased Area of Effect']
+    assert lab_mods.get_enchant_list_from_ocr_results(['Spark has 14% increased Area of Effect']) == [
+        'Spark has 16% increased Area of Effect']
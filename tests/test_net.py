@@ -0,0 +1,35 @@
+import asyncio
+
+from labbie import net
+
+from tests import blob_server
+from tests import test_download
+
+
+def test_retries_with_backoff_and_counts(monkeypatch):
+    monkeypatch.setattr(net, '_BACKOFF_BASE', 0.001)
+    server = blob_server.BlobServer()
+    server.blobs['/blob'] = b'x' * 1000
+    server.failures['/blob'] = 2
+
+    async def fetch():
+        async with server.serve() as base_url, test_download.make_client() as client:
+            async with client.get(f'{base_url}/blob') as resp:
+                body = await resp.read()
+            async with client.get(f'{base_url}/missing') as resp:
+                status = resp.status
+            return client.stats, body, status
+
+    stats, body, status = asyncio.run(fetch())
+    assert body == b'x' * 1000
+    assert status == 404  # not retryable
+    assert len(server.requests) == 4
+    assert (stats.requests, stats.retries, stats.failures) == (4, 2, 0)
+    assert stats.bytes_received >= 1000
+    assert stats.mean_latency > 0
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [net.backoff_delay(attempt) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= net._BACKOFF_MAX for delay in delays)
+    assert len(set(delays)) > 1
@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+import threading
+
+import aiohttp
+import orjson
+import pytest
+
+from labbie import bases
+from labbie import cache
+from labbie import constants
+from labbie import mods
+from labbie import net
+from labbie import resources
+from labbie import state
+from labbie import trade
+
+from tests import blob_server
+
+ARC = '40% increased Arc Damage'
+RESOURCES = {
+    'trade_stats': {'stat': 'Stat'},
+    'items': {'helmet': [
+        [False, 'Eternal Burgonet', 'Eternal Burgonet'],
+        [True, 'Abyssus', 'Ezomyte Burgonet'],
+    ]},
+    'enchants': {'helmet': [
+        ['Tornado Shot fires an additional secondary Projectile', 'enchant.stat_1', None],
+        [ARC, 'enchant.stat_2', 40],
+    ]},
+}
+
+
+def make_manager(tmp_path, monkeypatch, base_url):
+    monkeypatch.setattr(resources.ResourceManager, '_RESOURCES', {
+        name: resources.Resource(version=1, path_format=f'{{version}}/{name}.json.gz') for name in RESOURCES
+    })
+    lab_constants = constants.Constants(data_dir=tmp_path, resources_base_url=base_url)
+    return resources.ResourceManager(lab_constants, state.AppState(), net.HttpClient(lab_constants),
+                                     cache.BlobCache(lab_constants.cache_dir))
+
+
+async def load_mods_and_bases(manager):
+    lab_mods = mods.Mods(manager, trade.Trade(manager))
+    lab_bases = bases.Bases(manager)
+    await asyncio.gather(lab_mods.load(), lab_bases.load())
+    return lab_mods, lab_bases
+
+
+def test_resources_are_fetched_concurrently_and_revalidated_in_background(tmp_path, monkeypatch):
+    server = blob_server.BlobServer()
+    for name, value in RESOURCES.items():
+        server.blobs[f'/1/{name}.json.gz'] = gzip.compress(orjson.dumps(value))
+
+    async def get_all_resources():
+        async with server.serve() as base_url:
+            manager = make_manager(tmp_path, monkeypatch, base_url)
+            await manager._get_all_resources()
+            await manager._client.close()
+            return manager
+
+    manager = asyncio.run(get_all_resources())
+    for name, value in RESOURCES.items():
+        assert getattr(manager, name) == value
+    assert manager._app_state.resources_ready
+    # nothing is cached on a cold start, so there is nothing to revalidate before downloading
+    assert sorted(method for method, _, _ in server.requests) == ['GET'] * 3
+
+    # with everything cached, startup uses the cache and revalidates in the background
+    server.requests.clear()
+    updated = {'helmet': []}
+    server.blobs['/1/items.json.gz'] = gzip.compress(orjson.dumps(updated))
+
+    async def revalidate():
+        async with server.serve() as base_url:
+            manager = make_manager(tmp_path, monkeypatch, base_url)
+            notified = []
+            manager.attach(None, notified.append, to='resources')
+            await manager._get_all_resources()
+            assert manager._app_state.resources_ready and manager._app_state.resources_stale
+            assert manager.items == RESOURCES['items']
+            assert not server.requests
+
+            assert await manager.refresh()
+            await manager._client.close()
+            return manager, notified
+
+    manager, notified = asyncio.run(revalidate())
+    assert not manager._app_state.resources_stale
+    assert notified == [['items']]
+    assert manager.items == updated
+    assert manager.trade_stats == RESOURCES['trade_stats']
+    # unchanged resources are revalidated with a conditional GET which returns a 304
+    assert [method for method, _, _ in server.requests] == ['GET'] * 3
+
+
+def test_derived_structures_are_persisted_per_resource_content(tmp_path, monkeypatch):
+    server = blob_server.BlobServer()
+    for name, value in RESOURCES.items():
+        server.blobs[f'/1/{name}.json.gz'] = gzip.compress(orjson.dumps(value))
+
+    async def get_all_resources():
+        async with server.serve() as base_url:
+            manager = make_manager(tmp_path, monkeypatch, base_url)
+            await manager._get_all_resources()
+            if manager._app_state.resources_stale:
+                await manager.refresh()
+            await manager._client.close()
+            return await load_mods_and_bases(manager)
+
+    lab_mods, lab_bases = asyncio.run(get_all_resources())
+    assert lab_mods.helm_enchants == sorted(enchant for enchant, _, _ in RESOURCES['enchants']['helmet'])
+    assert lab_mods.helm_enchant_info[ARC].trade_stat_value == 40
+    assert lab_mods.helm_enchant_trie.values(lab_mods.confusions.fold('40%')) == [[ARC]]
+    assert lab_bases.helm_display_texts == ['Abyssus', 'Eternal Burgonet']
+    derived = sorted(path.name.split('.', 1)[1] for path in tmp_path.rglob('blobs/*/*'))
+    trie_suffix = f'helm_enchants-2-{lab_mods.confusions.digest}.trie'
+    assert derived == ['helm_enchants-1.json', trie_suffix, 'helms-1.json', 'json.gz', 'json.gz', 'json.gz']
+
+    # warm starts load the persisted structures instead of rebuilding them
+    def fail(*args):
+        raise AssertionError('rebuilt a persisted structure')
+
+    monkeypatch.setattr(mods.Mods, '_build_helm_enchant_rows', fail)
+    monkeypatch.setattr(mods.Mods, '_build_helm_enchant_trie', fail)
+    monkeypatch.setattr(bases.Bases, '_build_helm_rows', fail)
+    lab_mods, lab_bases = asyncio.run(get_all_resources())
+    assert lab_mods.helm_enchant_trie.values(lab_mods.confusions.fold('40%')) == [[ARC]]
+    assert lab_bases.helms['Abyssus'].unique
+
+    # building runs off the event loop
+    threads = []
+
+    def build():
+        threads.append(threading.current_thread())
+        return []
+
+    async def load_or_build_derived():
+        return await manager.load_or_build_derived('items', '.test-1.json', build, resources.save_json,
+                                                   resources.load_json)
+
+    manager = make_manager(tmp_path, monkeypatch, 'http://localhost')
+    assert asyncio.run(load_or_build_derived()) == []
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_bases_and_mods_notify_once_reloaded(tmp_path, monkeypatch):
+    server = blob_server.BlobServer()
+    for name, value in RESOURCES.items():
+        server.blobs[f'/1/{name}.json.gz'] = gzip.compress(orjson.dumps(value))
+
+    async def refresh(updated):
+        async with server.serve() as base_url:
+            manager = make_manager(tmp_path, monkeypatch, base_url)
+            await manager._get_all_resources()
+            lab_mods, lab_bases = await load_mods_and_bases(manager)
+            notified = []
+            lab_mods.attach(None, lambda helm_enchants: notified.append(('mods', helm_enchants)),
+                            to='helm_enchants')
+            lab_bases.attach(None, lambda display_texts: notified.append(('bases', display_texts)),
+                             to='helm_display_texts')
+            server.blobs['/1/items.json.gz'] = gzip.compress(orjson.dumps(updated))
+            if manager._app_state.resources_stale:
+                await manager.refresh()
+            # the hot swap reloads off the event loop and notifies once it's done
+            await asyncio.gather(*(task for task in (lab_mods._load_task, lab_bases._load_task) if task))
+            await manager._client.close()
+            return notified
+
+    asyncio.run(refresh(RESOURCES['items']))
+    # observers get the reloaded bases, only for the resources which changed
+    notified = asyncio.run(refresh({'helmet': [[False, 'Lacquered Helmet', 'Lacquered Helmet']]}))
+    assert notified == [('bases', ['Lacquered Helmet'])]
+
+
+def test_legacy_resources_are_removed_once_cached(tmp_path, monkeypatch):
+    server = blob_server.BlobServer()
+    for name, value in RESOURCES.items():
+        server.blobs[f'/1/{name}.json.gz'] = gzip.compress(orjson.dumps(value))
+    legacy_dir = tmp_path / 'resources'
+    legacy_dir.mkdir()
+    (legacy_dir / 'stats.json.gz').write_bytes(b'legacy')
+    (legacy_dir / 'stats.json.gz.md5').write_text('legacy')
+
+    async def get_all_resources(base_url):
+        manager = make_manager(tmp_path, monkeypatch, base_url)
+        try:
+            await manager._get_all_resources()
+        finally:
+            await manager._client.close()
+        return manager
+
+    async def offline_then_online():
+        # the legacy files are kept while the cache can't be populated
+        async with server.serve() as base_url:
+            pass
+        with pytest.raises(aiohttp.ClientConnectionError):
+            await get_all_resources(base_url)
+        assert legacy_dir.exists()
+
+        async with server.serve() as base_url:
+            return await get_all_resources(base_url)
+
+    manager = asyncio.run(offline_then_online())
+    assert manager.trade_stats == RESOURCES['trade_stats']
+    assert not legacy_dir.exists()
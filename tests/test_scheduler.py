@@ -0,0 +1,81 @@
+import asyncio
+import datetime
+
+from labbie import scheduler
+from labbie import state
+
+NOW = datetime.datetime(2021, 11, 7, 23, 30, tzinfo=datetime.timezone.utc)
+
+
+def make_job(name, url='https://example.com/a', result=scheduler.Result.CURRENT, **kwargs):
+    calls = []
+
+    async def check():
+        calls.append(scheduler.utc_now())
+        return result
+
+    return scheduler.Job(name, url, check, **kwargs), calls
+
+
+def test_current_data_is_checked_after_it_is_next_published():
+    job, _ = make_job('scrape', publish_time=datetime.time(0, 0))
+    for _ in range(20):
+        job.reschedule(scheduler.Result.UPDATED, NOW)
+        publish = datetime.datetime(2021, 11, 8, tzinfo=datetime.timezone.utc)
+        assert publish <= job.next_run <= publish + datetime.timedelta(seconds=scheduler._PUBLISH_JITTER)
+
+    job, _ = make_job('resources', period=datetime.timedelta(hours=6))
+    job.reschedule(scheduler.Result.CURRENT, NOW)
+    assert job.next_run >= NOW + datetime.timedelta(hours=6)
+
+
+def test_missing_data_is_checked_with_backoff():
+    job, _ = make_job('scrape', publish_time=datetime.time(0, 0))
+    delays = []
+    for _ in range(8):
+        job.reschedule(scheduler.Result.PENDING, NOW)
+        delays.append((job.next_run - NOW).total_seconds())
+    assert job.attempts == 8
+    for attempt, delay in enumerate(delays):
+        expected = min(scheduler._BACKOFF_MAX, scheduler._BACKOFF_BASE * 2 ** attempt)
+        assert expected / 2 <= delay <= expected
+
+    job.reschedule(scheduler.Result.UPDATED, NOW)
+    assert job.attempts == 0
+
+
+def test_jobs_for_the_same_host_are_coalesced():
+    soon = NOW + datetime.timedelta(minutes=1)
+    jobs = [make_job('league')[0], make_job('daily')[0], make_job('other', url='https://other.com/b')[0],
+            make_job('later')[0]]
+    jobs[0].next_run = NOW
+    jobs[1].next_run = jobs[2].next_run = soon
+    jobs[3].next_run = NOW + datetime.timedelta(hours=1)
+
+    refresh_scheduler = scheduler.RefreshScheduler(state.AppState())
+    refresh_scheduler._jobs = {job.name: job for job in jobs}
+    assert [job.name for job in refresh_scheduler._due(NOW)] == ['league', 'daily']
+
+
+def test_status_is_published_to_app_state():
+    app_state = state.AppState()
+    notified = []
+    app_state.attach(None, notified.append, to='refresh')
+    refresh_scheduler = scheduler.RefreshScheduler(app_state)
+    current, current_calls = make_job('current', period=datetime.timedelta(hours=6))
+    failing, failing_calls = make_job('failing', result=scheduler.Result.FAILED)
+
+    async def run():
+        refresh_scheduler.add(current, current=True)
+        refresh_scheduler.add(failing)
+        await asyncio.sleep(0.05)
+        refresh_scheduler.stop()
+
+    asyncio.run(run())
+    # data which is known to be current isn't checked until it's due
+    assert (len(current_calls), len(failing_calls)) == (0, 1)
+    assert app_state.refresh['current'].last_result is None
+    status = app_state.refresh['failing']
+    assert (status.last_result, status.attempts) == (scheduler.Result.FAILED.value, 1)
+    assert status.next_run > status.last_run
+    assert notified[-1] == app_state.refresh
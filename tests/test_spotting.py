@@ -0,0 +1,22 @@
+import random
+
+from labbie import spotting
+
+
+def test_find_all_matches_brute_force():
+    rng = random.Random(0)
+    patterns = ['he', 'she', 'his', 'hers', 'ushers', 's', 'hishe']
+    automaton = spotting.AhoCorasick(patterns)
+    for _ in range(50):
+        text = ''.join(rng.choice('ehirsu') for _ in range(rng.randint(0, 40)))
+        expected = sorted((end, start, index) for index, pattern in enumerate(patterns)
+                          for start in range(len(text)) for end in [start + len(pattern)]
+                          if text[start:end] == pattern)
+        found = [(o.end, o.start, o.pattern) for o in automaton.find_all(text)]
+        assert sorted(found) == expected
+
+
+def test_leftmost_longest():
+    automaton = spotting.AhoCorasick(['ab', 'abcd', 'cde', 'e'])
+    occurrences = spotting.leftmost_longest(automaton.find_all('xabcdex'))
+    assert [(o.pattern, o.start, o.end) for o in occurrences] == [(1, 1, 5), (3, 5, 6)]